@@ -0,0 +1,392 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import PlainTextResponse
+from app.core.config import settings
+from app.core.security import get_admin_token, log_usage
+from app.models.verdict import ReevaluationRequest
+from app.services.ensemble import CATEGORIES, SOURCES, Calibration, EnsembleCombiner, default_thresholds
+from app.services.image_analysis import image_analysis_service
+from app.services.profiling import sampling_profiler, slow_requests
+from app.services.quality import QUALITY_INDEX
+from app.services.reevaluation import reevaluate_verdicts
+from app.services.scheduler import analysis_scheduler
+from app.services.shadow import shadow_scorer
+from app.services.tuning import executor_tuner
+from app.services.verdict_store import verdict_store
+from typing import Dict, Any, Optional
+import asyncio
+import hashlib
+import re
+
+router = APIRouter()
+
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+@router.get("/shadow/summary", summary="Compare shadow analyzer configuration against production")
+async def get_shadow_summary(admin: Dict[str, Any] = Depends(get_admin_token)):
+    """
+    Summarize score and latency deltas between the shadow candidate
+    configuration and the primary analyzers. Only accessible by admin tokens.
+    
+    Args:
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Per-category score deltas, verdict flip rates and latency deltas
+    """
+    await log_usage(admin["token"], "/admin/shadow/summary")
+    
+    return shadow_scorer.summary()
+
+@router.get("/executors", summary="Show analyzer executor sizing")
+async def get_executor_stats(admin: Dict[str, Any] = Depends(get_admin_token)):
+    """
+    Current analyzer pool sizes, queue depths and the latest auto-tune probe
+    results. Only accessible by admin tokens.
+    
+    Args:
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Executor plan, queue depths and probe results
+    """
+    await log_usage(admin["token"], "/admin/executors")
+    
+    return executor_tuner.summary()
+
+@router.get("/scheduler", summary="Show analysis scheduler queues and queueing delay")
+async def get_scheduler_stats(admin: Dict[str, Any] = Depends(get_admin_token)):
+    """
+    Slots in use, queued analyses and recent queueing delay percentiles per
+    priority class, for this worker process. Only accessible by admin tokens.
+    
+    Args:
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Scheduler capacity, running count and per-class queue stats
+    """
+    await log_usage(admin["token"], "/admin/scheduler")
+    
+    return analysis_scheduler.stats()
+
+def _quality_ladder():
+    ladder = image_analysis_service.quality
+    if ladder is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The quality ladder is disabled (QUALITY_LADDER_ENABLED=false, or analyses run on inference workers)"
+        )
+    return ladder
+
+@router.get("/quality", summary="Show the load-adaptive analysis quality level")
+async def get_quality(admin: Dict[str, Any] = Depends(get_admin_token)):
+    """
+    Current quality ladder level, the load signals it was chosen from and
+    the pressure at which each level is entered, for this worker process.
+    Only accessible by admin tokens.
+    
+    Args:
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Level, load pressure, signals, limits and levels
+    """
+    await log_usage(admin["token"], "/admin/quality")
+    
+    return _quality_ladder().snapshot()
+
+@router.put("/quality", summary="Pin the analysis quality level")
+async def pin_quality(
+    level: Optional[str] = Query(None, description=f"One of {', '.join(QUALITY_INDEX)}; omit to follow load again"),
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Hold this worker process at a quality level regardless of load, e.g. to
+    shed load by hand or to measure a level. Only accessible by admin tokens.
+    
+    Args:
+        level: Level name, or None to release the pin
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Quality ladder state after the change
+    """
+    await log_usage(admin["token"], "/admin/quality")
+    
+    ladder = _quality_ladder()
+    if level is not None and level not in QUALITY_INDEX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown quality level {level!r}; expected one of {', '.join(QUALITY_INDEX)}"
+        )
+    ladder.pin(level)
+    return ladder.snapshot()
+
+@router.post("/profile", summary="Sample stacks of this worker for a few seconds")
+async def profile(
+    seconds: float = Query(10.0, gt=0, description="How long to sample"),
+    interval_ms: float = Query(settings.PROFILE_INTERVAL_MS, ge=1, description="Sampling interval"),
+    thread_prefix: str = Query("", description="Only sample threads whose name starts with this, e.g. analysis-ml"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$", description="collapsed stacks text or JSON"),
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Run the sampling profiler over every thread of the worker process that
+    serves this request and return aggregated stacks. The collapsed format
+    feeds flamegraph.pl or speedscope directly. Only accessible by admin tokens.
+    
+    Args:
+        seconds: Sampling window, at most PROFILE_MAX_SECONDS
+        interval_ms: Time between samples
+        thread_prefix: Thread name filter (event loop: MainThread; analyzers: analysis-io/cv/ml)
+        format: 'collapsed' (text/plain) or 'json'
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        Collapsed stack lines, or a dict with sample counts and stacks
+    """
+    await log_usage(admin["token"], "/admin/profile")
+    
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Profiles are limited to {settings.PROFILE_MAX_SECONDS:g} seconds"
+        )
+    try:
+        result = await asyncio.get_event_loop().run_in_executor(
+            None, sampling_profiler.profile, seconds, interval_ms, thread_prefix
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    if format == "json":
+        return result
+    return PlainTextResponse(sampling_profiler.collapsed(result["stacks"]))
+
+@router.get("/slow-requests", summary="Recently captured slow requests with per-stage timings")
+async def get_slow_requests(
+    limit: int = Query(50, ge=1, le=1000),
+    path_prefix: str = Query("", description="Only requests whose path starts with this"),
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Requests of this worker that took at least SLOW_REQUEST_THRESHOLD_MS,
+    newest first, with stage and per-analyzer timing breakdowns. Only
+    accessible by admin tokens.
+    
+    Args:
+        limit: Maximum number of requests to return
+        path_prefix: Path filter, e.g. /moderate/analyze
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Threshold and captured request traces
+    """
+    await log_usage(admin["token"], "/admin/slow-requests")
+    
+    return {
+        "threshold_ms": settings.SLOW_REQUEST_THRESHOLD_MS,
+        "requests": slow_requests.recent(limit, path_prefix)
+    }
+
+@router.delete("/slow-requests", summary="Clear captured slow requests")
+async def clear_slow_requests(admin: Dict[str, Any] = Depends(get_admin_token)):
+    """
+    Empty this worker's slow-request buffer. Only accessible by admin tokens.
+    
+    Args:
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Number of entries cleared
+    """
+    await log_usage(admin["token"], "/admin/slow-requests")
+    
+    return {"cleared": slow_requests.clear()}
+
+@router.post("/reevaluate", summary="Recompute stored verdicts under a new threshold or weight config")
+async def reevaluate(
+    request: ReevaluationRequest,
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Re-run only the ensemble combination over the raw per-source scores stored
+    with each verdict, under candidate thresholds/weights/calibration, and
+    report how many verdicts would flip. Nothing is decoded or re-analyzed.
+    Only accessible by admin tokens.
+    
+    Args:
+        request: Candidate config, population and whether to apply the result
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Verdict and per-category flip counts for the population
+    """
+    await log_usage(admin["token"], "/admin/reevaluate")
+    
+    unknown = (set(request.thresholds) - set(CATEGORIES)) | (set(request.weights) - set(SOURCES))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown categories or sources: {', '.join(sorted(unknown))}"
+        )
+    
+    current = image_analysis_service.combiner
+    if request.content_safety_threshold is not None:
+        thresholds = default_thresholds(request.content_safety_threshold)
+    else:
+        thresholds = dict(zip(CATEGORIES, current.thresholds.tolist()))
+    thresholds.update(request.thresholds)
+    weights = dict(zip(SOURCES, current.weights.tolist()))
+    weights.update(request.weights)
+    try:
+        calibration = current.calibration if request.calibration is None else Calibration(request.calibration)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid calibration: {e}"
+        )
+    candidate = EnsembleCombiner(weights=weights, thresholds=thresholds, calibration=calibration)
+    candidate_version = request.apply_as or image_analysis_service._derive_model_version(candidate)
+    
+    report = await reevaluate_verdicts(
+        candidate,
+        source_model_version=request.source_model_version or image_analysis_service.model_version,
+        apply_as=candidate_version if request.apply else None,
+        limit=request.limit
+    )
+    report["candidate_model_version"] = candidate_version
+    return report
+
+
+def _similarity_index():
+    index = image_analysis_service.similarity_index
+    if index is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Similarity index is disabled. Set SIMILARITY_INDEX_DIR to enable it."
+        )
+    return index
+
+@router.get("/similarity", summary="Show the known-unsafe embedding index")
+async def get_similarity_index(admin: Dict[str, Any] = Depends(get_admin_token)):
+    """
+    Size, generation and search settings of the embedding index used to match
+    near-duplicates of confirmed-unsafe images. Only accessible by admin tokens.
+    
+    Args:
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Index statistics
+    """
+    await log_usage(admin["token"], "/admin/similarity")
+    
+    return _similarity_index().stats()
+
+@router.post("/similarity/entries", summary="Add a confirmed-unsafe image to the embedding index")
+async def add_similarity_entry(
+    file: UploadFile = File(..., description="Confirmed-unsafe image"),
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Index the embedding of a confirmed-unsafe image so that near-duplicates of
+    it are answered with its verdict. The image is analyzed first if it has no
+    stored verdict; only images with an unsafe verdict can be indexed.
+    Only accessible by admin tokens.
+    
+    Args:
+        file: The image to index
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Digest of the indexed image and whether it was newly added
+    """
+    index = _similarity_index()
+    await log_usage(admin["token"], "/admin/similarity/entries")
+    
+    content = await file.read()
+    if len(content) > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / (1024*1024):.1f}MB"
+        )
+    digest = hashlib.sha256(content).hexdigest()
+    
+    try:
+        embedding = await image_analysis_service.embed(content)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid image file or corrupted data"
+        )
+    if embedding is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No embedding model is loaded"
+        )
+    
+    verdict = await verdict_store.get(digest)
+    if verdict is None:
+        results = await analysis_scheduler.run(
+            admin, "background", lambda: image_analysis_service.analyze_image(content, file.filename or "")
+        )
+        verdict_store.record(digest, results, image_analysis_service.model_version)
+        verdict = await verdict_store.get(digest)
+    if verdict is None or verdict["is_safe"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Only images with a stored unsafe verdict can be indexed"
+        )
+    
+    added = await asyncio.get_event_loop().run_in_executor(None, index.add, digest, embedding)
+    return {"sha256": digest, "added": added, "entries": len(index)}
+
+@router.delete("/similarity/entries/{digest}", summary="Remove an image from the embedding index")
+async def remove_similarity_entry(
+    digest: str,
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Stop matching near-duplicates of an indexed image. Only accessible by admin tokens.
+    
+    Args:
+        digest: SHA-256 hex digest of the indexed image
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Success message
+    """
+    index = _similarity_index()
+    await log_usage(admin["token"], "/admin/similarity/entries")
+    
+    digest = digest.strip().lower()
+    if not SHA256_PATTERN.fullmatch(digest):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid SHA-256 digest: {digest}"
+        )
+    removed = await asyncio.get_event_loop().run_in_executor(None, index.remove, digest)
+    if not removed:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Digest is not in the similarity index"
+        )
+    return {"message": "Entry removed from the similarity index", "sha256": digest}
+
+@router.post("/similarity/rebuild", summary="Compact the embedding index")
+async def rebuild_similarity_index(admin: Dict[str, Any] = Depends(get_admin_token)):
+    """
+    Fold entries added and removed since the last build into a new IVF
+    generation and retrain its lists. Only accessible by admin tokens.
+    
+    Args:
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Manifest of the new generation
+    """
+    index = _similarity_index()
+    await log_usage(admin["token"], "/admin/similarity/rebuild")
+    
+    return await asyncio.get_event_loop().run_in_executor(None, index.rebuild)
@@ -1,9 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core.database import get_collection, get_db
 from app.core.security import create_token, get_admin_token, log_usage
-from app.models.token import Token, TokenCreate, TokenResponse
+from app.models.token import (
+    TOKEN_FIELDS, Token, TokenBulkCreate, TokenBulkDelete, TokenCreate, TokenPage, TokenResponse, TokenScheduling
+)
+from app.services.usage_log import usage_log
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Dict, Any, Optional, Tuple
+import base64
+import json
 
 router = APIRouter()
 
@@ -22,8 +32,6 @@ async def create_token_endpoint(
     Returns:
         TokenResponse: The created token with metadata
     """
-    db = get_db()
-    
     # Generate new token
     token_str = create_token(is_admin=token_create.isAdmin)
     
@@ -31,11 +39,13 @@ async def create_token_endpoint(
     token_doc = {
         "token": token_str,
         "isAdmin": token_create.isAdmin,
-        "createdAt": datetime.utcnow()
+        "createdAt": datetime.utcnow(),
+        "priorityClass": token_create.priorityClass,
+        "weight": token_create.weight
     }
     
-    # Insert into database
-    await db.tokens.insert_one(token_doc)
+    # Insert into database; majority-acknowledged so the token survives a failover
+    await get_collection("tokens", "durable").insert_one(token_doc)
     
     # Log usage
     await log_usage(admin["token"], "/auth/tokens")
@@ -44,30 +54,233 @@ async def create_token_endpoint(
         token=token_str,
         isAdmin=token_create.isAdmin,
         createdAt=token_doc["createdAt"],
+        priorityClass=token_create.priorityClass,
+        weight=token_create.weight,
         message="Token created successfully"
     )
 
-@router.get("/tokens", response_model=List[Token], summary="List all tokens")
-async def get_tokens(admin: Dict[str, Any] = Depends(get_admin_token)):
+@router.post("/tokens/bulk", summary="Create many tokens")
+async def create_tokens_bulk(
+    request: TokenBulkCreate,
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
     """
-    Retrieve all tokens. Only accessible by admin tokens.
+    Create several bearer tokens with the same settings in one write.
+    Only accessible by admin tokens.
     
     Args:
+        request: Number of tokens and their settings
         admin: Admin token (automatically injected)
     
     Returns:
-        List[Token]: List of all tokens in the system
+        dict: The created tokens
     """
-    db = get_db()
+    created_at = datetime.utcnow()
+    token_docs = [
+        {
+            "token": create_token(is_admin=request.isAdmin),
+            "isAdmin": request.isAdmin,
+            "createdAt": created_at,
+            "priorityClass": request.priorityClass,
+            "weight": request.weight
+        }
+        for _ in range(request.count)
+    ]
     
-    # Get all tokens
-    tokens_cursor = db.tokens.find().sort("createdAt", -1)
-    tokens = await tokens_cursor.to_list(length=None)
+    await get_collection("tokens", "durable").insert_many(token_docs, ordered=False)
+    
+    await log_usage(admin["token"], f"/auth/tokens/bulk/{request.count}")
+    
+    return {
+        "message": f"{request.count} tokens created successfully",
+        "tokens": [_token_row(doc, TOKEN_FIELDS) for doc in token_docs]
+    }
+
+def _token_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Parse a comma-separated field list (default: all token fields)"""
+    if not fields:
+        return TOKEN_FIELDS
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in TOKEN_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown token fields: {', '.join(unknown) or fields}. Available: {', '.join(TOKEN_FIELDS)}"
+        )
+    return requested
+
+def _token_filter(
+    is_admin: Optional[bool],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime]
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if is_admin is not None:
+        query["isAdmin"] = is_admin
+    created = {}
+    if created_after is not None:
+        created["$gte"] = created_after
+    if created_before is not None:
+        created["$lt"] = created_before
+    if created:
+        query["createdAt"] = created
+    return query
+
+def _token_row(doc: Dict[str, Any], fields: Tuple[str, ...]) -> Dict[str, Any]:
+    row = {field: doc.get(field) for field in fields}
+    if "createdAt" in row:
+        row["createdAt"] = row["createdAt"].isoformat()
+    if "priorityClass" in row and row["priorityClass"] is None:
+        row["priorityClass"] = "interactive"
+    return row
+
+def _encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque keyset cursor: position after doc in (createdAt, _id) descending order"""
+    return base64.urlsafe_b64encode(f"{doc['createdAt'].isoformat()}|{doc['_id']}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Query for the documents after a cursor"""
+    try:
+        created_at, object_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        created_at, object_id = datetime.fromisoformat(created_at), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return {"$or": [
+        {"createdAt": {"$lt": created_at}},
+        {"createdAt": created_at, "_id": {"$lt": object_id}}
+    ]}
+
+@router.get("/tokens", response_model=TokenPage, summary="List tokens, one page at a time")
+async def get_tokens(
+    limit: int = Query(100, ge=1, le=settings.TOKEN_PAGE_MAX_SIZE, description="Tokens per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    is_admin: Optional[bool] = Query(None, description="Only admin (true) or non-admin (false) tokens"),
+    created_after: Optional[datetime] = Query(None, description="Only tokens created at or after this time"),
+    created_before: Optional[datetime] = Query(None, description="Only tokens created before this time"),
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of {', '.join(TOKEN_FIELDS)}"),
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    List tokens newest first, using keyset pagination on (createdAt, _id):
+    each page is one indexed range query however deep into the listing it is.
+    Only accessible by admin tokens.
+    
+    Args:
+        limit: Maximum number of tokens to return
+        cursor: Continue after the previous page
+        is_admin: Filter on admin privileges
+        created_after: Lower bound on creation time (inclusive)
+        created_before: Upper bound on creation time (exclusive)
+        fields: Fields to return for each token
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        TokenPage: The tokens on this page and the cursor for the next one
+    """
+    token_fields = _token_fields(fields)
+    query = _token_filter(is_admin, created_after, created_before)
+    if cursor:
+        query = {"$and": [query, _decode_cursor(cursor)]}
+    
+    # One extra document tells whether there is a next page
+    projection = {field: 1 for field in token_fields + ("createdAt",)}
+    docs = await get_db().tokens.find(query, projection).sort(
+        [("createdAt", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = _encode_cursor(docs[limit - 1]) if len(docs) > limit else None
     
-    # Log usage
     await log_usage(admin["token"], "/auth/tokens")
     
-    return [Token(**token) for token in tokens]
+    # Rows are plain JSON values already, so skip response_model re-validation
+    return JSONResponse({
+        "tokens": [_token_row(doc, token_fields) for doc in docs[:limit]],
+        "next_cursor": next_cursor
+    })
+
+@router.get("/tokens/export", summary="Export tokens as NDJSON")
+async def export_tokens(
+    is_admin: Optional[bool] = Query(None, description="Only admin (true) or non-admin (false) tokens"),
+    created_after: Optional[datetime] = Query(None, description="Only tokens created at or after this time"),
+    created_before: Optional[datetime] = Query(None, description="Only tokens created before this time"),
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of {', '.join(TOKEN_FIELDS)}"),
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Stream every matching token as one JSON object per line, newest first.
+    The database cursor is read TOKEN_EXPORT_BATCH_SIZE documents at a time,
+    so memory use does not grow with the number of tokens. Only accessible
+    by admin tokens.
+    
+    Args:
+        is_admin: Filter on admin privileges
+        created_after: Lower bound on creation time (inclusive)
+        created_before: Upper bound on creation time (exclusive)
+        fields: Fields to return for each token
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        StreamingResponse: application/x-ndjson, one token per line
+    """
+    token_fields = _token_fields(fields)
+    projection = {field: 1 for field in token_fields}
+    projection["_id"] = 0
+    tokens_cursor = get_db().tokens.find(
+        _token_filter(is_admin, created_after, created_before),
+        projection,
+        batch_size=settings.TOKEN_EXPORT_BATCH_SIZE
+    ).sort([("createdAt", -1), ("_id", -1)])
+    
+    await log_usage(admin["token"], "/auth/tokens/export")
+    
+    return StreamingResponse(_export_lines(tokens_cursor, token_fields), media_type="application/x-ndjson")
+
+async def _export_lines(tokens_cursor, token_fields: Tuple[str, ...]):
+    """NDJSON chunks of up to one cursor batch each"""
+    lines = []
+    async for doc in tokens_cursor:
+        lines.append(json.dumps(_token_row(doc, token_fields)))
+        if len(lines) >= settings.TOKEN_EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+@router.put("/tokens/{token}/scheduling", response_model=Token, summary="Change a token's scheduling class and weight")
+async def update_token_scheduling(
+    token: str,
+    scheduling: TokenScheduling,
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Set the priority class and fair-queuing weight a token's analyses are
+    scheduled with. Takes effect on its next request. Only accessible by admin tokens.
+    
+    Args:
+        token: The token string to update
+        scheduling: New priority class and weight
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        Token: The updated token
+    """
+    token_doc = await get_collection("tokens", "durable").find_one_and_update(
+        {"token": token},
+        {"$set": {"priorityClass": scheduling.priorityClass, "weight": scheduling.weight}},
+        return_document=ReturnDocument.AFTER
+    )
+    if token_doc is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Token not found"
+        )
+    
+    # Log usage
+    await log_usage(admin["token"], f"/auth/tokens/{token}/scheduling")
+    
+    return Token(**token_doc)
 
 @router.delete("/tokens/{token}", summary="Delete a token")
 async def delete_token(
@@ -93,8 +306,8 @@ async def delete_token(
             detail="Cannot delete your own admin token"
         )
     
-    # Delete the token
-    result = await db.tokens.delete_one({"token": token})
+    # Delete the token; majority-acknowledged so the revocation survives a failover
+    result = await get_collection("tokens", "durable").delete_one({"token": token})
     
     if result.deleted_count == 0:
         raise HTTPException(
@@ -102,14 +315,55 @@ async def delete_token(
             detail="Token not found"
         )
     
-    # Also delete usage records for this token
+    # Also delete usage records for this token, including ones not yet flushed
+    usage_log.discard(token)
     await db.usages.delete_many({"token": token})
+    await db.verdict_aliases.delete_many({"token": token})
     
     # Log usage
     await log_usage(admin["token"], f"/auth/tokens/{token}")
     
     return {"message": "Token deleted successfully", "deleted_token": token}
 
+@router.post("/tokens/bulk-delete", summary="Revoke many tokens")
+async def delete_tokens_bulk(
+    request: TokenBulkDelete,
+    admin: Dict[str, Any] = Depends(get_admin_token)
+):
+    """
+    Revoke several tokens, and their usage records, in one write per collection.
+    Only accessible by admin tokens.
+    
+    Args:
+        request: Token strings to revoke
+        admin: Admin token (automatically injected)
+    
+    Returns:
+        dict: Number of tokens requested and deleted
+    """
+    tokens = list(dict.fromkeys(request.tokens))
+    if admin["token"] in tokens:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot delete your own admin token"
+        )
+    
+    # Majority-acknowledged so the revocations survive a failover
+    result = await get_collection("tokens", "durable").delete_many({"token": {"$in": tokens}})
+    
+    db = get_db()
+    usage_log.discard_many(tokens)
+    await db.usages.delete_many({"token": {"$in": tokens}})
+    await db.verdict_aliases.delete_many({"token": {"$in": tokens}})
+    
+    await log_usage(admin["token"], f"/auth/tokens/bulk-delete/{len(tokens)}")
+    
+    return {
+        "message": f"{result.deleted_count} tokens deleted successfully",
+        "requested": len(tokens),
+        "deleted_count": result.deleted_count
+    }
+
 @router.get("/usage-stats", summary="Get usage statistics")
 async def get_usage_stats(admin: Dict[str, Any] = Depends(get_admin_token)):
     """
@@ -121,24 +375,25 @@ async def get_usage_stats(admin: Dict[str, Any] = Depends(get_admin_token)):
     Returns:
         dict: Usage statistics
     """
-    db = get_db()
+    # Statistics tolerate slightly stale data, so they may be served by secondaries
+    usages = get_collection("usages", "analytics")
     
     # Get total usage count
-    total_calls = await db.usages.count_documents({})
+    total_calls = await usages.count_documents({})
     
     # Get unique tokens count
-    unique_tokens = len(await db.usages.distinct("token"))
+    unique_tokens = len(await usages.distinct("token"))
     
     # Get calls by endpoint
     pipeline = [
         {"$group": {"_id": "$endpoint", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}}
     ]
-    endpoint_stats = await db.usages.aggregate(pipeline).to_list(length=None)
+    endpoint_stats = await usages.aggregate(pipeline).to_list(length=None)
     calls_by_endpoint = {stat["_id"]: stat["count"] for stat in endpoint_stats}
     
     # Get recent activity (last 10 calls)
-    recent_activity = await db.usages.find().sort("timestamp", -1).limit(10).to_list(length=10)
+    recent_activity = await usages.find({}, {"_id": 0}).sort("timestamp", -1).limit(10).to_list(length=10)
     
     # Log usage
     await log_usage(admin["token"], "/auth/usage-stats")
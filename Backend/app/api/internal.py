@@ -0,0 +1,156 @@
+"""
+Binary-framed moderation API for high-rate internal callers.
+
+Request: POST /internal/moderate with Content-Type application/x-msgpack and a
+body of concatenated msgpack maps, one per image: {"id": <any>, "image": <bin>}.
+Images start analyzing as soon as their frame has arrived.
+
+Response: a stream of msgpack maps. The first is a header
+{"categories": [...], "model_version": str, "score_dtype": "<f4"}; then one
+frame per image in completion order
+{"id", "sha256": <bin 32>, "is_safe", "overall", "scores": <bin>, "detected": int, "degraded", "quality", "error"}
+where scores holds one little-endian float32 per category (header order) and
+bit i of detected is set when categories[i] was flagged; and finally a trailer
+{"done": true, "count": int, "elapsed_ms": int}.
+"""
+
+import asyncio
+import hashlib
+import time
+from typing import Dict, Any, List
+import msgpack
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.security import get_current_token, log_usage
+from app.models.analysis import AnalysisResult
+from app.services.ensemble import CATEGORIES
+from app.services.image_analysis import image_analysis_service
+from app.services.scheduler import analysis_scheduler
+from app.services.single_flight import analysis_flight
+from app.services.verdict_store import pack_detected, verdict_store
+
+router = APIRouter()
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+SCORE_DTYPE = "<f4"
+
+def _pack(frame: Dict[str, Any]) -> bytes:
+    return msgpack.packb(frame, use_bin_type=True)
+
+async def _analyze_frame(frame: Dict[str, Any], semaphore: asyncio.Semaphore, token: Dict[str, Any]) -> bytes:
+    """Analyze one request frame and encode its result frame"""
+    image_id = frame.get("id")
+    image = frame.get("image")
+    if not isinstance(image, bytes):
+        return _pack({"id": image_id, "error": "Frame has no binary 'image' field"})
+    if len(image) > settings.MAX_FILE_SIZE:
+        return _pack({"id": image_id, "error": "File too large"})
+
+    digest = hashlib.sha256(image).digest()
+    try:
+        async with semaphore:
+            results, _ = await analysis_flight.do(
+                digest.hex(),
+                lambda: analysis_scheduler.run(
+                    token, "batch", lambda: image_analysis_service.analyze_image(image_bytes=image)
+                )
+            )
+    except Exception as e:
+        return _pack({"id": image_id, "sha256": digest, "error": str(e)})
+
+    verdict_store.record(digest.hex(), results, image_analysis_service.model_version)
+    return encode_result(image_id, digest, results)
+
+def encode_result(image_id: Any, digest: bytes, results: AnalysisResult) -> bytes:
+    """Encode one analysis result as a compact msgpack result frame"""
+    return _pack({
+        "id": image_id,
+        "sha256": digest,
+        "is_safe": results.is_safe,
+        "overall": results.overall_score,
+        "scores": np.array(
+            [results.categories[category].confidence for category in CATEGORIES], dtype=SCORE_DTYPE
+        ).tobytes(),
+        "detected": pack_detected(results.categories),
+        "degraded": results.degraded,
+        "quality": results.quality_level,
+        "error": "; ".join(results.errors) if results.errors else None
+    })
+
+async def _stream_results(tasks: List[asyncio.Task], start_time: float):
+    try:
+        yield _pack({
+            "categories": list(CATEGORIES),
+            "model_version": image_analysis_service.model_version,
+            "score_dtype": SCORE_DTYPE
+        })
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+        yield _pack({"done": True, "count": len(tasks), "elapsed_ms": int((time.time() - start_time) * 1000)})
+    finally:
+        # Client went away mid-stream: stop the analyses nobody will read
+        for task in tasks:
+            task.cancel()
+
+@router.post("/moderate", summary="Moderate a stream of images over msgpack frames")
+async def moderate_stream(
+    request: Request,
+    token: Dict[str, Any] = Depends(get_current_token)
+):
+    """
+    Analyze a stream of msgpack-framed images with the same analysis service
+    as /moderate/analyze, returning compact typed score arrays per image.
+
+    Args:
+        request: Raw request whose body is the msgpack frame stream
+        token: Valid bearer token (automatically injected)
+
+    Returns:
+        StreamingResponse: msgpack header, one result frame per image, trailer
+    """
+    start_time = time.time()
+
+    if request.headers.get("content-type", "").split(";")[0].strip() != MSGPACK_MEDIA_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Expected {MSGPACK_MEDIA_TYPE} request body"
+        )
+
+    semaphore = asyncio.Semaphore(settings.INTERNAL_MAX_IN_FLIGHT)
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=settings.MAX_FILE_SIZE + 1024)
+    tasks: List[asyncio.Task] = []
+    received = consumed = 0
+    try:
+        # Start analyzing each image as soon as its frame is complete, while the rest upload
+        async for chunk in request.stream():
+            received += len(chunk)
+            unpacker.feed(chunk)
+            for frame in unpacker:
+                if not isinstance(frame, dict):
+                    raise ValueError("Each frame must be a map")
+                if len(tasks) >= settings.INTERNAL_MAX_BATCH_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Maximum {settings.INTERNAL_MAX_BATCH_SIZE} images allowed per request"
+                    )
+                tasks.append(asyncio.ensure_future(_analyze_frame(frame, semaphore, token)))
+                consumed = unpacker.tell()
+        if consumed != received:
+            raise ValueError("Truncated final frame")
+    except HTTPException:
+        for task in tasks:
+            task.cancel()
+        raise
+    except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, msgpack.BufferFull) as e:
+        for task in tasks:
+            task.cancel()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Malformed msgpack frame stream: {e}"
+        )
+
+    await log_usage(token["token"], f"/internal/moderate/{len(tasks)}")
+
+    return StreamingResponse(_stream_results(tasks, start_time), media_type=MSGPACK_MEDIA_TYPE)
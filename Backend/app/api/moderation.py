@@ -1,18 +1,33 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, HTTPException, status
+from fastapi.responses import JSONResponse
 from app.core.security import get_current_token, log_usage
 from app.core.config import settings
 from app.services.image_analysis import image_analysis_service
-from typing import Dict, Any, List
+from app.services.ensemble import default_thresholds
+from app.services.profiling import annotate, stage
+from app.services.remote_inference import InferenceUnavailable
+from app.services.scheduler import analysis_scheduler
+from app.services.shadow import shadow_scorer
+from app.services.single_flight import analysis_flight
+from app.services.verdict_store import verdict_store
+from app.models.analysis import AnalysisResult, CategoryResult
+from app.models.verdict import Verdict, VerdictLookupRequest, VerdictLookupResponse, PrecheckResponse
+from typing import Dict, Any, List, Optional
 import io
 from PIL import Image
 import time
 import hashlib
+import re
 
 router = APIRouter()
 
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
 @router.post("/analyze", response_model=dict, summary="Moderate an uploaded image")  
 async def moderate_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(..., description="Image file to moderate"),
+    original_sha256: Optional[str] = Form(None, description="SHA-256 of the original when the client downscaled it"),
     token: Dict[str, Any] = Depends(get_current_token)
 ):
     """
@@ -21,6 +36,7 @@ async def moderate_image(
     
     Args:
         file: The uploaded image file
+        original_sha256: Digest of the original image, if file was downscaled from it
         token: Valid bearer token (automatically injected)
     
     Returns:
@@ -28,6 +44,8 @@ async def moderate_image(
     """
     
     start_time = time.time()
+    if original_sha256:
+        original_sha256 = _normalize_digest(original_sha256)
     
     # Validate file type
     if not file.content_type or not file.content_type.startswith("image/"):
@@ -43,7 +61,8 @@ async def moderate_image(
         )
     
     # Check file size
-    content = await file.read()
+    with stage('read_upload'):
+        content = await file.read()
     if len(content) > settings.MAX_FILE_SIZE:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
@@ -52,83 +71,90 @@ async def moderate_image(
     
     # Validate that it's actually an image by trying to open it
     try:
-        image = Image.open(io.BytesIO(content))
-        image.verify()  # Verify it's a valid image
-        
-        # Get image metadata
-        image = Image.open(io.BytesIO(content))  # Reopen after verify
-        width, height = image.size
-        format_name = image.format
-        mode = image.mode
-        
-        # Calculate image hash for potential duplicate detection
-        image_hash = hashlib.md5(content).hexdigest()
+        with stage('validate'):
+            image = Image.open(io.BytesIO(content))
+            image.verify()  # Verify it's a valid image
+            
+            # Get image metadata
+            image = Image.open(io.BytesIO(content))  # Reopen after verify
+            width, height = image.size
+            format_name = image.format
+            mode = image.mode
+            
+            # Calculate image hashes for duplicate detection and verdict lookup
+            image_hash = hashlib.md5(content).hexdigest()
+            image_digest = hashlib.sha256(content).hexdigest()
         
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid image file or corrupted data"
         )
+    annotate(sha256=image_digest, size_bytes=len(content), dimensions=[width, height], format=format_name)
     
     # Log usage
     await log_usage(token["token"], "/moderate")
     
-    # Analyze image using the enhanced image analysis service
+    # Analyze image using the enhanced image analysis service; concurrent
+    # uploads of the same bytes share one analysis, which waits for an
+    # interactive-class scheduler slot
     try:
-        moderation_results = await image_analysis_service.analyze_image(
-            image_bytes=content,
-            filename=file.filename or ""
+        moderation_results, coalesced = await analysis_flight.do(
+            image_digest,
+            lambda: analysis_scheduler.run(
+                token, "interactive",
+                lambda: image_analysis_service.analyze_image(image_bytes=content, filename=file.filename or "")
+            )
+        )
+    except InferenceUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Image analysis unavailable: {str(e)}"
         )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Image analysis failed: {str(e)}"
         )
-    
-    processing_time = int((time.time() - start_time) * 1000)  # Convert to milliseconds
-    
-    # Enhanced content safety report
-    content_safety_report = {
-        "file_info": {
-            "filename": file.filename,
-            "size_bytes": len(content),
-            "content_type": file.content_type,
-            "dimensions": {"width": width, "height": height},
-            "format": format_name,
-            "mode": mode,
-            "hash": image_hash
-        },
-        "moderation_results": moderation_results,
-        "processing_info": {
-            "api_version": "2.0.0",  # Updated version
-            "analysis_provider": moderation_results.get("provider", "unknown"),
-            "analysis_sources": moderation_results.get("analysis_sources", []),
-            "processing_time_ms": processing_time,
-            "timestamp": int(time.time())
-        },
-        "safety_summary": {
-            "is_safe": moderation_results.get("is_safe", True),
-            "overall_risk_score": moderation_results.get("overall_score", 0.0),
-            "flagged_categories": [
-                category for category, data in moderation_results.get("categories", {}).items() 
-                if data.get("detected", False)
-            ],
-            "highest_risk_category": max(
-                moderation_results.get("categories", {}).items(),
-                key=lambda x: x[1].get("confidence", 0),
-                default=("none", {"confidence": 0})
-            )[0] if moderation_results.get("categories") else "none"
-        }
+    annotate(coalesced=coalesced, provider=moderation_results.provider)
+    file_info = {
+        "filename": file.filename,
+        "size_bytes": len(content),
+        "content_type": file.content_type,
+        "dimensions": {"width": width, "height": height},
+        "format": format_name,
+        "mode": mode,
+        "hash": image_hash,
+        "sha256": image_digest
     }
+    verdict_store.record(
+        image_digest,
+        moderation_results,
+        image_analysis_service.model_version,
+        image_info={key: value for key, value in file_info.items() if key not in ("filename", "sha256")}
+    )
+    if original_sha256 and original_sha256 != image_digest:
+        # Downscaled upload: later prechecks by this token for the original find this verdict
+        file_info["original_sha256"] = original_sha256
+        verdict_store.record_alias(token["token"], original_sha256, image_digest)
     
-    # Add warnings if there were analysis errors
-    if moderation_results.get("errors"):
-        content_safety_report["warnings"] = {
-            "analysis_errors": moderation_results["errors"],
-            "message": "Some analysis methods failed. Results may be less accurate."
-        }
+    # Shadow-score a sample of traffic once the response has been sent; coalesced
+    # requests share an analysis the request that ran it may already have sampled, and
+    # reduced-quality analyses mean the service is under load and would not compare like for like
+    if (
+        not coalesced
+        and moderation_results.quality_level == "full"
+        and shadow_scorer.should_sample(image_analysis_service.queue_depth())
+    ):
+        background_tasks.add_task(
+            shadow_scorer.run, content, file.filename or "", moderation_results,
+            moderation_results.source_results
+        )
     
-    return content_safety_report
+    processing_time = int((time.time() - start_time) * 1000)  # Convert to milliseconds
+    
+    # The report is built from plain Python values, so skip response_model re-validation and encoding
+    return JSONResponse(_build_report(file_info, moderation_results, processing_time))
 
 @router.get("/categories", summary="Get available moderation categories")
 async def get_moderation_categories(token: Dict[str, Any] = Depends(get_current_token)):
@@ -193,9 +219,16 @@ async def get_moderation_categories(token: Dict[str, Any] = Depends(get_current_
     return {
         "categories": categories,
         "analysis_info": {
-            "confidence_threshold": 0.5,
+            "confidence_threshold": settings.CONTENT_SAFETY_THRESHOLD,
+            "category_thresholds": default_thresholds(),
             "supported_formats": settings.ALLOWED_IMAGE_TYPES,
             "max_file_size_mb": settings.MAX_FILE_SIZE / (1024 * 1024),
+            # Clients may downscale larger images to this before upload (None = send originals)
+            "analysis_resolution": {
+                "max_side": settings.CLIENT_MAX_IMAGE_SIDE,
+                "format": settings.CLIENT_IMAGE_FORMAT,
+                "quality": settings.CLIENT_IMAGE_QUALITY
+            } if settings.CLIENT_MAX_IMAGE_SIDE > 0 else None,
             "analysis_methods": [
                 "Google Cloud Vision API",
                 "Deep Learning Models (NSFW detection)",
@@ -260,23 +293,32 @@ async def batch_moderate_images(
                 })
                 continue
             
-            # Analyze the image
-            moderation_results = await image_analysis_service.analyze_image(
-                image_bytes=content,
-                filename=file.filename or ""
+            # Analyze the image; batches queue behind interactive requests
+            image_digest = hashlib.sha256(content).hexdigest()
+            moderation_results, _ = await analysis_flight.do(
+                image_digest,
+                lambda: analysis_scheduler.run(
+                    token, "batch",
+                    lambda: image_analysis_service.analyze_image(image_bytes=content, filename=file.filename or "")
+                )
+            )
+            verdict_store.record(
+                image_digest,
+                moderation_results,
+                image_analysis_service.model_version,
+                image_info=_image_info(content, file.content_type)
             )
             
             results.append({
                 "file_index": i,
                 "filename": file.filename,
+                "sha256": image_digest,
                 "status": "success",
-                "is_safe": moderation_results.get("is_safe", True),
-                "overall_score": moderation_results.get("overall_score", 0.0),
-                "flagged_categories": [
-                    category for category, data in moderation_results.get("categories", {}).items() 
-                    if data.get("detected", False)
-                ],
-                "analysis_provider": moderation_results.get("provider", "unknown")
+                "is_safe": moderation_results.is_safe,
+                "overall_score": moderation_results.overall_score,
+                "flagged_categories": moderation_results.flagged_categories(),
+                "analysis_provider": moderation_results.provider,
+                "quality_level": moderation_results.quality_level
             })
             
         except Exception as e:
@@ -312,6 +354,182 @@ async def batch_moderate_images(
         }
     }
 
+def _normalize_digest(digest: str) -> str:
+    """Validate a SHA-256 hex digest and return it lowercased"""
+    normalized = digest.strip().lower()
+    if not SHA256_PATTERN.fullmatch(normalized):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid SHA-256 digest: {digest}"
+        )
+    return normalized
+
+@router.get("/verdicts/{digest}", response_model=Verdict, summary="Look up a stored verdict by image digest")
+async def get_verdict(
+    digest: str,
+    token: Dict[str, Any] = Depends(get_current_token)
+):
+    """
+    Return the stored moderation verdict for an image, identified by the
+    SHA-256 digest of its bytes, without re-uploading it.
+    
+    Args:
+        digest: SHA-256 hex digest of the image bytes
+        token: Valid bearer token (automatically injected)
+    
+    Returns:
+        Verdict: The stored verdict
+    """
+    digest = _normalize_digest(digest)
+    
+    await log_usage(token["token"], "/moderate/verdicts")
+    
+    verdict = await verdict_store.get(digest, token["token"])
+    if verdict is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No verdict stored for this digest"
+        )
+    return verdict
+
+@router.post("/verdicts/lookup", response_model=VerdictLookupResponse, summary="Look up stored verdicts in bulk")
+async def lookup_verdicts(
+    request: VerdictLookupRequest,
+    token: Dict[str, Any] = Depends(get_current_token)
+):
+    """
+    Return stored verdicts for many image digests in one round trip.
+    
+    Args:
+        request: Digests to look up
+        token: Valid bearer token (automatically injected)
+    
+    Returns:
+        VerdictLookupResponse: Found verdicts and the digests with none stored
+    """
+    digests = [_normalize_digest(digest) for digest in request.digests]
+    
+    await log_usage(token["token"], f"/moderate/verdicts/lookup/{len(digests)}")
+    
+    found = await verdict_store.get_many(digests, token["token"])
+    return {
+        "found": found,
+        "missing": [digest for digest in dict.fromkeys(digests) if digest not in found],
+        "model_version": image_analysis_service.model_version
+    }
+
+@router.post("/precheck", response_model=PrecheckResponse, summary="Check image digests before uploading")
+async def precheck_images(
+    request: VerdictLookupRequest,
+    token: Dict[str, Any] = Depends(get_current_token)
+):
+    """
+    First phase of the two-phase upload protocol. The client sends the SHA-256
+    digests of the images it is about to moderate and gets full safety reports
+    back for content already judged by the current analyzer configuration.
+    Only the digests listed under "upload" need to be sent to /moderate/analyze.
+    
+    Args:
+        request: Digests of the images the client intends to upload
+        token: Valid bearer token (automatically injected)
+    
+    Returns:
+        PrecheckResponse: Cached reports for known images and the digests to upload
+    """
+    start_time = time.time()
+    digests = [_normalize_digest(digest) for digest in request.digests]
+    
+    await log_usage(token["token"], f"/moderate/precheck/{len(digests)}")
+    
+    model_version = image_analysis_service.model_version
+    found = await verdict_store.get_many(digests, token["token"])
+    # Verdicts from another analyzer configuration are stale; have those re-uploaded
+    current = {digest: verdict for digest, verdict in found.items() if verdict["model_version"] == model_version}
+    
+    processing_time = int((time.time() - start_time) * 1000)
+    return {
+        "results": {
+            digest: _cached_report(verdict, processing_time) for digest, verdict in current.items()
+        },
+        "upload": [digest for digest in dict.fromkeys(digests) if digest not in current],
+        "model_version": model_version
+    }
+
+def _build_report(file_info: Dict[str, Any], moderation_results: AnalysisResult, processing_time: int) -> dict:
+    """Assemble the content safety report returned by /moderate/analyze"""
+    content_safety_report = {
+        "file_info": file_info,
+        "moderation_results": moderation_results.to_dict(),
+        "processing_info": {
+            "api_version": "2.0.0",  # Updated version
+            "model_version": moderation_results.model_version or image_analysis_service.model_version,
+            "analysis_provider": moderation_results.provider,
+            "analysis_sources": moderation_results.analysis_sources,
+            "degraded": moderation_results.degraded,
+            "quality_level": moderation_results.quality_level,
+            "processing_time_ms": processing_time,
+            "timestamp": int(time.time())
+        },
+        "safety_summary": {
+            "is_safe": moderation_results.is_safe,
+            "overall_risk_score": moderation_results.overall_score,
+            "flagged_categories": moderation_results.flagged_categories(),
+            "highest_risk_category": moderation_results.highest_risk_category()
+        }
+    }
+    
+    # Add warnings if there were analysis errors
+    if moderation_results.errors:
+        content_safety_report["warnings"] = {
+            "analysis_errors": moderation_results.errors,
+            "message": "Some analysis methods failed. Results may be less accurate."
+        }
+    if moderation_results.degraded:
+        content_safety_report.setdefault("warnings", {
+            "message": "Some analysis methods were unavailable. Results may be less accurate."
+        })["degraded_sources"] = moderation_results.degraded_sources
+    
+    return content_safety_report
+
+def _image_info(content: bytes, content_type: str) -> Dict[str, Any]:
+    """Metadata stored with a verdict; Image.open only parses the header"""
+    image = Image.open(io.BytesIO(content))
+    return {
+        "size_bytes": len(content),
+        "content_type": content_type,
+        "dimensions": {"width": image.width, "height": image.height},
+        "format": image.format,
+        "mode": image.mode,
+        "hash": hashlib.md5(content).hexdigest()
+    }
+
+def _cached_report(verdict: Dict[str, Any], processing_time: int) -> dict:
+    """Rebuild an /analyze-shaped report from a stored verdict"""
+    image = verdict.get("image") or {}
+    file_info = {
+        "filename": None,
+        "size_bytes": image.get("size_bytes"),
+        "content_type": image.get("content_type"),
+        "dimensions": image.get("dimensions"),
+        "format": image.get("format"),
+        "mode": image.get("mode"),
+        "hash": image.get("hash"),
+        "sha256": verdict["digest"]
+    }
+    moderation_results = AnalysisResult(
+        overall_score=verdict["overall_score"],
+        is_safe=verdict["is_safe"],
+        categories={
+            category: CategoryResult(detected=data["detected"], confidence=data["confidence"])
+            for category, data in verdict["categories"].items()
+        },
+        provider="verdict_cache",
+        analysis_sources=verdict.get("analysis_sources", []),
+        model_version=verdict["model_version"],
+        cached_at=verdict["createdAt"].isoformat() if verdict.get("createdAt") else None
+    )
+    return _build_report(file_info, moderation_results, processing_time)
+
 def _get_most_common_violations(results: List[dict]) -> dict:
     """Helper function to get most common violations in batch"""
     violation_counts = {}
@@ -0,0 +1,328 @@
+# app/bulk.py
+"""
+Offline bulk moderation for backfilling large image collections.
+
+Usage:
+    python -m app.bulk /data/images --output verdicts.jsonl
+    python -m app.bulk --manifest paths.txt --output verdicts/ --format parquet --workers 8
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+from app.models.analysis import AnalysisResult
+
+logger = logging.getLogger("app.bulk")
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff', '.gif'}
+
+# Per-process state for pool workers
+_service = None
+_reader: Optional[ThreadPoolExecutor] = None
+
+
+def iter_directory(root: str) -> Iterator[str]:
+    """Yield image paths under a directory in a stable order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+
+def iter_manifest(path: str) -> Iterator[str]:
+    """Yield image paths listed one per line in a manifest file"""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def iter_chunks(paths: Iterator[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(prefetch_threads: int, compute_threads: int):
+    """Load the analysis service once per worker process"""
+    global _service, _reader
+    # Split the cores between workers instead of every worker claiming all of them
+    os.environ.setdefault("OMP_NUM_THREADS", str(compute_threads))
+    from app.services.image_analysis import image_analysis_service
+    _service = image_analysis_service
+    _reader = ThreadPoolExecutor(max_workers=prefetch_threads)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def analyze_chunk(paths: List[str]) -> List[Dict[str, Any]]:
+    """Read a chunk of files concurrently and analyze them as one batch"""
+    contents = list(_reader.map(_safe_read, paths))
+    readable = [(path, content) for path, content in zip(paths, contents) if not isinstance(content, Exception)]
+
+    records = {
+        path: {'path': path, 'error': f"read failed: {content}"}
+        for path, content in zip(paths, contents) if isinstance(content, Exception)
+    }
+    if readable:
+        results = asyncio.run(_service.analyze_images(
+            [content for _, content in readable],
+            [os.path.basename(path) for path, _ in readable]
+        ))
+        for (path, content), result in zip(readable, results):
+            records[path] = _to_record(path, content, result)
+    return [records[path] for path in paths]
+
+
+def _safe_read(path: str):
+    try:
+        return _read_file(path)
+    except Exception as e:
+        return e
+
+
+def _to_record(path: str, content: bytes, result: AnalysisResult) -> Dict[str, Any]:
+    error = '; '.join(result.errors) if result.errors else None
+    if not result.analysis_sources:
+        # Nothing could be analyzed; the fallback result is not a verdict
+        return {'path': path, 'sha256': hashlib.sha256(content).hexdigest(), 'size_bytes': len(content), 'error': error}
+    return {
+        'path': path,
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'size_bytes': len(content),
+        'is_safe': result.is_safe,
+        'overall_score': result.overall_score,
+        'categories': {category: data.confidence for category, data in result.categories.items()},
+        'flagged_categories': result.flagged_categories(),
+        # Analyzers that failed or were skipped (e.g. Google Vision behind an open breaker)
+        'degraded_sources': result.degraded_sources,
+        'error': error
+    }
+
+
+class JsonlWriter:
+    """Appends one JSON record per line"""
+
+    def __init__(self, path: str):
+        self.file = open(path, 'a')
+
+    def write(self, records: List[Dict[str, Any]]) -> bool:
+        """Write records; returns True once they are durable"""
+        for record in records:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        # The checkpoint is fsynced right after; the lines must be on disk before it
+        os.fsync(self.file.fileno())
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Writes records as columnar Parquet part files under a directory"""
+
+    def __init__(self, directory: str, rows_per_file: int = 50_000):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow: pip install pyarrow")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.pending: List[Dict[str, Any]] = []
+        self.part = len([name for name in os.listdir(directory) if name.endswith('.parquet')])
+
+    def write(self, records: List[Dict[str, Any]]) -> bool:
+        """Buffer records; returns True when a part file was written"""
+        self.pending.extend(records)
+        if len(self.pending) >= self.rows_per_file:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        if not self.pending:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from app.services.ensemble import CATEGORIES
+
+        columns = {
+            'path': [r['path'] for r in self.pending],
+            'sha256': [r.get('sha256') for r in self.pending],
+            'size_bytes': [r.get('size_bytes') for r in self.pending],
+            'is_safe': [r.get('is_safe') for r in self.pending],
+            'overall_score': [r.get('overall_score') for r in self.pending],
+            'degraded': [bool(r.get('degraded_sources')) for r in self.pending],
+            'error': [r.get('error') for r in self.pending],
+        }
+        for category in CATEGORIES:
+            columns[category] = [r.get('categories', {}).get(category) for r in self.pending]
+            columns[f'{category}_detected'] = [category in r.get('flagged_categories', []) for r in self.pending]
+
+        path = os.path.join(self.directory, f'part-{self.part:05d}.parquet')
+        pq.write_table(pa.table(columns), path)
+        # Durable before the checkpoint claims these paths
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.part += 1
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+
+class Checkpoint:
+    """Append-only list of completed paths so interrupted runs can resume"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.rstrip('\n') for line in f if line.strip()}
+        self.file = open(path, 'a')
+
+    def mark(self, paths: List[str]):
+        self.file.write(''.join(path + '\n' for path in paths))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    paths = iter_manifest(args.manifest) if args.manifest else iter_directory(args.source)
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output.rstrip('/')}.checkpoint")
+    skipped = len(checkpoint.done)
+    pending_paths = (path for path in paths if path not in checkpoint.done)
+    if skipped:
+        logger.info(f"Resuming: {skipped} images already processed")
+
+    writer = ParquetWriter(args.output) if args.format == 'parquet' else JsonlWriter(args.output)
+
+    processed = 0
+    unsafe = 0
+    failed = 0
+    degraded = 0
+    start = time.monotonic()
+    last_report = start
+
+    # Results must be durable before the checkpoint claims them
+    unflushed: List[str] = []
+
+    def handle(records: List[Dict[str, Any]]):
+        nonlocal processed, unsafe, failed, degraded, last_report, unflushed
+        unflushed.extend(record['path'] for record in records)
+        if writer.write(records):
+            checkpoint.mark(unflushed)
+            unflushed = []
+        processed += len(records)
+        unsafe += sum(1 for record in records if record.get('is_safe') is False)
+        # Failed: no verdict at all. Degraded: a verdict from fewer analyzers than configured
+        failed += sum(1 for record in records if record.get('is_safe') is None)
+        degraded += sum(
+            1 for record in records
+            if record.get('is_safe') is not None and (record.get('degraded_sources') or record.get('error'))
+        )
+
+        now = time.monotonic()
+        if now - last_report >= args.report_interval:
+            logger.info(f"{processed} images, {processed / (now - start):.1f} images/s")
+            last_report = now
+
+    chunks = iter_chunks(pending_paths, args.batch_size)
+    try:
+        if args.workers <= 1:
+            _init_worker(args.prefetch, os.cpu_count() or 1)
+            for chunk in chunks:
+                handle(analyze_chunk(chunk))
+        else:
+            # Bounded window of in-flight chunks keeps memory flat on huge inputs
+            max_in_flight = args.workers * args.queue_depth
+            with ProcessPoolExecutor(
+                max_workers=args.workers,
+                initializer=_init_worker,
+                initargs=(args.prefetch, max(1, (os.cpu_count() or 1) // args.workers))
+            ) as pool:
+                in_flight = set()
+                for chunk in chunks:
+                    in_flight.add(pool.submit(analyze_chunk, chunk))
+                    if len(in_flight) >= max_in_flight:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            handle(future.result())
+                for future in in_flight:
+                    handle(future.result())
+    finally:
+        writer.close()
+        checkpoint.mark(unflushed)
+        checkpoint.close()
+
+    elapsed = time.monotonic() - start
+    summary = {
+        'processed': processed,
+        'skipped_from_checkpoint': skipped,
+        'unsafe': unsafe,
+        'failed': failed,
+        'degraded': degraded,
+        'elapsed_seconds': round(elapsed, 2),
+        'images_per_second': round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+        'workers': args.workers
+    }
+    logger.info(f"Done: {json.dumps(summary)}")
+    return summary
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Re-moderate a directory or manifest of images offline")
+    parser.add_argument('source', nargs='?', help="Directory to scan for images")
+    parser.add_argument('--manifest', help="File with one image path per line (instead of a directory)")
+    parser.add_argument('--output', required=True, help="JSONL file, or directory for Parquet parts")
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl')
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--batch-size', type=int, default=16, help="Images per inference batch")
+    parser.add_argument('--prefetch', type=int, default=4, help="File reader threads per worker")
+    parser.add_argument('--queue-depth', type=int, default=2, help="In-flight batches per worker")
+    parser.add_argument('--report-interval', type=float, default=10.0, help="Seconds between throughput logs")
+    args = parser.parse_args(argv)
+    if not args.source and not args.manifest:
+        parser.error("either a source directory or --manifest is required")
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    summary = run(parse_args(argv))
+    print(json.dumps(summary))
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,10 +5,29 @@ class Settings:
     # MongoDB settings
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "image_moderation")
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+    MONGODB_MIN_POOL_SIZE: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+    MONGODB_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "0"))  # 0 = never close idle connections
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "0"))  # 0 = wait for a free connection indefinitely
+    MONGODB_CONNECT_TIMEOUT_MS: int = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "20000"))
+    MONGODB_SOCKET_TIMEOUT_MS: int = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "0"))  # 0 = no timeout
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+    MONGODB_COMPRESSORS: str = os.getenv("MONGODB_COMPRESSORS", "")  # e.g. "zstd,zlib"; zstd needs the zstandard package
+    MONGODB_MAJORITY_WTIMEOUT_MS: int = int(os.getenv("MONGODB_MAJORITY_WTIMEOUT_MS", "5000"))
+    MONGODB_STATS_READ_PREFERENCE: str = os.getenv("MONGODB_STATS_READ_PREFERENCE", "secondaryPreferred")
+    
+    # Usage logging (batched, telemetry write concern)
+    USAGE_WRITE_CONCERN: int = int(os.getenv("USAGE_WRITE_CONCERN", "1"))  # 0 = unacknowledged
+    USAGE_FLUSH_BATCH_SIZE: int = int(os.getenv("USAGE_FLUSH_BATCH_SIZE", "200"))
+    USAGE_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "1.0"))
     
     # Security settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     TOKEN_LENGTH: int = 32
+    # Admin token management: listing page size cap, export cursor batch, bulk create/revoke cap
+    TOKEN_PAGE_MAX_SIZE: int = int(os.getenv("TOKEN_PAGE_MAX_SIZE", "1000"))
+    TOKEN_EXPORT_BATCH_SIZE: int = int(os.getenv("TOKEN_EXPORT_BATCH_SIZE", "1000"))
+    TOKEN_BULK_MAX: int = int(os.getenv("TOKEN_BULK_MAX", "1000"))
 
     INITIAL_ADMIN_TOKEN: Optional[str] = os.getenv("INITIAL_ADMIN_TOKEN", None)
     
@@ -24,14 +43,32 @@ class Settings:
     ]
     
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", str(10 * 1024 * 1024)))  # 10MB default
+    # Resolution advertised to clients (/moderate/categories) for downscaling before
+    # upload; keep it at or above TILE_MIN_IMAGE_SIDE when tiled analysis is on
+    CLIENT_MAX_IMAGE_SIDE: int = int(os.getenv("CLIENT_MAX_IMAGE_SIDE", "1536"))  # 0 = upload originals
+    CLIENT_IMAGE_FORMAT: str = os.getenv("CLIENT_IMAGE_FORMAT", "image/jpeg")
+    CLIENT_IMAGE_QUALITY: float = float(os.getenv("CLIENT_IMAGE_QUALITY", "0.9"))
     
     # AI Model Settings
     USE_GPU_ACCELERATION: bool = os.getenv("USE_GPU_ACCELERATION", "false").lower() == "true"
     HUGGINGFACE_CACHE_DIR: str = os.getenv("HUGGINGFACE_CACHE_DIR", "./models_cache")
     
+    NSFW_MODEL: str = os.getenv("NSFW_MODEL", "Falconsai/nsfw_image_detection")  # also the shared backbone for category heads
+    CATEGORY_HEADS_DIR: str = os.getenv("CATEGORY_HEADS_DIR", "")  # <category>.npz linear probes on NSFW_MODEL features
+    
     # Google Cloud Vision Settings
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
     GOOGLE_CLOUD_PROJECT: str = os.getenv("GOOGLE_CLOUD_PROJECT", "")
+    GOOGLE_VISION_ENDPOINT: str = os.getenv("GOOGLE_VISION_ENDPOINT", "")  # host:port of a plaintext fake, for testing
+    GOOGLE_VISION_TIMEOUT_SECONDS: float = float(os.getenv("GOOGLE_VISION_TIMEOUT_SECONDS", "5"))
+    
+    # Google Vision circuit breaker
+    VISION_BREAKER_WINDOW_SECONDS: float = float(os.getenv("VISION_BREAKER_WINDOW_SECONDS", "60"))
+    VISION_BREAKER_MIN_CALLS: int = int(os.getenv("VISION_BREAKER_MIN_CALLS", "10"))
+    VISION_BREAKER_FAILURE_RATE: float = float(os.getenv("VISION_BREAKER_FAILURE_RATE", "0.5"))
+    VISION_BREAKER_SLOW_CALL_MS: float = float(os.getenv("VISION_BREAKER_SLOW_CALL_MS", "2500"))
+    VISION_BREAKER_OPEN_SECONDS: float = float(os.getenv("VISION_BREAKER_OPEN_SECONDS", "30"))
+    VISION_BREAKER_HALF_OPEN_PROBES: int = int(os.getenv("VISION_BREAKER_HALF_OPEN_PROBES", "3"))
     
     # Analysis Thresholds
     CONTENT_SAFETY_THRESHOLD: float = float(os.getenv("CONTENT_SAFETY_THRESHOLD", "0.5"))
@@ -39,13 +76,107 @@ class Settings:
     NUDITY_THRESHOLD: float = float(os.getenv("NUDITY_THRESHOLD", "0.5"))
     WEAPONS_THRESHOLD: float = float(os.getenv("WEAPONS_THRESHOLD", "0.7"))
     
+    # Ensemble Combiner
+    ENSEMBLE_SOURCE_WEIGHTS: str = os.getenv("ENSEMBLE_SOURCE_WEIGHTS", "")  # e.g. "google_vision=1.5,image_properties=0.5"
+    ENSEMBLE_CALIBRATION_PATH: str = os.getenv("ENSEMBLE_CALIBRATION_PATH", "")  # JSON, logistic/isotonic per category
+    
+    # Server Settings (python -m app.server)
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", "7000"))
+    WEB_WORKERS: int = int(os.getenv("WEB_WORKERS", "1"))
+    THREADS_PER_WORKER: int = int(os.getenv("THREADS_PER_WORKER", "0"))  # OMP/MKL and executor plan core budget; 0 = cores / workers
+    MEMORY_REPORT_INTERVAL_SECONDS: float = float(os.getenv("MEMORY_REPORT_INTERVAL_SECONDS", "300"))
+    
     # Performance Settings
-    MAX_CONCURRENT_ANALYSES: int = int(os.getenv("MAX_CONCURRENT_ANALYSES", "4"))
+    # Analyses running at once per worker; the rest queue by priority class and token weight.
+    # 0 = executor threads, or connections to the inference workers when INFERENCE_WORKERS is set
+    MAX_CONCURRENT_ANALYSES: int = int(os.getenv("MAX_CONCURRENT_ANALYSES", "0"))
+    SCHEDULER_ADMIN_WEIGHT: float = float(os.getenv("SCHEDULER_ADMIN_WEIGHT", "4"))  # admin tokens without a stored weight
+    
+    # Load-adaptive quality ladder (opt-in, trades accuracy for throughput): under load, analyses
+    # step down through reduced resolution, no Hough lines/getcolors, no Google Vision and ML only
+    QUALITY_LADDER_ENABLED: bool = os.getenv("QUALITY_LADDER_ENABLED", "false").lower() == "true"
+    QUALITY_QUEUE_DEPTH_LIMIT: float = float(os.getenv("QUALITY_QUEUE_DEPTH_LIMIT", "16"))  # analyzer jobs waiting for a thread
+    QUALITY_IN_FLIGHT_LIMIT: float = float(os.getenv("QUALITY_IN_FLIGHT_LIMIT", "16"))  # analyses running or waiting for a slot
+    QUALITY_P95_LIMIT_MS: float = float(os.getenv("QUALITY_P95_LIMIT_MS", "5000"))
+    QUALITY_STEP_PRESSURES: str = os.getenv("QUALITY_STEP_PRESSURES", "1,1.5,2,3")  # load / limit entering each lower level
+    QUALITY_RECOVER_RATIO: float = float(os.getenv("QUALITY_RECOVER_RATIO", "0.75"))
+    QUALITY_RECOVER_SECONDS: float = float(os.getenv("QUALITY_RECOVER_SECONDS", "5"))  # calm needed per step back up
+    QUALITY_LATENCY_WINDOW_SECONDS: float = float(os.getenv("QUALITY_LATENCY_WINDOW_SECONDS", "30"))
+    QUALITY_REDUCED_MAX_SIDE: int = int(os.getenv("QUALITY_REDUCED_MAX_SIDE", "1024"))  # working resolution below full
+    
+    # Latency diagnostics: slow-request capture (0 = off) and the on-demand sampling profiler
+    SLOW_REQUEST_THRESHOLD_MS: float = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "2000"))
+    SLOW_REQUEST_BUFFER_SIZE: int = int(os.getenv("SLOW_REQUEST_BUFFER_SIZE", "200"))
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+    
+    # Analyzer executors per cost class (0 = derive from the host's core count)
+    IO_EXECUTOR_WORKERS: int = int(os.getenv("IO_EXECUTOR_WORKERS", "8"))
+    CV_EXECUTOR_WORKERS: int = int(os.getenv("CV_EXECUTOR_WORKERS", "0"))
+    CV_BUFFER_POOL_MAX_MB: int = int(os.getenv("CV_BUFFER_POOL_MAX_MB", "256"))  # idle working buffers kept for reuse
+    ML_EXECUTOR_WORKERS: int = int(os.getenv("ML_EXECUTOR_WORKERS", "1"))
+    TORCH_NUM_THREADS: int = int(os.getenv("TORCH_NUM_THREADS", "0"))
+    CV2_NUM_THREADS: int = int(os.getenv("CV2_NUM_THREADS", "0"))
+    AUTO_TUNE_EXECUTORS: bool = os.getenv("AUTO_TUNE_EXECUTORS", "false").lower() == "true"
+    AUTO_TUNE_INTERVAL_SECONDS: float = float(os.getenv("AUTO_TUNE_INTERVAL_SECONDS", "0"))  # 0 = startup only
     ANALYSIS_TIMEOUT_SECONDS: int = int(os.getenv("ANALYSIS_TIMEOUT_SECONDS", "30"))
     
     # Batch Processing
     MAX_BATCH_SIZE: int = int(os.getenv("MAX_BATCH_SIZE", "10"))
     
+    # Multi-frame Analysis (animated GIF/WebP, multi-page TIFF)
+    FRAME_SAMPLING_STRATEGY: str = os.getenv("FRAME_SAMPLING_STRATEGY", "uniform")  # keyframes, uniform, scene_change
+    MAX_SAMPLED_FRAMES: int = int(os.getenv("MAX_SAMPLED_FRAMES", "16"))
+    FRAME_BATCH_SIZE: int = int(os.getenv("FRAME_BATCH_SIZE", "4"))
+    SCENE_CHANGE_THRESHOLD: float = float(os.getenv("SCENE_CHANGE_THRESHOLD", "0.3"))
+    
+    # Region-of-interest Tiling (small content in large images)
+    ENABLE_TILED_ANALYSIS: bool = os.getenv("ENABLE_TILED_ANALYSIS", "false").lower() == "true"
+    TILE_MIN_IMAGE_SIDE: int = int(os.getenv("TILE_MIN_IMAGE_SIDE", "1024"))
+    TILE_SIZE: int = int(os.getenv("TILE_SIZE", "384"))
+    MAX_TILES: int = int(os.getenv("MAX_TILES", "8"))
+    TILE_BATCH_SIZE: int = int(os.getenv("TILE_BATCH_SIZE", "4"))
+    TILE_MIN_DENSITY: float = float(os.getenv("TILE_MIN_DENSITY", "0.2"))
+    TILE_DECISIVE_SCORE: float = float(os.getenv("TILE_DECISIVE_SCORE", "0.85"))
+    
+    # Verdict Store
+    MODEL_VERSION: str = os.getenv("MODEL_VERSION", "")  # default: derived from the analyzer configuration
+    VERDICT_FLUSH_BATCH_SIZE: int = int(os.getenv("VERDICT_FLUSH_BATCH_SIZE", "500"))
+    VERDICT_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("VERDICT_FLUSH_INTERVAL_SECONDS", "0.5"))
+    MAX_VERDICT_LOOKUP: int = int(os.getenv("MAX_VERDICT_LOOKUP", "5000"))
+    
+    # Similarity Index (near-duplicates of confirmed-unsafe images, matched by embedding)
+    SIMILARITY_INDEX_DIR: str = os.getenv("SIMILARITY_INDEX_DIR", "")  # empty = disabled
+    SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.95"))  # cosine similarity
+    SIMILARITY_NPROBE: int = int(os.getenv("SIMILARITY_NPROBE", "8"))  # IVF lists searched per query
+    SIMILARITY_NLIST: int = int(os.getenv("SIMILARITY_NLIST", "0"))  # IVF lists on rebuild; 0 = ~sqrt(entries)
+    
+    # Shadow Scoring (candidate analyzer configuration on sampled live traffic)
+    SHADOW_MODE_ENABLED: bool = os.getenv("SHADOW_MODE_ENABLED", "false").lower() == "true"
+    SHADOW_SAMPLE_RATE: float = float(os.getenv("SHADOW_SAMPLE_RATE", "0.05"))
+    SHADOW_NSFW_MODEL: str = os.getenv("SHADOW_NSFW_MODEL", "")  # defaults to NSFW_MODEL
+    SHADOW_SOURCE_WEIGHTS: str = os.getenv("SHADOW_SOURCE_WEIGHTS", "")
+    SHADOW_CALIBRATION_PATH: str = os.getenv("SHADOW_CALIBRATION_PATH", "")
+    SHADOW_MAX_QUEUE_DEPTH: int = int(os.getenv("SHADOW_MAX_QUEUE_DEPTH", "8"))
+    SHADOW_MAX_IN_FLIGHT: int = int(os.getenv("SHADOW_MAX_IN_FLIGHT", "2"))
+    SHADOW_STORE_SIZE: int = int(os.getenv("SHADOW_STORE_SIZE", "10000"))
+    
+    # Internal binary (msgpack-framed) API
+    INTERNAL_MAX_BATCH_SIZE: int = int(os.getenv("INTERNAL_MAX_BATCH_SIZE", "256"))  # images per request
+    INTERNAL_MAX_IN_FLIGHT: int = int(os.getenv("INTERNAL_MAX_IN_FLIGHT", "8"))  # concurrent analyses per request
+    
+    # Inference worker tier: API processes with INFERENCE_WORKERS set (comma-separated
+    # http://host:port) load no models and send analyses to app.worker processes
+    INFERENCE_WORKERS: str = os.getenv("INFERENCE_WORKERS", "")
+    INFERENCE_MAX_ATTEMPTS: int = int(os.getenv("INFERENCE_MAX_ATTEMPTS", "2"))  # distinct workers tried per image
+    INFERENCE_UNHEALTHY_AFTER: int = int(os.getenv("INFERENCE_UNHEALTHY_AFTER", "2"))  # consecutive failures
+    INFERENCE_HEALTH_INTERVAL_SECONDS: float = float(os.getenv("INFERENCE_HEALTH_INTERVAL_SECONDS", "5"))
+    INFERENCE_CONNECTIONS_PER_WORKER: int = int(os.getenv("INFERENCE_CONNECTIONS_PER_WORKER", "32"))
+    # Micro-batching of concurrent model calls (0 = off; app.worker defaults it to 5 ms)
+    ML_BATCH_WAIT_MS: float = float(os.getenv("ML_BATCH_WAIT_MS", "0"))
+    ML_BATCH_MAX_SIZE: int = int(os.getenv("ML_BATCH_MAX_SIZE", "8"))
+    
     # Logging
     LOG_ANALYSIS_RESULTS: bool = os.getenv("LOG_ANALYSIS_RESULTS", "true").lower() == "true"
     LOG_PROCESSING_TIME: bool = os.getenv("LOG_PROCESSING_TIME", "true").lower() == "true"
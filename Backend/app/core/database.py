@@ -1,7 +1,12 @@
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import WriteConcern, monitoring
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
 from app.core.config import settings
-from typing import Optional
+from app.core.metrics import Counter, Gauge, Histogram
+from typing import Any, Dict, Optional
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -9,12 +14,120 @@ logger = logging.getLogger(__name__)
 mongodb_client: Optional[AsyncIOMotorClient] = None
 database: Optional[AsyncIOMotorDatabase] = None
 
+# Per-workload collection options, see get_collection()
+#   telemetry: usage logs; batched, w=1 or unacknowledged (USAGE_WRITE_CONCERN=0)
+#   durable:   token creation/revocation; must survive a primary failover
+#   analytics: usage statistics; may lag slightly, so read from secondaries when present
+PROFILES = ("telemetry", "durable", "analytics")
+
+pool_checkouts = Counter(
+    "mongodb_pool_checkouts_total",
+    "Connection checkouts from the MongoDB pool by outcome",
+    labelnames=("outcome",)
+)
+pool_wait_seconds = Histogram(
+    "mongodb_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the MongoDB pool",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+pool_checked_out = Gauge("mongodb_pool_checked_out", "MongoDB connections currently checked out")
+pool_connections = Gauge("mongodb_pool_connections", "Open MongoDB connections")
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Feeds connection pool events into the metrics registry.
+
+    Check-out started and checked-out/failed events for one operation fire on
+    the same thread (Motor runs PyMongo calls in its executor), so the wait
+    start is kept in a thread-local.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _wait_seconds(self) -> Optional[float]:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else None
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._wait_seconds()
+        if waited is not None:
+            pool_wait_seconds.observe(waited)
+        pool_checkouts.inc(outcome="ok")
+        pool_checked_out.inc()
+
+    def connection_check_out_failed(self, event):
+        waited = self._wait_seconds()
+        if waited is not None:
+            pool_wait_seconds.observe(waited)
+        pool_checkouts.inc(outcome=event.reason)
+
+    def connection_checked_in(self, event):
+        pool_checked_out.dec()
+
+    def connection_created(self, event):
+        pool_connections.inc()
+
+    def connection_closed(self, event):
+        pool_connections.dec()
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        logger.warning(f"MongoDB connection pool cleared for {event.address}")
+
+    def pool_closed(self, event):
+        pass
+
+
+def _client_options() -> Dict[str, Any]:
+    """Pool, timeout and compression settings for the MongoClient"""
+    options = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [PoolMetricsListener()]
+    }
+    # 0 means "unset" for these; PyMongo's own defaults then apply
+    if settings.MONGODB_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = settings.MONGODB_MAX_IDLE_TIME_MS
+    if settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS
+    if settings.MONGODB_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = settings.MONGODB_SOCKET_TIMEOUT_MS
+    if settings.MONGODB_COMPRESSORS:
+        options["compressors"] = settings.MONGODB_COMPRESSORS
+    return options
+
+def _profile_options(profile: str) -> Dict[str, Any]:
+    if profile == "telemetry":
+        return {"write_concern": WriteConcern(w=settings.USAGE_WRITE_CONCERN)}
+    if profile == "durable":
+        return {"write_concern": WriteConcern(w="majority", wtimeout=settings.MONGODB_MAJORITY_WTIMEOUT_MS)}
+    if profile == "analytics":
+        mode = read_pref_mode_from_name(settings.MONGODB_STATS_READ_PREFERENCE)
+        return {"read_preference": make_read_preference(mode, None)}
+    raise ValueError(f"Unknown collection profile '{profile}'. Expected one of {PROFILES}")
+
 async def connect_to_mongo():
     """Create database connection and initialize collections"""
     global mongodb_client, database
     
     try:
-        mongodb_client = AsyncIOMotorClient(settings.MONGODB_URL)
+        mongodb_client = AsyncIOMotorClient(settings.MONGODB_URL, **_client_options())
         database = mongodb_client[settings.DATABASE_NAME]
         
         # Test the connection
@@ -45,6 +158,10 @@ def get_db() -> AsyncIOMotorDatabase:
         raise Exception("Database not initialized. Call connect_to_mongo() first.")
     return database
 
+def get_collection(name: str, profile: str) -> AsyncIOMotorCollection:
+    """Get a collection with the write concern / read preference of a workload profile"""
+    return get_db().get_collection(name, **_profile_options(profile))
+
 async def create_indexes():
     """Create database indexes for better performance"""
     db = get_db()
@@ -52,12 +169,22 @@ async def create_indexes():
     # Create index on tokens collection
     await db.tokens.create_index("token", unique=True)
     await db.tokens.create_index("createdAt")
+    # Keyset pagination of the admin listing, optionally filtered by isAdmin
+    await db.tokens.create_index([("createdAt", -1), ("_id", -1)])
+    await db.tokens.create_index([("isAdmin", 1), ("createdAt", -1), ("_id", -1)])
     
     # Create indexes on usages collection
     await db.usages.create_index("token")
     await db.usages.create_index("timestamp")
     await db.usages.create_index([("token", 1), ("timestamp", -1)])
     
+    # Create indexes on verdicts collection (_id is the content digest)
+    await db.verdicts.create_index("createdAt")
+    await db.verdicts.create_index([("model_version", 1), ("createdAt", -1)])
+    
+    # Per-token aliases from the digest of an original to that of its downscaled upload
+    await db.verdict_aliases.create_index([("token", 1), ("original", 1)], unique=True)
+    
     logger.info("Database indexes created successfully")
 
 async def create_initial_admin_token():
@@ -75,5 +202,5 @@ async def create_initial_admin_token():
             "isAdmin": True,
             "createdAt": datetime.utcnow()
         }
-        await db.tokens.insert_one(token_doc)
+        await get_collection("tokens", "durable").insert_one(token_doc)
         logger.info("Initial admin token created")
\ No newline at end of file
@@ -54,15 +54,7 @@ async def get_admin_token(current_token: Dict[str, Any] = Depends(get_current_to
     return current_token
 
 async def log_usage(token: str, endpoint: str):
-    """Log API usage to the database"""
-    from app.core.database import get_db
-    from datetime import datetime
-    
-    db = get_db()
-    usage_doc = {
-        "token": token,
-        "endpoint": endpoint,
-        "timestamp": datetime.utcnow()
-    }
+    """Log API usage; records are buffered and written in batches"""
+    from app.services.usage_log import usage_log
     
-    await db.usages.insert_one(usage_doc)
\ No newline at end of file
+    usage_log.record(token, endpoint)
@@ -1,7 +1,15 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import auth, moderation
+from app.api import admin, auth, internal, moderation
 from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.config import settings
+from app.core.metrics import REGISTRY
+from app.services.image_analysis import image_analysis_service
+from app.services.profiling import RequestTimingMiddleware
+from app.services.tuning import executor_tuner
+from app.services.usage_log import usage_log
+from app.services.verdict_store import verdict_store
 
 app = FastAPI(
     title="Image Moderation API",
@@ -17,9 +25,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage timing of every request; slow ones are kept for /admin/slow-requests
+app.add_middleware(RequestTimingMiddleware)
+
 # Mount API routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(moderation.router, prefix="/moderate", tags=["Moderation"])
+app.include_router(admin.router, prefix="/admin", tags=["Administration"])
+app.include_router(internal.router, prefix="/internal", tags=["Internal"])
 
 # Health check endpoint
 @app.get("/", tags=["Health"])
@@ -28,13 +41,47 @@ async def root():
 
 @app.get("/health", tags=["Health"])
 async def health_check():
-    return {"status": "healthy"}
+    vision_breaker = image_analysis_service.vision_breaker
+    remote = image_analysis_service.remote
+    if remote is not None:
+        workers = remote.snapshot()
+        degraded = not any(worker["healthy"] for worker in workers)
+        dependencies = {"inference_workers": workers}
+    else:
+        degraded = vision_breaker.is_open
+        dependencies = {
+            "google_vision": {
+                "configured": image_analysis_service.google_client is not None,
+                "circuit_breaker": vision_breaker.snapshot()
+            }
+        }
+    return {
+        "status": "degraded" if degraded else "healthy",
+        "dependencies": dependencies
+    }
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 # Lifecycle events for MongoDB connection
 @app.on_event("startup")
 async def startup_event():
     await connect_to_mongo()
+    verdict_store.start()
+    usage_log.start()
+    if image_analysis_service.remote is not None:
+        await image_analysis_service.remote.start()
+    # In remote mode there are no local analyzer pools to tune
+    if settings.AUTO_TUNE_EXECUTORS and image_analysis_service.remote is None:
+        await executor_tuner.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    executor_tuner.stop()
+    if image_analysis_service.remote is not None:
+        await image_analysis_service.remote.stop()
+    await verdict_store.stop()
+    await usage_log.stop()
     await close_mongo_connection()
\ No newline at end of file
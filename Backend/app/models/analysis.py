@@ -0,0 +1,85 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Analyzer and combiner outputs. These are plain slotted dataclasses rather than
+# pydantic models: they are created on every request and only turned into
+# JSON-ready dicts once, at the API edge, via to_dict().
+
+@dataclass(slots=True)
+class SourceResult:
+    """Per-category scores from one analyzer, or the error it hit"""
+    source: str
+    categories: Optional[Dict[str, float]] = None
+    details: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @classmethod
+    def failed(cls, source: str, error: Exception) -> 'SourceResult':
+        return cls(source=source, error=str(error))
+
+@dataclass(slots=True)
+class CategoryResult:
+    """Combined detection result for a single moderation category"""
+    detected: bool
+    confidence: float
+
+@dataclass(slots=True)
+class AnalysisResult:
+    """Combined moderation verdict for one image"""
+    overall_score: float
+    is_safe: bool
+    categories: Dict[str, CategoryResult]
+    provider: str = 'enhanced_multi_model'
+    analysis_sources: List[str] = field(default_factory=list)
+    errors: Optional[List[str]] = None
+    # Analyzers that failed or were skipped, so the verdict rests on fewer sources
+    degraded_sources: List[str] = field(default_factory=list)
+    # Raw analyzer outputs the verdict was combined from; internal, never serialized
+    source_results: List[SourceResult] = field(default_factory=list)
+    frames: Optional[Dict[str, Any]] = None
+    model_version: Optional[str] = None
+    cached_at: Optional[str] = None
+    # Set when the verdict was taken from a known image with a near-identical embedding
+    similar_to: Optional[Dict[str, Any]] = None
+    # Quality ladder level the analysis ran at (app/services/quality.py)
+    quality_level: str = 'full'
+    # Wall time of this process's own analyzers, Google Vision wait excluded; internal, never serialized
+    local_analysis_ms: Optional[float] = None
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.degraded_sources)
+
+    def flagged_categories(self) -> List[str]:
+        return [category for category, result in self.categories.items() if result.detected]
+
+    def highest_risk_category(self) -> str:
+        if not self.categories:
+            return 'none'
+        return max(self.categories.items(), key=lambda item: item[1].confidence)[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready representation used in API responses"""
+        data = {
+            'overall_score': self.overall_score,
+            'is_safe': self.is_safe,
+            'categories': {
+                category: {'detected': result.detected, 'confidence': result.confidence}
+                for category, result in self.categories.items()
+            },
+            'provider': self.provider,
+            'analysis_sources': self.analysis_sources,
+            'errors': self.errors,
+            'degraded': self.degraded,
+            'degraded_sources': self.degraded_sources,
+            'quality_level': self.quality_level
+        }
+        if self.frames is not None:
+            data['frames'] = self.frames
+        if self.model_version is not None:
+            data['model_version'] = self.model_version
+        if self.cached_at is not None:
+            data['cached_at'] = self.cached_at
+        if self.similar_to is not None:
+            data['similar_to'] = self.similar_to
+        return data
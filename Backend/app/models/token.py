@@ -1,16 +1,31 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional
+from app.core.config import settings
+
+PriorityClass = Literal["interactive", "batch", "background"]
+
+# Stored token fields an admin listing can project
+TOKEN_FIELDS = ("token", "isAdmin", "createdAt", "priorityClass", "weight")
 
 class TokenCreate(BaseModel):
     """Model for creating a new token"""
     isAdmin: bool = Field(..., description="Whether this token has admin privileges")
+    priorityClass: PriorityClass = Field("interactive", description="Highest scheduling class this token's analyses run in")
+    weight: Optional[float] = Field(None, gt=0, description="Fair-queuing weight among tokens in the same class (default 1, admin tokens SCHEDULER_ADMIN_WEIGHT)")
+
+class TokenScheduling(BaseModel):
+    """Model for changing a token's scheduling class and weight"""
+    priorityClass: PriorityClass = Field(..., description="Highest scheduling class this token's analyses run in")
+    weight: Optional[float] = Field(None, gt=0, description="Fair-queuing weight among tokens in the same class; null for the default")
 
 class Token(BaseModel):
     """Model representing a token in the database"""
     token: str = Field(..., description="The bearer token string")
     isAdmin: bool = Field(..., description="Whether this token has admin privileges")
     createdAt: datetime = Field(..., description="When the token was created")
+    priorityClass: PriorityClass = Field("interactive", description="Highest scheduling class this token's analyses run in")
+    weight: Optional[float] = Field(None, description="Fair-queuing weight (null = default)")
     
     class Config:
         json_encoders = {
@@ -22,9 +37,27 @@ class TokenResponse(BaseModel):
     token: str = Field(..., description="The created bearer token")
     isAdmin: bool = Field(..., description="Whether this token has admin privileges")
     createdAt: datetime = Field(..., description="When the token was created")
+    priorityClass: PriorityClass = Field(..., description="Highest scheduling class this token's analyses run in")
+    weight: Optional[float] = Field(None, description="Fair-queuing weight (null = default)")
     message: str = Field(..., description="Success message")
     
     class Config:
         json_encoders = {
             datetime: lambda v: v.isoformat()
-        }
\ No newline at end of file
+        }
+
+class TokenPage(BaseModel):
+    """One page of the admin token listing, newest first"""
+    tokens: List[Dict[str, Any]] = Field(..., description="Tokens on this page, with the requested fields")
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page; null on the last page")
+
+class TokenBulkCreate(BaseModel):
+    """Model for creating many tokens with the same settings"""
+    count: int = Field(..., ge=1, le=settings.TOKEN_BULK_MAX, description="Number of tokens to create")
+    isAdmin: bool = Field(False, description="Whether these tokens have admin privileges")
+    priorityClass: PriorityClass = Field("interactive", description="Highest scheduling class these tokens' analyses run in")
+    weight: Optional[float] = Field(None, gt=0, description="Fair-queuing weight among tokens in the same class")
+
+class TokenBulkDelete(BaseModel):
+    """Model for revoking many tokens at once"""
+    tokens: List[str] = Field(..., min_length=1, max_length=settings.TOKEN_BULK_MAX, description="Token strings to revoke")
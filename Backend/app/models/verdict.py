@@ -0,0 +1,70 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+class CategoryVerdict(BaseModel):
+    """Detection result for a single moderation category"""
+    detected: bool = Field(..., description="Whether the category was flagged")
+    confidence: float = Field(..., description="Combined confidence score")
+
+class Verdict(BaseModel):
+    """A stored moderation verdict for one image digest"""
+    digest: str = Field(..., description="SHA-256 hex digest of the image bytes")
+    is_safe: bool = Field(..., description="Overall safety verdict")
+    overall_score: float = Field(..., description="Highest category confidence")
+    categories: Dict[str, CategoryVerdict] = Field(..., description="Per-category results")
+    analysis_sources: List[str] = Field(default_factory=list, description="Analyzers that contributed")
+    image: Optional[Dict[str, Any]] = Field(None, description="Image metadata recorded with the verdict")
+    model_version: Optional[str] = Field(None, description="Analyzer configuration that produced the verdict")
+    createdAt: datetime = Field(..., description="When the verdict was recorded")
+    
+    class Config:
+        protected_namespaces = ()
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
+
+class VerdictLookupRequest(BaseModel):
+    """Request body for bulk verdict lookup"""
+    digests: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.MAX_VERDICT_LOOKUP,
+        description="SHA-256 hex digests of image contents"
+    )
+
+class VerdictLookupResponse(BaseModel):
+    """Response for bulk verdict lookup"""
+    found: Dict[str, Verdict] = Field(..., description="Stored verdicts keyed by digest")
+    missing: List[str] = Field(..., description="Digests with no stored verdict")
+    model_version: str = Field(..., description="Analyzer configuration currently in use")
+    
+    class Config:
+        protected_namespaces = ()
+
+class PrecheckResponse(BaseModel):
+    """Response for the digest pre-check that precedes an upload"""
+    results: Dict[str, Dict[str, Any]] = Field(..., description="Cached safety reports keyed by digest")
+    upload: List[str] = Field(..., description="Digests the client must upload for analysis")
+    model_version: str = Field(..., description="Analyzer configuration currently in use")
+    
+    class Config:
+        protected_namespaces = ()
+
+class ReevaluationRequest(BaseModel):
+    """Candidate combiner config to re-evaluate stored verdicts under"""
+    content_safety_threshold: Optional[float] = Field(
+        None, ge=0.0, le=1.0, description="New base threshold for categories without a dedicated one"
+    )
+    thresholds: Dict[str, float] = Field(default_factory=dict, description="Per-category threshold overrides")
+    weights: Dict[str, float] = Field(default_factory=dict, description="Per-source weight overrides")
+    calibration: Optional[Dict[str, Dict[str, Any]]] = Field(
+        None, description="Calibration spec to use instead of the current one ({} disables calibration)"
+    )
+    source_model_version: Optional[str] = Field(
+        None, description="Re-evaluate verdicts from this configuration (defaults to the current one)"
+    )
+    apply: bool = Field(False, description="Write the recomputed verdicts back")
+    apply_as: Optional[str] = Field(None, description="model_version to record applied verdicts under")
+    limit: int = Field(0, ge=0, description="Maximum verdicts to scan (0 for all)")
@@ -0,0 +1,173 @@
+# app/server.py
+"""
+Production server: loads the application (and its model weights) once in a
+parent process, then forks workers that share those pages copy-on-write.
+
+Usage:
+    WEB_WORKERS=4 python -m app.server
+"""
+
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("app.server")
+
+
+def _configure_thread_env(threads_per_worker: int):
+    """Must run before torch/OpenCV are imported so their pools start at the right size"""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(var, str(threads_per_worker))
+    # gRPC (Google Vision) channels are not fork-safe without this
+    os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "1")
+    os.environ.setdefault("GRPC_POLL_STRATEGY", "poll")
+
+
+def read_memory(pid: int) -> Dict[str, int]:
+    """Rss/Pss/shared/private memory of a process in kB, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[-1] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return {}
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+class PreforkServer:
+    """Minimal pre-fork supervisor around uvicorn"""
+
+    def __init__(self, workers: int, host: str, port: int, report_interval: float):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.report_interval = report_interval
+        self.children: Dict[int, int] = {}  # pid -> worker slot
+        self.sock: Optional[socket.socket] = None
+        self.app = None
+        self.stopping = False
+
+    def load(self):
+        """Import the app in the parent so model weights are loaded exactly once"""
+        from app.main import app
+        self.app = app
+
+        # Keep the garbage collector from touching (and so copying) the preloaded objects
+        gc.collect()
+        gc.freeze()
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+    def spawn(self, slot: int):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(slot)
+            os._exit(0)
+        self.children[pid] = slot
+        logger.info(f"Started worker {slot} (pid {pid})")
+
+    def _run_worker(self, slot: int):
+        import uvicorn
+        from app.services.image_analysis import image_analysis_service
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        # Rebuilds the analyzer pools and pins torch/OpenCV threads to this worker's core share
+        image_analysis_service.reset_after_fork()
+
+        config = uvicorn.Config(self.app, log_level="info", access_log=False)
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def memory_report(self) -> Dict[str, object]:
+        parent = read_memory(os.getpid())
+        workers = {pid: read_memory(pid) for pid in self.children}
+        private = [usage.get("private_kb", 0) for usage in workers.values() if usage]
+        report = {
+            "parent": parent,
+            "workers": workers,
+            # What each additional worker costs once the shared weights are paid for
+            "avg_private_kb_per_worker": int(sum(private) / len(private)) if private else 0,
+            "total_pss_kb": parent.get("pss_kb", 0) + sum(usage.get("pss_kb", 0) for usage in workers.values()),
+        }
+        logger.info(
+            f"Memory: parent RSS {parent.get('rss_kb', 0) // 1024} MB, "
+            f"{len(workers)} workers, ~{report['avg_private_kb_per_worker'] // 1024} MB private per worker, "
+            f"total PSS {report['total_pss_kb'] // 1024} MB"
+        )
+        return report
+
+    def stop(self, *_):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        self.load()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for slot in range(self.workers):
+            self.spawn(slot)
+
+        last_report = time.monotonic()
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                slot = self.children.pop(pid)
+                if not self.stopping:
+                    logger.warning(f"Worker {slot} (pid {pid}) exited with status {status}, restarting")
+                    self.spawn(slot)
+                continue
+
+            if self.report_interval > 0 and time.monotonic() - last_report >= self.report_interval:
+                self.memory_report()
+                last_report = time.monotonic()
+            time.sleep(0.5)
+
+        self.sock.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from app.core.config import settings
+
+    workers = max(1, settings.WEB_WORKERS)
+    threads = settings.THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // workers)
+    _configure_thread_env(threads)
+
+    server = PreforkServer(
+        workers=workers,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        report_interval=settings.MEMORY_REPORT_INTERVAL_SECONDS
+    )
+    server.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# app/services/buffer_pool.py
+
+import threading
+from typing import Dict, List, Sequence
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+
+# Buffers at or below this size share one bucket
+MIN_BUCKET_BYTES = 4096
+
+buffer_checkouts = Counter(
+    "buffer_pool_checkouts_total",
+    "Working buffers handed out, by pool and whether a free buffer was reused (hit) or allocated (miss)",
+    labelnames=("pool", "outcome")
+)
+
+
+def size_class(nbytes: int) -> int:
+    """Round up to a bucket size: quarter steps between powers of two, so at most 25% is wasted"""
+    if nbytes <= MIN_BUCKET_BYTES:
+        return MIN_BUCKET_BYTES
+    step = 1 << max((nbytes - 1).bit_length() - 3, 0)
+    return -(-nbytes // step) * step
+
+
+class BufferLease:
+    """Arrays checked out for one unit of work; all go back to the pool on exit"""
+
+    __slots__ = ("pool", "buffers")
+
+    def __init__(self, pool: 'BufferPool'):
+        self.pool = pool
+        self.buffers: List[np.ndarray] = []
+
+    def array(self, shape: Sequence[int], dtype=np.uint8) -> np.ndarray:
+        """Uninitialized C-contiguous array, e.g. as an OpenCV dst="""
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        buffer = self.pool.take(nbytes)
+        self.buffers.append(buffer)
+        return buffer[:nbytes].view(dtype).reshape(shape)
+
+    def __enter__(self) -> 'BufferLease':
+        return self
+
+    def __exit__(self, *exc_info):
+        for buffer in self.buffers:
+            self.pool.give(buffer)
+        self.buffers.clear()
+
+
+class BufferPool:
+    """
+    Size-bucketed free lists of raw byte buffers for per-image working arrays.
+
+    Full-resolution intermediates (HSV, gray, masks, edge maps) are the same
+    few sizes for images of similar dimensions, so reusing them avoids fresh
+    page-faulting allocations on every request. At most max_bytes are kept
+    idle; buffers returned beyond that are left to the allocator.
+    """
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._free: Dict[int, List[np.ndarray]] = {}
+        self._idle_bytes = 0
+        self._lock = threading.Lock()
+        Gauge(
+            f"buffer_pool_{name}_idle_bytes",
+            f"Bytes held idle by the {name} buffer pool",
+            function=lambda: self._idle_bytes
+        )
+
+    def lease(self) -> BufferLease:
+        return BufferLease(self)
+
+    def take(self, nbytes: int) -> np.ndarray:
+        size = size_class(nbytes)
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                self._idle_bytes -= size
+                buffer = free.pop()
+            else:
+                buffer = None
+        buffer_checkouts.inc(pool=self.name, outcome="hit" if buffer is not None else "miss")
+        return buffer if buffer is not None else np.empty(size, dtype=np.uint8)
+
+    def give(self, buffer: np.ndarray):
+        size = buffer.nbytes
+        with self._lock:
+            if self._idle_bytes + size > self.max_bytes:
+                return
+            self._free.setdefault(size, []).append(buffer)
+            self._idle_bytes += size
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self._idle_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'max_bytes': self.max_bytes,
+                'idle_bytes': self._idle_bytes,
+                'idle_buffers': sum(len(free) for free in self._free.values()),
+                'buckets': len(self._free)
+            }
+
+
+# Working arrays of the OpenCV heuristics (app/services/cv_heuristics.py)
+cv_buffers = BufferPool("cv", settings.CV_BUFFER_POOL_MAX_MB * 2**20)
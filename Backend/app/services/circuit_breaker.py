@@ -0,0 +1,143 @@
+# app/services/circuit_breaker.py
+
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Any, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for a remote dependency.
+
+    A call counts as failed when it errors or takes longer than slow_call_ms.
+    Once at least min_calls were made in the window and the failure rate
+    reaches failure_rate, the breaker opens and callers skip the dependency
+    for open_seconds. It then half-opens and lets half_open_probes calls
+    through: all of them succeeding closes it again, any failure reopens it.
+    A probe that ends without an outcome (cancelled) gives its slot back via
+    release(); probes still unresolved after probe_timeout_seconds count as
+    failed, so the breaker can never stay half-open.
+
+    Only used from the event loop, so no locking.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_ms: float,
+        open_seconds: float,
+        half_open_probes: int,
+        probe_timeout_seconds: Optional[float] = None
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.slow_call_ms = slow_call_ms
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.probe_timeout_seconds = probe_timeout_seconds if probe_timeout_seconds is not None else open_seconds
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.half_opened_at = 0.0
+        self.probes_started = 0
+        self.probes_succeeded = 0
+        self.skipped = 0
+        self.times_opened = 0
+        # (timestamp, failed, latency_ms)
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+
+    def _trim(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _transition(self, state: str, now: float):
+        logger.warning(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = now
+            self.times_opened += 1
+        elif state == HALF_OPEN:
+            self.half_opened_at = now
+            self.probes_started = 0
+            self.probes_succeeded = 0
+        elif state == CLOSED:
+            self._calls.clear()
+
+    def allow(self) -> bool:
+        """Whether the next call may go to the dependency"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.open_seconds:
+                self.skipped += 1
+                return False
+            self._transition(HALF_OPEN, now)
+        if self.state == HALF_OPEN:
+            if self.probes_started >= self.half_open_probes:
+                if now - self.half_opened_at >= self.probe_timeout_seconds:
+                    # Probes that never reported back are as good as failed
+                    self._transition(OPEN, now)
+                self.skipped += 1
+                return False
+            self.probes_started += 1
+        return True
+
+    def release(self):
+        """Give back a call allow() let through that ended without an outcome (e.g. cancelled)"""
+        if self.state == HALF_OPEN and self.probes_started > self.probes_succeeded:
+            self.probes_started -= 1
+
+    def record(self, ok: bool, latency_ms: float):
+        """Record the outcome of a call that allow() let through"""
+        now = time.monotonic()
+        failed = not ok or latency_ms > self.slow_call_ms
+
+        if self.state == HALF_OPEN:
+            if failed:
+                self._transition(OPEN, now)
+                return
+            self.probes_succeeded += 1
+            if self.probes_succeeded >= self.half_open_probes:
+                self._transition(CLOSED, now)
+            return
+
+        self._calls.append((now, failed, latency_ms))
+        self._trim(now)
+        if self.state == CLOSED and len(self._calls) >= self.min_calls:
+            failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            if failures / len(self._calls) >= self.failure_rate:
+                self._transition(OPEN, now)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._trim(now)
+        latencies = np.array([latency for _, _, latency in self._calls], dtype=np.float64)
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        snapshot = {
+            'state': self.state,
+            'window_calls': len(self._calls),
+            'window_failure_rate': round(failures / len(self._calls), 4) if self._calls else 0.0,
+            'window_p95_latency_ms': round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None,
+            'skipped_calls': self.skipped,
+            'times_opened': self.times_opened
+        }
+        if self.state == OPEN:
+            snapshot['retry_in_seconds'] = round(max(0.0, self.open_seconds - (now - self.opened_at)), 1)
+        return snapshot
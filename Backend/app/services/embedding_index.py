@@ -0,0 +1,425 @@
+# app/services/embedding_index.py
+
+"""
+Approximate nearest-neighbour index over image embeddings of confirmed-unsafe
+content, used to answer near-duplicates (re-crops, overlays) from a stored
+verdict instead of running the full ensemble.
+
+Layout of the index directory:
+    index.json        {"generation", "model", "dim", "count", "nlist"}
+    gen-<n>/          immutable IVF segment written by build_segment()
+        centroids.npy       float32 [nlist, D]
+        offsets.npy         int64 [nlist + 1], rows of list i are offsets[i]:offsets[i+1]
+        vectors.npy         int8 [N, D], L2-normalized and scalar-quantized, grouped by list
+        scales.npy          float32 [N], row i is vectors[i] * scales[i]
+        digests.npy         S64 [N], verdict digest of each row
+        digests_sorted.npy  S64 [N], for membership tests
+    delta.npz         entries added and removed since the segment was built
+
+Segments are memory-mapped, so workers share their pages. Vectors are stored
+as int8 with a per-row scale: a quarter of float32 and, since NumPy widens
+int8 much faster than float16, the cheapest format to scan. Additions go to the
+small delta (searched exhaustively) and removals are tombstones until the next
+rebuild() folds both into a new generation. Every process notices changes to
+index.json or delta.npz on its next search, so admin edits made through one
+server worker reach all of them.
+"""
+
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+CODE_DTYPE = np.int8
+DIGEST_DTYPE = 'S64'
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+CHUNK_ROWS = 65536
+
+similarity_lookups = Counter(
+    "similarity_index_lookups_total",
+    "Embedding lookups against the known-unsafe index by outcome (hit, miss, stale, error)",
+    labelnames=("outcome",)
+)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """L2-normalize and encode as int8 codes with one float32 scale per row"""
+    vectors = normalize(vectors)
+    scales = np.maximum(np.abs(vectors).max(axis=-1), 1e-12) / 127
+    return np.rint(vectors / scales[..., None]).astype(CODE_DTYPE), scales.astype(np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return np.asarray(codes, dtype=np.float32) * np.asarray(scales, dtype=np.float32)[..., None]
+
+
+def _assign(codes: np.ndarray, scales: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by cosine) for each row, in chunks"""
+    assignment = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), CHUNK_ROWS):
+        chunk = dequantize(codes[start:start + CHUNK_ROWS], scales[start:start + CHUNK_ROWS])
+        assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(codes: np.ndarray, scales: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means on a sample of the vectors"""
+    sample_size = min(len(codes), nlist * KMEANS_SAMPLE_PER_LIST)
+    rows = np.sort(rng.choice(len(codes), sample_size, replace=False))
+    sample = normalize(dequantize(codes[rows], scales[rows]))
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.bincount(assignment, minlength=nlist) == 0
+        # Reseed empty lists with random sample points
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def build_segment(
+    path: str,
+    generation: int,
+    codes: np.ndarray,
+    scales: np.ndarray,
+    digests: np.ndarray,
+    model: str,
+    nlist: int = 0,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Write an IVF segment for quantize()d vectors and make it current.
+
+    codes may be a memmap; it is read in chunks. nlist 0 picks ~sqrt(N).
+    """
+    count, dim = codes.shape
+    nlist = min(count, nlist or max(1, int(math.sqrt(count)))) if count else 0
+    directory = os.path.join(path, f"gen-{generation:06d}")
+    os.makedirs(directory, exist_ok=True)
+
+    if count:
+        centroids = train_centroids(codes, scales, nlist, np.random.default_rng(seed))
+        assignment = _assign(codes, scales, centroids)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))]).astype(np.int64)
+    else:
+        centroids = np.zeros((0, dim), dtype=np.float32)
+        order = np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(1, dtype=np.int64)
+
+    out = np.lib.format.open_memmap(os.path.join(directory, 'vectors.npy'), mode='w+', dtype=CODE_DTYPE, shape=(count, dim))
+    for start in range(0, count, CHUNK_ROWS):
+        rows = np.sort(order[start:start + CHUNK_ROWS])
+        # Gather in ascending source order for sequential reads, then place by rank
+        ranks = np.argsort(order[start:start + CHUNK_ROWS])
+        chunk = np.empty((len(rows), dim), dtype=CODE_DTYPE)
+        chunk[ranks] = codes[rows]
+        out[start:start + len(rows)] = chunk
+    out.flush()
+    del out
+
+    digests = np.asarray(digests, dtype=DIGEST_DTYPE)
+    np.save(os.path.join(directory, 'scales.npy'), np.asarray(scales, dtype=np.float32)[order])
+    np.save(os.path.join(directory, 'centroids.npy'), centroids.astype(np.float32))
+    np.save(os.path.join(directory, 'offsets.npy'), offsets)
+    np.save(os.path.join(directory, 'digests.npy'), digests[order])
+    np.save(os.path.join(directory, 'digests_sorted.npy'), np.sort(digests))
+
+    manifest = {'generation': generation, 'model': model, 'dim': dim, 'count': count, 'nlist': nlist}
+    _write_atomic(os.path.join(path, 'index.json'), json.dumps(manifest).encode())
+    return manifest
+
+
+def _write_atomic(file: str, data: bytes):
+    tmp = f"{file}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, file)
+
+
+def _mtime(file: str) -> Optional[int]:
+    try:
+        return os.stat(file).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class Segment:
+    """Read-only, memory-mapped IVF segment"""
+
+    def __init__(self, directory: str):
+        self.centroids = np.load(os.path.join(directory, 'centroids.npy'))
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'))
+        self.vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r')
+        self.scales = np.load(os.path.join(directory, 'scales.npy'))
+        self.digests = np.load(os.path.join(directory, 'digests.npy'), mmap_mode='r')
+        self.digests_sorted = np.load(os.path.join(directory, 'digests_sorted.npy'), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def contains(self, digest: bytes) -> bool:
+        i = np.searchsorted(self.digests_sorted, digest)
+        return i < len(self.digests_sorted) and self.digests_sorted[i] == digest
+
+    def candidates(self, query: np.ndarray, nprobe: int, threshold: float) -> Iterable[Tuple[float, bytes]]:
+        """(similarity, digest) of rows at or above threshold in the nprobe nearest lists"""
+        if not len(self.centroids):
+            return []
+        centroid_sims = self.centroids @ query
+        if nprobe < len(centroid_sims):
+            probe = np.argpartition(-centroid_sims, nprobe)[:nprobe]
+        else:
+            probe = np.arange(len(centroid_sims))
+        found = []
+        for list_id in probe:
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            if start == end:
+                continue
+            sims = (self.vectors[start:end].astype(np.float32) @ query) * self.scales[start:end]
+            for row in np.flatnonzero(sims >= threshold):
+                found.append((float(sims[row]), bytes(self.digests[start + row])))
+        return found
+
+
+class Delta(NamedTuple):
+    """Entries added since the segment was built, plus tombstoned digests"""
+    vectors: np.ndarray
+    digests: np.ndarray
+    removed: frozenset
+
+    @classmethod
+    def empty(cls, dim: int) -> 'Delta':
+        return cls(np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=DIGEST_DTYPE), frozenset())
+
+
+class EmbeddingIndex:
+    """
+    Similarity lookups against embeddings of confirmed-unsafe images.
+
+    search() runs in executor threads while add/remove/rebuild come from admin
+    requests. Readers take one reference to the segment and one to the delta;
+    writers build replacements and swap them in under a lock.
+    """
+
+    def __init__(self, path: str, model: str, threshold: float, nprobe: int, nlist: int = 0):
+        self.path = path
+        self.model = model
+        self.threshold = threshold
+        self.nprobe = max(1, nprobe)
+        self.nlist = nlist
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self.segment: Optional[Segment] = None
+        self.delta = Delta.empty(0)
+        self.compatible = True
+        self._seen: Tuple[Optional[int], Optional[int]] = (None, None)
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._maybe_reload()
+
+    @property
+    def _manifest_file(self) -> str:
+        return os.path.join(self.path, 'index.json')
+
+    @property
+    def _delta_file(self) -> str:
+        return os.path.join(self.path, 'delta.npz')
+
+    def _maybe_reload(self):
+        """Pick up a new generation or delta written by this or another process"""
+        seen = (_mtime(self._manifest_file), _mtime(self._delta_file))
+        if seen == self._seen:
+            return
+        with self._lock:
+            if seen[0] != self._seen[0] and seen[0] is not None:
+                with open(self._manifest_file) as f:
+                    manifest = json.load(f)
+                self.compatible = manifest['model'] == self.model
+                if not self.compatible:
+                    logger.warning(
+                        f"Embedding index at {self.path} was built with {manifest['model']}, "
+                        f"not {self.model}; similarity lookups are disabled until it is rebuilt"
+                    )
+                self.segment = Segment(os.path.join(self.path, f"gen-{manifest['generation']:06d}"))
+                self.generation = manifest['generation']
+                self.dim = manifest['dim']
+                logger.info(f"Loaded embedding index generation {self.generation} ({manifest['count']} vectors)")
+            if seen[1] != self._seen[1]:
+                if seen[1] is None:
+                    self.delta = Delta.empty(self.dim or 0)
+                else:
+                    with np.load(self._delta_file) as delta:
+                        self.delta = Delta(
+                            delta['vectors'].astype(np.float32),
+                            delta['digests'],
+                            frozenset(delta['removed'].tolist())
+                        )
+                    if self.dim is None and len(self.delta.digests):
+                        self.dim = self.delta.vectors.shape[1]
+            self._seen = seen
+
+    def _save_delta(self, delta: Delta):
+        """Persist and publish a new delta; caller holds the lock"""
+        tmp = f"{self._delta_file}.tmp{os.getpid()}.npz"
+        np.savez(tmp, vectors=delta.vectors, digests=delta.digests, removed=np.array(sorted(delta.removed), dtype=DIGEST_DTYPE))
+        os.replace(tmp, self._delta_file)
+        self.delta = delta
+        self._seen = (self._seen[0], _mtime(self._delta_file))
+
+    def __len__(self) -> int:
+        delta = self.delta
+        return (len(self.segment) if self.segment is not None else 0) + len(delta.digests) - len(delta.removed)
+
+    def search(self, embedding: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Digest and cosine similarity of the closest entry at or above the threshold"""
+        self._maybe_reload()
+        segment, delta = self.segment, self.delta
+        if not self.compatible or self.dim is None or embedding.shape[-1] != self.dim:
+            return None
+        query = normalize(embedding)
+
+        found = []
+        if segment is not None:
+            found.extend(segment.candidates(query, self.nprobe, self.threshold))
+        if len(delta.digests):
+            sims = delta.vectors @ query
+            found.extend((float(sims[row]), bytes(delta.digests[row])) for row in np.flatnonzero(sims >= self.threshold))
+        for similarity, digest in sorted(found, reverse=True):
+            if digest not in delta.removed:
+                return digest.decode(), similarity
+        return None
+
+    def _indexed(self, key: bytes) -> bool:
+        """Whether the segment or delta holds a vector for the digest, tombstoned or not"""
+        return key in set(self.delta.digests.tolist()) or (self.segment is not None and self.segment.contains(key))
+
+    def contains(self, digest: str) -> bool:
+        self._maybe_reload()
+        key = digest.encode()
+        return key not in self.delta.removed and self._indexed(key)
+
+    def add(self, digest: str, embedding: np.ndarray) -> bool:
+        """Index an embedding for a verdict digest; False if it was already indexed"""
+        self._maybe_reload()
+        vector = normalize(embedding).reshape(1, -1)
+        if self.dim is not None and vector.shape[1] != self.dim:
+            raise ValueError(f"Embedding has {vector.shape[1]} dimensions, the index has {self.dim}")
+        key = digest.encode()
+        with self._lock:
+            delta = self.delta
+            if key in delta.removed:
+                # Same digest, same bytes: the tombstoned vector is still valid
+                delta = delta._replace(removed=delta.removed - {key})
+            elif self._indexed(key):
+                return False
+            if not self._indexed(key):
+                vectors = delta.vectors if len(delta.digests) else np.zeros((0, vector.shape[1]), dtype=np.float32)
+                delta = delta._replace(
+                    vectors=np.concatenate([vectors, vector]),
+                    digests=np.concatenate([delta.digests, np.array([key], dtype=DIGEST_DTYPE)])
+                )
+            self.dim = vector.shape[1]
+            self._save_delta(delta)
+        return True
+
+    def remove(self, digest: str) -> bool:
+        """Stop matching a verdict digest; False if it was not indexed"""
+        if not self.contains(digest):
+            return False
+        with self._lock:
+            self._save_delta(self.delta._replace(removed=self.delta.removed | {digest.encode()}))
+        return True
+
+    def rebuild(self) -> Dict[str, Any]:
+        """Fold the delta and tombstones into a new segment generation (slow; run off the event loop)"""
+        self._maybe_reload()
+        with self._lock:
+            segment, delta = self.segment, self.delta
+            removed = np.array(sorted(delta.removed), dtype=DIGEST_DTYPE)
+            sources = [quantize(delta.vectors) + (delta.digests,)]
+            if segment is not None:
+                sources.insert(0, (segment.vectors, segment.scales, segment.digests))
+            code_parts, scale_parts, digest_parts = [], [], []
+            for codes, scales, digests in sources:
+                digests = np.asarray(digests)
+                if not len(digests):
+                    continue
+                keep = ~np.isin(digests, removed)
+                code_parts.append(np.asarray(codes[keep]))
+                scale_parts.append(scales[keep])
+                digest_parts.append(digests[keep])
+            dim = self.dim or 0
+            if digest_parts:
+                codes, scales, digests = np.concatenate(code_parts), np.concatenate(scale_parts), np.concatenate(digest_parts)
+            else:
+                codes, scales, digests = np.zeros((0, dim), dtype=CODE_DTYPE), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=DIGEST_DTYPE)
+            # Keep the newest vector per digest
+            _, last = np.unique(digests[::-1], return_index=True)
+            keep = np.sort(len(digests) - 1 - last)
+
+            previous = self.generation
+            manifest = build_segment(
+                self.path, previous + 1, codes[keep], scales[keep], digests[keep], self.model, self.nlist
+            )
+            if os.path.exists(self._delta_file):
+                os.remove(self._delta_file)
+            self.delta = Delta.empty(dim)
+            self._seen = (None, None)
+        self._maybe_reload()
+        if previous:
+            # Pages mapped from the old generation stay valid after unlinking
+            shutil.rmtree(os.path.join(self.path, f"gen-{previous:06d}"), ignore_errors=True)
+        return manifest
+
+    def stats(self) -> Dict[str, Any]:
+        self._maybe_reload()
+        segment, delta = self.segment, self.delta
+        return {
+            'path': self.path,
+            'model': self.model,
+            'compatible': self.compatible,
+            'generation': self.generation,
+            'entries': len(self),
+            'segment_entries': len(segment) if segment is not None else 0,
+            'segment_lists': len(segment.centroids) if segment is not None else 0,
+            'delta_entries': len(delta.digests),
+            'tombstones': len(delta.removed),
+            'dim': self.dim,
+            'threshold': self.threshold,
+            'nprobe': self.nprobe
+        }
+
+
+def index_from_settings() -> Optional[EmbeddingIndex]:
+    """The configured index for the production backbone, or None when disabled"""
+    if not settings.SIMILARITY_INDEX_DIR:
+        return None
+    try:
+        return EmbeddingIndex(
+            settings.SIMILARITY_INDEX_DIR,
+            model=settings.NSFW_MODEL,
+            threshold=settings.SIMILARITY_THRESHOLD,
+            nprobe=settings.SIMILARITY_NPROBE,
+            nlist=settings.SIMILARITY_NLIST
+        )
+    except Exception as e:
+        logger.error(f"Failed to open embedding index at {settings.SIMILARITY_INDEX_DIR}: {e}")
+        return None
@@ -0,0 +1,240 @@
+# app/services/ensemble.py
+
+import json
+import logging
+from typing import Dict, Any, Optional, List, Tuple, Union
+import numpy as np
+from app.core.config import settings
+from app.models.analysis import AnalysisResult, CategoryResult, SourceResult
+
+logger = logging.getLogger(__name__)
+
+# Order matters: it is the order categories appear in responses
+CATEGORIES: Tuple[str, ...] = (
+    'violence',
+    'nudity',
+    'hate_symbols',
+    'self_harm',
+    'extremist_propaganda',
+    'drugs',
+    'weapons'
+)
+
+SOURCES: Tuple[str, ...] = (
+    'google_vision',
+    'computer_vision',
+    'ml_models',
+    'image_properties',
+    'roi_tiles'
+)
+
+CATEGORY_INDEX = {category: i for i, category in enumerate(CATEGORIES)}
+SOURCE_INDEX = {source: i for i, source in enumerate(SOURCES)}
+
+# Score given to a category no analyzer reported on
+DEFAULT_CONFIDENCE = 0.05
+
+MAX_WEIGHT = 0.7
+AVG_WEIGHT = 0.3
+
+
+def parse_source_weights(spec: str) -> Dict[str, float]:
+    """Parse 'source=weight,source=weight' into a dict"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        source, _, value = item.partition('=')
+        try:
+            weights[source.strip()] = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid ensemble weight '{item}'")
+    return weights
+
+
+def default_thresholds(base: Optional[float] = None) -> Dict[str, float]:
+    """Per-category detection thresholds from settings; base replaces CONTENT_SAFETY_THRESHOLD"""
+    base = settings.CONTENT_SAFETY_THRESHOLD if base is None else base
+    thresholds = {category: base for category in CATEGORIES}
+    thresholds.update({
+        'violence': settings.VIOLENCE_THRESHOLD,
+        'nudity': settings.NUDITY_THRESHOLD,
+        'weapons': settings.WEAPONS_THRESHOLD
+    })
+    return thresholds
+
+
+class Calibration:
+    """
+    Per-category score calibration loaded from a JSON file.
+
+    Each category maps to either
+    {"method": "logistic", "coef": a, "intercept": b} or
+    {"method": "isotonic", "x": [...], "y": [...]}.
+    Categories without an entry pass through unchanged.
+    """
+
+    def __init__(self, spec: Dict[str, Dict[str, Any]]):
+        self.spec = spec
+        self._columns = []
+        for category, params in spec.items():
+            if category not in CATEGORY_INDEX:
+                logger.warning(f"Ignoring calibration for unknown category '{category}'")
+                continue
+            method = params.get('method')
+            if method == 'logistic':
+                fn = self._logistic(float(params['coef']), float(params['intercept']))
+            elif method == 'isotonic':
+                fn = self._isotonic(np.asarray(params['x'], dtype=np.float64), np.asarray(params['y'], dtype=np.float64))
+            else:
+                raise ValueError(f"Unknown calibration method '{method}' for {category}")
+            self._columns.append((CATEGORY_INDEX[category], fn))
+
+    @staticmethod
+    def _logistic(coef: float, intercept: float):
+        return lambda x: 1.0 / (1.0 + np.exp(-(coef * x + intercept)))
+
+    @staticmethod
+    def _isotonic(xs: np.ndarray, ys: np.ndarray):
+        order = np.argsort(xs)
+        xs, ys = xs[order], ys[order]
+        return lambda x: np.interp(x, xs, ys)
+
+    @classmethod
+    def load(cls, path: str) -> 'Calibration':
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def apply(self, scores: np.ndarray) -> np.ndarray:
+        """Calibrate a [..., C] score array"""
+        if not self._columns:
+            return scores
+        calibrated = scores.copy()
+        for column, fn in self._columns:
+            calibrated[..., column] = fn(scores[..., column])
+        return np.clip(calibrated, 0.0, 1.0)
+
+
+class EnsembleCombiner:
+    """
+    Combines analyzer outputs held as a source x category score matrix.
+
+    The final score for a category is 0.7 * max + 0.3 * mean over the sources
+    that reported it, with per-source weights (all 1.0 by default).
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        thresholds: Optional[Dict[str, float]] = None,
+        calibration: Optional[Calibration] = None
+    ):
+        weights = weights or {}
+        thresholds = thresholds or default_thresholds()
+        self.weights = np.array([weights.get(source, 1.0) for source in SOURCES], dtype=np.float64)
+        self.thresholds = np.array(
+            [thresholds.get(category, settings.CONTENT_SAFETY_THRESHOLD) for category in CATEGORIES],
+            dtype=np.float64
+        )
+        self.calibration = calibration
+
+    @classmethod
+    def from_settings(cls) -> 'EnsembleCombiner':
+        calibration = None
+        if settings.ENSEMBLE_CALIBRATION_PATH:
+            try:
+                calibration = Calibration.load(settings.ENSEMBLE_CALIBRATION_PATH)
+                logger.info(f"Loaded ensemble calibration from {settings.ENSEMBLE_CALIBRATION_PATH}")
+            except Exception as e:
+                logger.error(f"Failed to load ensemble calibration: {e}")
+        return cls(
+            weights=parse_source_weights(settings.ENSEMBLE_SOURCE_WEIGHTS),
+            calibration=calibration
+        )
+
+    def score_matrix(self, results: List[Union[SourceResult, Exception]]) -> Tuple[np.ndarray, np.ndarray, List[str], List[str]]:
+        """
+        Pack analyzer results into a [S, C] score matrix and a [S, C] mask of reported scores.
+        Also returns the contributing source names and any errors.
+        """
+        scores = np.zeros((len(SOURCES), len(CATEGORIES)), dtype=np.float64)
+        mask = np.zeros((len(SOURCES), len(CATEGORIES)), dtype=bool)
+        analysis_sources = []
+        errors = []
+
+        for result in results:
+            if isinstance(result, Exception):
+                errors.append(str(result))
+                continue
+
+            if isinstance(result, SourceResult) and result.categories is not None:
+                source = result.source
+                analysis_sources.append(source)
+                row = SOURCE_INDEX.get(source)
+                if row is None:
+                    logger.warning(f"Ignoring scores from unknown analysis source '{source}'")
+                    continue
+                for category, score in result.categories.items():
+                    column = CATEGORY_INDEX.get(category)
+                    if column is not None:
+                        scores[row, column] = float(score)
+                        mask[row, column] = True
+
+        return scores, mask, analysis_sources, errors
+
+    def combine_batch(self, scores: np.ndarray, mask: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Combine a batch of [B, S, C] score matrices in one vectorized pass.
+
+        Returns arrays for 'confidence' [B, C], 'detected' [B, C],
+        'overall_score' [B] and 'is_safe' [B].
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        mask = np.asarray(mask, dtype=bool)
+        weights = self.weights[None, :, None]
+
+        weighted = np.where(mask, scores * weights, -np.inf)
+        max_score = np.clip(weighted.max(axis=1), 0.0, 1.0)
+
+        weight_sum = np.where(mask, weights, 0.0).sum(axis=1)
+        any_reported = weight_sum > 0
+        avg_score = np.where(mask, scores * weights, 0.0).sum(axis=1) / np.where(any_reported, weight_sum, 1.0)
+
+        final = MAX_WEIGHT * max_score + AVG_WEIGHT * avg_score
+        if self.calibration is not None:
+            final = self.calibration.apply(final)
+        final = np.where(any_reported, final, DEFAULT_CONFIDENCE)
+
+        detected = any_reported & (final >= self.thresholds)
+        confidence = np.round(final, 3)
+
+        return {
+            'confidence': confidence,
+            'detected': detected,
+            'overall_score': confidence.max(axis=1),
+            'is_safe': ~detected.any(axis=1)
+        }
+
+    def combine(self, results: List[Union[SourceResult, Exception]], filename: str = "") -> AnalysisResult:
+        """Combine results from multiple analysis methods into a moderation verdict"""
+        scores, mask, analysis_sources, errors = self.score_matrix(results)
+        combined = self.combine_batch(scores[None], mask[None])
+
+        confidence = combined['confidence'][0].tolist()
+        detected = combined['detected'][0].tolist()
+
+        return AnalysisResult(
+            overall_score=float(combined['overall_score'][0]),
+            is_safe=bool(combined['is_safe'][0]),
+            categories={
+                category: CategoryResult(detected=detected[i], confidence=confidence[i])
+                for i, category in enumerate(CATEGORIES)
+            },
+            analysis_sources=analysis_sources,
+            errors=errors if errors else None,
+            degraded_sources=[
+                result.source for result in results if isinstance(result, SourceResult) and result.error is not None
+            ],
+            source_results=[
+                result for result in results
+                if isinstance(result, SourceResult) and result.categories is not None and result.source in SOURCE_INDEX
+            ]
+        )
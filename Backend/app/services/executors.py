@@ -0,0 +1,121 @@
+# app/services/executors.py
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExecutorPlan:
+    """Pool sizes per analyzer cost class plus library thread counts"""
+    io_workers: int
+    cv_workers: int
+    ml_workers: int
+    torch_threads: int
+    cv2_threads: int
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def core_budget() -> int:
+    """
+    Cores available to this process: THREADS_PER_WORKER when set (the same
+    value app.server gives OMP/MKL), else the cores split evenly between
+    server workers
+    """
+    if settings.THREADS_PER_WORKER > 0:
+        return settings.THREADS_PER_WORKER
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, cores // max(1, settings.WEB_WORKERS))
+
+
+def plan_from_settings() -> ExecutorPlan:
+    """
+    Build the executor plan from settings; 0 means derive from the core budget.
+    By default CV threads parallelize across images (so OpenCV itself runs
+    single-threaded) and one ML thread lets torch use the remaining cores.
+    """
+    cores = core_budget()
+    cv_workers = settings.CV_EXECUTOR_WORKERS or max(1, cores // 2)
+    return ExecutorPlan(
+        io_workers=settings.IO_EXECUTOR_WORKERS,
+        cv_workers=cv_workers,
+        ml_workers=settings.ML_EXECUTOR_WORKERS,
+        torch_threads=settings.TORCH_NUM_THREADS or max(1, cores - cv_workers),
+        cv2_threads=settings.CV2_NUM_THREADS or 1
+    )
+
+
+def apply_thread_limits(plan: ExecutorPlan):
+    """Set torch intra-op and OpenCV internal thread counts for this process"""
+    try:
+        import torch
+        torch.set_num_threads(plan.torch_threads)
+    except Exception as e:
+        logger.debug(f"Could not set torch threads: {e}")
+    try:
+        import cv2
+        cv2.setNumThreads(plan.cv2_threads)
+    except Exception as e:
+        logger.debug(f"Could not set OpenCV threads: {e}")
+
+
+class AnalyzerExecutors:
+    """
+    Separate thread pools for I/O-bound (Google Vision RPCs), CPU-bound
+    (OpenCV/PIL heuristics) and model inference work.
+    """
+
+    def __init__(self, plan: Optional[ExecutorPlan] = None, shared: Optional[ThreadPoolExecutor] = None):
+        self.shared = shared
+        self.plan = plan or plan_from_settings()
+        self._build()
+
+    def _build(self):
+        if self.shared is not None:
+            # One caller-supplied pool for everything (e.g. the low-priority shadow pool)
+            self.io = self.cv = self.ml = self.shared
+            return
+        self.io = ThreadPoolExecutor(max_workers=self.plan.io_workers, thread_name_prefix="analysis-io")
+        self.cv = ThreadPoolExecutor(max_workers=self.plan.cv_workers, thread_name_prefix="analysis-cv")
+        self.ml = ThreadPoolExecutor(max_workers=self.plan.ml_workers, thread_name_prefix="analysis-ml")
+        apply_thread_limits(self.plan)
+
+    def resize(self, plan: ExecutorPlan):
+        """Swap in pools sized for a new plan; running jobs finish on the old pools"""
+        if self.shared is not None:
+            return
+        old = (self.io, self.cv, self.ml)
+        self.plan = plan
+        self._build()
+        for pool in old:
+            pool.shutdown(wait=False)
+        logger.info(f"Analyzer executors resized: {plan.to_dict()}")
+
+    def rebuild(self):
+        """Fresh pools after fork (threads do not survive it)"""
+        if self.shared is None:
+            self._build()
+
+    def queue_depth(self) -> int:
+        pools = {id(pool): pool for pool in (self.io, self.cv, self.ml)}
+        return sum(pool._work_queue.qsize() for pool in pools.values())
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'plan': self.plan.to_dict(),
+            'queue_depth': {
+                'io': self.io._work_queue.qsize(),
+                'cv': self.cv._work_queue.qsize(),
+                'ml': self.ml._work_queue.qsize()
+            }
+        }
@@ -0,0 +1,137 @@
+# app/services/frame_sampling.py
+
+import logging
+from typing import List, Tuple
+import numpy as np
+from PIL import Image, ImageSequence
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_STRATEGIES = ('keyframes', 'uniform', 'scene_change')
+
+
+def frame_count(image: Image.Image) -> int:
+    """Number of frames/pages in an image (1 for still images)"""
+    return int(getattr(image, 'n_frames', 1) or 1)
+
+
+def is_multi_frame(image: Image.Image) -> bool:
+    """True for animated GIF/WebP and multi-page TIFF"""
+    return frame_count(image) > 1
+
+
+def _to_rgb(frame: Image.Image) -> Image.Image:
+    """Detach a frame from the sequence as an RGB copy"""
+    return frame.convert('RGB') if frame.mode != 'RGB' else frame.copy()
+
+
+def _frame_histogram(frame: Image.Image, bins: int = 16) -> np.ndarray:
+    """Normalized per-channel color histogram of a small thumbnail"""
+    thumb = np.asarray(frame.convert('RGB').resize((64, 64)))
+    hist = np.concatenate([
+        np.bincount(thumb[..., channel].ravel() // (256 // bins), minlength=bins)
+        for channel in range(3)
+    ]).astype(np.float32)
+    return hist / hist.sum()
+
+
+def _uniform_indices(n_frames: int, max_frames: int) -> List[int]:
+    """Evenly spaced frame indices, always including the first and last frame"""
+    if n_frames <= max_frames:
+        return list(range(n_frames))
+    return sorted(set(np.linspace(0, n_frames - 1, max_frames).round().astype(int).tolist()))
+
+
+def _is_keyframe(frame: Image.Image, index: int) -> bool:
+    """A frame that repaints the whole canvas rather than patching a region"""
+    if index == 0:
+        return True
+    try:
+        extent = frame.tile[0][1] if frame.tile else None
+    except Exception:
+        extent = None
+    # Formats without partial updates (e.g. TIFF pages) report no extent
+    return extent is None or tuple(extent) == (0, 0) + frame.size
+
+
+def _sample_keyframes(image: Image.Image, max_frames: int) -> List[Tuple[int, Image.Image]]:
+    n_frames = frame_count(image)
+    keyframes = []
+    for index in range(n_frames):
+        image.seek(index)
+        if _is_keyframe(image, index):
+            keyframes.append(index)
+
+    # Top up with evenly spaced frames when the animation has few keyframes
+    if len(keyframes) < max_frames:
+        for index in _uniform_indices(n_frames, max_frames):
+            if len(keyframes) >= max_frames:
+                break
+            if index not in keyframes:
+                keyframes.append(index)
+    selected = sorted(keyframes)
+    if len(selected) > max_frames:
+        selected = [selected[i] for i in _uniform_indices(len(selected), max_frames)]
+    return _load_frames(image, selected)
+
+
+def _sample_scene_changes(image: Image.Image, max_frames: int, threshold: float) -> List[Tuple[int, Image.Image]]:
+    """
+    Frames that start a new scene, from across the whole sequence. With more
+    scene changes than max_frames, the changes are split into max_frames runs
+    in sequence order and the strongest change of each run is kept, so a long
+    benign lead-in cannot use up the budget before the end is reached.
+    """
+    changes: List[Tuple[int, float]] = []
+    last_hist = None
+    for index, frame in enumerate(ImageSequence.Iterator(image)):
+        hist = _frame_histogram(frame)
+        # Half the L1 distance between histograms is in [0, 1]
+        distance = 1.0 if last_hist is None else float(np.abs(hist - last_hist).sum()) / 2.0
+        if last_hist is None or distance >= threshold:
+            changes.append((index, distance))
+            last_hist = hist
+
+    if len(changes) > max_frames:
+        changes = [max(run, key=lambda change: change[1]) for run in _split(changes, max_frames)]
+    return _load_frames(image, [index for index, _ in changes])
+
+
+def _split(items: List[Tuple[int, float]], parts: int) -> List[List[Tuple[int, float]]]:
+    """items cut into `parts` contiguous runs of near-equal length"""
+    bounds = np.linspace(0, len(items), parts + 1).round().astype(int)
+    return [items[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _load_frames(image: Image.Image, indices: List[int]) -> List[Tuple[int, Image.Image]]:
+    frames = []
+    for index in indices:
+        image.seek(index)
+        frames.append((index, _to_rgb(image)))
+    return frames
+
+
+def sample_frames(
+    image: Image.Image,
+    strategy: str = 'uniform',
+    max_frames: int = 16,
+    scene_change_threshold: float = 0.3
+) -> List[Tuple[int, Image.Image]]:
+    """
+    Select a bounded set of frames from a multi-frame image.
+
+    Returns (frame_index, RGB frame) pairs in frame order.
+    """
+    max_frames = max(1, max_frames)
+    if strategy not in SAMPLING_STRATEGIES:
+        logger.warning(f"Unknown frame sampling strategy '{strategy}', using uniform")
+        strategy = 'uniform'
+
+    try:
+        if strategy == 'keyframes':
+            return _sample_keyframes(image, max_frames)
+        if strategy == 'scene_change':
+            return _sample_scene_changes(image, max_frames, scene_change_threshold)
+        return _load_frames(image, _uniform_indices(frame_count(image), max_frames))
+    finally:
+        image.seek(0)
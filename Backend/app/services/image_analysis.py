@@ -2,149 +2,601 @@
 
 from google.cloud import vision
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Any, Optional, List
 import os
 import numpy as np
 from PIL import Image, ImageStat
 import io
 import cv2
-import torch
-import torchvision.transforms as transforms
-from transformers import pipeline, AutoImageProcessor, AutoModelForImageClassification
 import asyncio
 import aiohttp
 from concurrent.futures import ThreadPoolExecutor
 import hashlib
+import json
+import time
+from app.core.config import settings
+from app.models.analysis import AnalysisResult, CategoryResult, SourceResult
+from app.services.frame_sampling import sample_frames, frame_count, is_multi_frame
+from app.services.ensemble import EnsembleCombiner
+from app.services.tiling import candidate_regions, merge_regions, thumbnail_for_masks
+from app.services.executors import AnalyzerExecutors
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.multi_head import LinearHeads, SharedBackboneClassifier
+from app.services.embedding_index import EmbeddingIndex, index_from_settings, similarity_lookups
+from app.services.verdict_store import verdict_store
+from app.services.profiling import stage, timed_analyzer
+from app.services import cv_heuristics
+from app.services.buffer_pool import cv_buffers
+from app.services.micro_batch import MicroBatcher
+from app.services.remote_inference import InferencePool
+from app.services.quality import FULL_QUALITY, QualityLadder, QualityLevel
+from app.services.scheduler import analysis_scheduler
 
 logger = logging.getLogger(__name__)
 
+# ml_models scores for categories the classifier has no head for (or when it is unavailable)
+ML_BASELINE_SCORES = {
+    'nudity': 0.05,
+    'violence': 0.05,
+    'weapons': 0.035,
+    'drugs': 0.05,
+    'hate_symbols': 0.05,
+    'self_harm': 0.05,
+    'extremist_propaganda': 0.05
+}
+
 class ImageAnalysisService:
-    """Enhanced service for analyzing images using multiple AI models"""
+    """
+    Enhanced service for analyzing images using multiple AI models.
+    
+    With a remote InferencePool, analyses run on inference workers
+    (app/worker.py) instead, and this process loads no models.
+    
+    With a QualityLadder, each analysis runs at the quality level current
+    load allows (see app/services/quality.py).
+    """
     
-    def __init__(self):
+    def __init__(
+        self,
+        nsfw_model: Optional[str] = None,
+        combiner: Optional[EnsembleCombiner] = None,
+        use_google_vision: bool = True,
+        executor: Optional[ThreadPoolExecutor] = None,
+        similarity_index: Optional[EmbeddingIndex] = None,
+        remote: Optional[InferencePool] = None,
+        quality: Optional[QualityLadder] = None
+    ):
         self.google_client = None
-        self.nsfw_classifier = None
-        self.violence_classifier = None
-        self.executor = ThreadPoolExecutor(max_workers=4)
-        self._initialize_clients()
+        self.classifier = None
+        self.remote = remote
+        self.quality = quality
+        self.nsfw_model = nsfw_model or settings.NSFW_MODEL
+        self.category_heads = self._load_category_heads() if remote is None else None
+        self.use_google_vision = use_google_vision
+        self.similarity_index = similarity_index
+        if remote is not None and executor is None:
+            executor = self._remote_executor()
+        self.executors = AnalyzerExecutors(shared=executor)
+        self.combiner = combiner or EnsembleCombiner.from_settings()
+        self._model_version = settings.MODEL_VERSION or self._derive_model_version()
+        # Concurrent single-image model calls share one forward pass
+        self.ml_batcher = None
+        if settings.ML_BATCH_WAIT_MS > 0:
+            self.ml_batcher = MicroBatcher(
+                "ml_models", self._analyze_with_ml_models_batch, settings.ML_BATCH_MAX_SIZE, settings.ML_BATCH_WAIT_MS
+            )
+        self.vision_breaker = CircuitBreaker(
+            'google_vision',
+            window_seconds=settings.VISION_BREAKER_WINDOW_SECONDS,
+            min_calls=settings.VISION_BREAKER_MIN_CALLS,
+            failure_rate=settings.VISION_BREAKER_FAILURE_RATE,
+            slow_call_ms=settings.VISION_BREAKER_SLOW_CALL_MS,
+            open_seconds=settings.VISION_BREAKER_OPEN_SECONDS,
+            half_open_probes=settings.VISION_BREAKER_HALF_OPEN_PROBES,
+            # Probes time out on their own after GOOGLE_VISION_TIMEOUT_SECONDS; allow some slack
+            probe_timeout_seconds=settings.GOOGLE_VISION_TIMEOUT_SECONDS * 2
+        )
+        if remote is None:
+            self._initialize_clients()
+    
+    @staticmethod
+    def _remote_executor() -> ThreadPoolExecutor:
+        # Nothing is analyzed in this process; a small pool without torch thread setup will do
+        return ThreadPoolExecutor(max_workers=2, thread_name_prefix="analysis-remote")
+    
+    @property
+    def model_version(self) -> str:
+        """Version stamped on verdicts; in remote mode the one the workers report"""
+        if self.remote is not None:
+            return settings.MODEL_VERSION or self.remote.model_version or self._model_version
+        return self._model_version
+    
+    def _derive_model_version(self, combiner: Optional[EnsembleCombiner] = None) -> str:
+        """Identify the analyzer configuration that produces verdicts (optionally with another combiner)"""
+        combiner = combiner or self.combiner
+        config = {
+            'weights': combiner.weights.tolist(),
+            'thresholds': combiner.thresholds.tolist(),
+            'calibration': combiner.calibration.spec if combiner.calibration else None,
+            'google_vision': self.use_google_vision,
+            'tiles': settings.ENABLE_TILED_ANALYSIS
+        }
+        if self.category_heads:
+            # Only when set, so versions (and stored verdicts) without heads stay valid
+            config['heads'] = self.category_heads.fingerprint()
+        config = json.dumps(config, sort_keys=True)
+        return f"{self.nsfw_model}@{hashlib.sha256(config.encode()).hexdigest()[:8]}"
     
     def _initialize_clients(self):
         """Initialize all available AI clients and models"""
         # Initialize Google Cloud Vision
         try:
-            if os.getenv('GOOGLE_APPLICATION_CREDENTIALS') or os.getenv('GOOGLE_CLOUD_PROJECT'):
-                self.google_client = vision.ImageAnnotatorClient()
+            if self.use_google_vision and (
+                os.getenv('GOOGLE_APPLICATION_CREDENTIALS') or os.getenv('GOOGLE_CLOUD_PROJECT') or settings.GOOGLE_VISION_ENDPOINT
+            ):
+                self.google_client = self._create_vision_client()
                 logger.info("Google Cloud Vision client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Google Vision client: {e}")
             self.google_client = None
         
-        # Initialize Hugging Face models for local inference
+        # Initialize the Hugging Face classifier for local inference: the NSFW
+        # model is the shared backbone, category heads score its features
         try:
-            # NSFW detection model
-            self.nsfw_classifier = pipeline(
-                "image-classification",
-                model="Falconsai/nsfw_image_detection",
-                device=0 if torch.cuda.is_available() else -1
-            )
-            logger.info("NSFW classifier initialized successfully")
+            self.classifier = SharedBackboneClassifier(self.nsfw_model, heads=self.category_heads)
+            heads = ', '.join(self.category_heads.categories) if self.category_heads else 'none'
+            logger.info(f"Classifier {self.nsfw_model} initialized successfully (category heads: {heads})")
         except Exception as e:
             logger.warning(f"Failed to initialize NSFW classifier: {e}")
-            self.nsfw_classifier = None
-        
+            self.classifier = None
+    
+    @staticmethod
+    def _load_category_heads() -> Optional[LinearHeads]:
+        if not settings.CATEGORY_HEADS_DIR:
+            return None
         try:
-            # Violence detection model - using a placeholder, you'll need a proper model
-            # Consider using "microsoft/DialoGPT-medium" or similar for now
-            logger.info("Violence classifier placeholder - implement proper model")
-            self.violence_classifier = None
+            return LinearHeads.load_dir(settings.CATEGORY_HEADS_DIR)
         except Exception as e:
-            logger.warning(f"Failed to initialize violence classifier: {e}")
-            self.violence_classifier = None
-    
-    def _ensure_python_types(self, obj):
-        """Convert numpy types to Python native types for JSON serialization"""
-        if isinstance(obj, np.bool_):
-            return bool(obj)
-        elif isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, dict):
-            return {key: self._ensure_python_types(value) for key, value in obj.items()}
-        elif isinstance(obj, list):
-            return [self._ensure_python_types(item) for item in obj]
-        else:
-            return obj
-    
-    async def analyze_image(self, image_bytes: bytes, filename: str = "") -> Dict[str, Any]:
+            logger.error(f"Failed to load category heads from {settings.CATEGORY_HEADS_DIR}: {e}")
+            return None
+    
+    @staticmethod
+    def _create_vision_client() -> vision.ImageAnnotatorClient:
+        if settings.GOOGLE_VISION_ENDPOINT:
+            # Plaintext channel to a local fake server (benchmarks/fake_vision.py)
+            import grpc
+            from google.cloud.vision_v1.services.image_annotator.transports import ImageAnnotatorGrpcTransport
+            channel = grpc.insecure_channel(settings.GOOGLE_VISION_ENDPOINT)
+            return vision.ImageAnnotatorClient(transport=ImageAnnotatorGrpcTransport(channel=channel))
+        return vision.ImageAnnotatorClient()
+    
+    def reset_after_fork(self):
+        """Recreate per-process resources in a forked worker; model weights stay shared"""
+        if self.remote is not None:
+            self.executors = AnalyzerExecutors(shared=self._remote_executor())
+        self.executors.rebuild()
+        if self.google_client is not None:
+            self.google_client = self._create_vision_client()
+    
+    def queue_depth(self) -> int:
+        """Number of analyzer jobs waiting for an executor thread (remote: requests out to workers)"""
+        if self.remote is not None:
+            return self.remote.outstanding()
+        return self.executors.queue_depth()
+    
+    async def analyze_image(
+        self,
+        image_bytes: bytes,
+        filename: str = "",
+        extra_results: Optional[List[SourceResult]] = None
+    ) -> AnalysisResult:
         """
-        Comprehensive image analysis using multiple methods
+        Comprehensive image analysis using multiple methods.
+        extra_results are precomputed analyzer outputs combined alongside the local ones.
+        Under load the quality ladder may run fewer or cheaper analyzers; the
+        result's quality_level says which level was used.
         """
+        if self.remote is not None:
+            # Worker failures raise InferenceUnavailable rather than yield a fallback verdict
+            return await self.remote.analyze(image_bytes, filename)
+        if self.quality is None:
+            return await self._analyze_image_at(image_bytes, filename, extra_results, FULL_QUALITY)
+        with self.quality.admit() as level:
+            results = await self._analyze_image_at(image_bytes, filename, extra_results, level)
+        results.quality_level = level.name
+        return results
+    
+    async def _analyze_image_at(
+        self,
+        image_bytes: bytes,
+        filename: str,
+        extra_results: Optional[List[SourceResult]],
+        level: QualityLevel
+    ) -> AnalysisResult:
+        start = time.perf_counter()
         try:
             # Convert image to different formats for analysis
-            pil_image = Image.open(io.BytesIO(image_bytes))
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
+            with stage('decode'):
+                pil_image = Image.open(io.BytesIO(image_bytes))
+                multi_frame = is_multi_frame(pil_image)
+                if not multi_frame:
+                    pil_image = self._decode(pil_image, level.max_side)
+            
+            # Animated GIF/WebP and multi-page TIFF get per-frame analysis
+            if multi_frame:
+                with stage('frames'):
+                    return await self._analyze_frames(pil_image, image_bytes, filename, extra_results, level)
             
             # Run multiple analyses concurrently
             tasks = []
             
             # Google Vision API analysis
-            if self.google_client:
-                tasks.append(self._analyze_with_google_vision(image_bytes))
+            vision_task = None
+            if self.google_client and level.google_vision:
+                vision_task = asyncio.ensure_future(
+                    timed_analyzer('google_vision', self._analyze_with_google_vision(image_bytes))
+                )
+                tasks.append(vision_task)
             
             # Computer vision based analysis
-            tasks.append(self._analyze_with_cv(pil_image))
+            if level.heuristics:
+                tasks.append(timed_analyzer('computer_vision', self._analyze_with_cv(pil_image, level.hough_lines)))
             
             # Deep learning model analysis
-            tasks.append(self._analyze_with_ml_models(pil_image))
+            ml_task = asyncio.ensure_future(timed_analyzer('ml_models', self._analyze_with_ml_models(pil_image)))
+            tasks.append(ml_task)
             
             # Color and statistical analysis
-            tasks.append(self._analyze_image_properties(pil_image))
-            
-            # Execute all analyses
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            if level.heuristics:
+                tasks.append(timed_analyzer(
+                    'image_properties', self._analyze_image_properties(pil_image, level.dominant_colors)
+                ))
+            
+            # Region-of-interest tiles for small content in large images
+            if level.tiles and settings.ENABLE_TILED_ANALYSIS and max(pil_image.size) >= settings.TILE_MIN_IMAGE_SIDE:
+                tasks.append(timed_analyzer('tiles', self._analyze_tiles(pil_image)))
+            tasks = [asyncio.ensure_future(task) for task in tasks]
+            
+            # Near-duplicates of known unsafe images take the stored verdict
+            # as soon as the embedding is available; the rest is abandoned
+            if self.similarity_index is not None:
+                with stage('similarity_lookup'):
+                    match = await self._match_known_content(ml_task)
+                if match is not None:
+                    for task in tasks:
+                        task.cancel()
+                    return match
+            
+            # Execute all analyses; the wait for Vision beyond the local analyzers is left out of local time
+            with stage('analyzers'):
+                await asyncio.gather(*(task for task in tasks if task is not vision_task), return_exceptions=True)
+                vision_wait_start = time.perf_counter()
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                vision_wait = time.perf_counter() - vision_wait_start
+            results.extend(extra_results or [])
             
             # Combine results
-            combined_results = self._combine_analysis_results(results, filename)
-            
-            # Ensure all values are JSON serializable
-            return self._ensure_python_types(combined_results)
+            with stage('combine'):
+                combined_results = self._combine_analysis_results(results, filename)
+            combined_results.local_analysis_ms = (time.perf_counter() - start - vision_wait) * 1000
+            return combined_results
             
         except Exception as e:
             logger.error(f"Image analysis failed: {e}")
-            return {
-                'overall_score': 0.05,
-                'is_safe': True,
-                'categories': {
-                    'violence': {'detected': False, 'confidence': 0.05},
-                    'nudity': {'detected': False, 'confidence': 0.05},
-                    'weapons': {'detected': False, 'confidence': 0.05},
-                    'drugs': {'detected': False, 'confidence': 0.05},
-                    'hate_symbols': {'detected': False, 'confidence': 0.05},
-                    'self_harm': {'detected': False, 'confidence': 0.05},
-                    'extremist_propaganda': {'detected': False, 'confidence': 0.05}
-                },
-                'provider': 'enhanced_multi_model',
-                'analysis_sources': [],
-                'errors': [str(e)]
-            }
+            return self._failed_analysis(e)
+    
+    @staticmethod
+    def _decode(image: Image.Image, max_side: Optional[int] = None) -> Image.Image:
+        """Fully decoded RGB image, no larger than max_side on its longest side"""
+        if max_side:
+            # JPEG decodes straight to a reduced scale; other formats are resized after decoding
+            image.draft('RGB', (max_side, max_side))
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        # Decode now; concurrent analyzers must not race on PIL's lazy load
+        image.load()
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side))
+        return image
     
-    async def _analyze_with_google_vision(self, image_bytes: bytes) -> Dict[str, Any]:
-        """Enhanced Google Vision API analysis"""
+    async def _match_known_content(self, ml_task: asyncio.Future) -> Optional[AnalysisResult]:
+        """Stored verdict of the most similar indexed unsafe image, if above the threshold"""
         try:
-            image = vision.Image(content=image_bytes)
+            embedding = (await asyncio.shield(ml_task)).details.get('embedding')
+            if embedding is None:
+                return None
+            match = await asyncio.get_event_loop().run_in_executor(
+                self.executors.cv, self.similarity_index.search, embedding
+            )
+            if match is None:
+                similarity_lookups.inc(outcome='miss')
+                return None
+            digest, similarity = match
+            verdict = await verdict_store.get(digest)
+        except Exception as e:
+            logger.warning(f"Similarity lookup failed: {e}")
+            similarity_lookups.inc(outcome='error')
+            return None
+        
+        if verdict is None or verdict['is_safe']:
+            # Verdict gone or re-evaluated as safe since it was indexed
+            similarity_lookups.inc(outcome='stale')
+            return None
+        similarity_lookups.inc(outcome='hit')
+        return AnalysisResult(
+            overall_score=verdict['overall_score'],
+            is_safe=verdict['is_safe'],
+            categories={
+                category: CategoryResult(detected=data['detected'], confidence=data['confidence'])
+                for category, data in verdict['categories'].items()
+            },
+            provider='similarity_index',
+            analysis_sources=['similarity_index'],
+            model_version=verdict['model_version'],
+            similar_to={'sha256': digest, 'similarity': round(similarity, 4)}
+        )
+    
+    async def embed(self, image_bytes: bytes) -> Optional[np.ndarray]:
+        """Embedding of an image from the shared backbone, or None without a classifier"""
+        if self.remote is not None:
+            return await self.remote.embed(image_bytes)
+        if self.classifier is None:
+            return None
+        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        _, embeddings = await asyncio.get_event_loop().run_in_executor(self.executors.ml, self.classifier, [image])
+        return embeddings[0]
+    
+    def _failed_analysis(self, error: Exception) -> AnalysisResult:
+        """Fallback result when an image could not be analyzed at all"""
+        return AnalysisResult(
+            overall_score=0.05,
+            is_safe=True,
+            categories={
+                'violence': CategoryResult(detected=False, confidence=0.05),
+                'nudity': CategoryResult(detected=False, confidence=0.05),
+                'weapons': CategoryResult(detected=False, confidence=0.05),
+                'drugs': CategoryResult(detected=False, confidence=0.05),
+                'hate_symbols': CategoryResult(detected=False, confidence=0.05),
+                'self_harm': CategoryResult(detected=False, confidence=0.05),
+                'extremist_propaganda': CategoryResult(detected=False, confidence=0.05)
+            },
+            errors=[str(error)]
+        )
+    
+    async def analyze_images(self, images: List[bytes], filenames: Optional[List[str]] = None) -> List[AnalysisResult]:
+        """
+        Analyze several images at once. Still images share one batched pass
+        through each analyzer; multi-frame or undecodable images fall back to
+        analyze_image.
+        """
+        filenames = filenames or [""] * len(images)
+        if self.remote is not None:
+            # Spread over the workers, which batch model calls themselves
+            return list(await asyncio.gather(*(
+                self.remote.analyze(image_bytes, filename) for image_bytes, filename in zip(images, filenames)
+            )))
+        if self.quality is None:
+            return await self._analyze_images_at(images, filenames, FULL_QUALITY)
+        # One level for the whole batch; its duration says nothing about per-image latency
+        with self.quality.admit(len(images), timed=False) as level:
+            results = await self._analyze_images_at(images, filenames, level)
+        for result in results:
+            result.quality_level = level.name
+        return results
+    
+    async def _analyze_images_at(
+        self,
+        images: List[bytes],
+        filenames: List[str],
+        level: QualityLevel
+    ) -> List[AnalysisResult]:
+        results: List[Optional[AnalysisResult]] = [None] * len(images)
+        
+        still_indices = []
+        still_images = []
+        fallbacks = []
+        for i, image_bytes in enumerate(images):
+            try:
+                pil_image = Image.open(io.BytesIO(image_bytes))
+                if is_multi_frame(pil_image):
+                    fallbacks.append(i)
+                    continue
+                still_images.append(self._decode(pil_image, level.max_side))
+                still_indices.append(i)
+            except Exception:
+                fallbacks.append(i)
+        
+        if still_images:
+            vision_tasks = []
+            if self.google_client and level.google_vision:
+                vision_tasks = [self._analyze_with_google_vision(images[i]) for i in still_indices]
+            analyzer_batches = [self._analyze_with_ml_models_batch(still_images)]
+            if level.heuristics:
+                analyzer_batches.insert(0, self._analyze_with_cv_batch(still_images, level.hough_lines))
+                analyzer_batches.append(self._analyze_image_properties_batch(still_images, level.dominant_colors))
+            *batch_results, vision_results = await asyncio.gather(
+                *analyzer_batches,
+                asyncio.gather(*vision_tasks, return_exceptions=True),
+                return_exceptions=True
+            )
             
-            # Multiple detection types
-            safe_search_response = self.google_client.safe_search_detection(image=image)
-            label_response = self.google_client.label_detection(image=image)
-            object_response = self.google_client.object_localization(image=image)
+            for position, i in enumerate(still_indices):
+                sources = []
+                if vision_tasks:
+                    sources.append(self._batch_item(vision_results, position))
+                sources.extend(self._batch_item(batch, position) for batch in batch_results)
+                results[i] = self._combine_analysis_results(sources, filenames[i])
+        
+        for i in fallbacks:
+            results[i] = await self._analyze_image_at(images[i], filenames[i], None, level)
+        
+        return results
+    
+    @staticmethod
+    def _batch_item(batch_result: Any, position: int) -> Any:
+        """Pick one image's result out of a batched analyzer call (or its exception)"""
+        return batch_result if isinstance(batch_result, Exception) else batch_result[position]
+    
+    async def _analyze_frames(
+        self,
+        image: Image.Image,
+        image_bytes: bytes,
+        filename: str,
+        extra_results: Optional[List[SourceResult]] = None,
+        level: QualityLevel = FULL_QUALITY
+    ) -> AnalysisResult:
+        """
+        Analyze a multi-frame image by sampling frames and scoring them in batches.
+        Stops as soon as a frame is judged unsafe.
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_event_loop()
+        n_frames = frame_count(image)
+        frames = await loop.run_in_executor(
+            self.executors.cv,
+            self._sample_frames,
+            image,
+            level.max_side
+        )
+        
+        # Google Vision only looks at the first frame, so it runs once
+        vision_task = None
+        if self.google_client and level.google_vision:
+            vision_task = asyncio.ensure_future(self._analyze_with_google_vision(image_bytes))
+        
+        per_frame = []
+        frame_results = []
+        early_stopped = False
+        batch_size = max(1, settings.FRAME_BATCH_SIZE)
+        
+        for offset in range(0, len(frames), batch_size):
+            batch = frames[offset:offset + batch_size]
+            images = [frame for _, frame in batch]
+            
+            analyzer_batches = [self._analyze_with_ml_models_batch(images)]
+            if level.heuristics:
+                analyzer_batches.insert(0, self._analyze_with_cv_batch(images, level.hough_lines))
+                analyzer_batches.append(self._analyze_image_properties_batch(images, level.dominant_colors))
+            
+            batch_sources = [list(sources) for sources in zip(*await asyncio.gather(*analyzer_batches))]
+            frame_results.extend(batch_sources)
+            
+            # Score the whole batch of frames in one vectorized pass
+            matrices = [self.combiner.score_matrix(sources)[:2] for sources in batch_sources]
+            frame_verdicts = self.combiner.combine_batch(
+                np.stack([scores for scores, _ in matrices]),
+                np.stack([mask for _, mask in matrices])
+            )
+            for (index, _), overall_score, is_safe in zip(
+                batch, frame_verdicts['overall_score'].tolist(), frame_verdicts['is_safe'].tolist()
+            ):
+                per_frame.append({
+                    'index': index,
+                    'overall_score': overall_score,
+                    'is_safe': is_safe
+                })
+                if not is_safe:
+                    early_stopped = True
             
-            safe_search = safe_search_response.safe_search_annotation
-            labels = label_response.label_annotations
-            objects = object_response.localized_object_annotations
+            if early_stopped:
+                break
+        
+        results = []
+        vision_wait = 0.0
+        if vision_task is not None:
+            vision_wait_start = time.perf_counter()
+            results.extend(await asyncio.gather(vision_task, return_exceptions=True))
+            vision_wait = time.perf_counter() - vision_wait_start
+        results.extend(self._aggregate_frame_results(frame_results))
+        results.extend(extra_results or [])
+        
+        combined_results = self._combine_analysis_results(results, filename)
+        worst_frame = max(per_frame, key=lambda frame: frame['overall_score'], default=None)
+        combined_results.frames = {
+            'total': n_frames,
+            'sampled': len(frames),
+            'analyzed': len(per_frame),
+            'strategy': settings.FRAME_SAMPLING_STRATEGY,
+            'early_stopped': early_stopped and len(per_frame) < len(frames),
+            'highest_risk_frame': worst_frame['index'] if worst_frame else None,
+            'per_frame': per_frame
+        }
+        combined_results.local_analysis_ms = (time.perf_counter() - start - vision_wait) * 1000
+        return combined_results
+    
+    @staticmethod
+    def _sample_frames(image: Image.Image, max_side: Optional[int] = None) -> List[Any]:
+        """Sampled (index, RGB frame) pairs, each frame no larger than max_side"""
+        frames = sample_frames(
+            image,
+            settings.FRAME_SAMPLING_STRATEGY,
+            settings.MAX_SAMPLED_FRAMES,
+            settings.SCENE_CHANGE_THRESHOLD
+        )
+        if max_side:
+            for _, frame in frames:
+                frame.thumbnail((max_side, max_side))
+        return frames
+    
+    def _aggregate_frame_results(self, frame_results: List[List[SourceResult]]) -> List[SourceResult]:
+        """Collapse per-frame analyzer outputs into one result per source, keeping the max score per category"""
+        aggregated = {}
+        for sources in frame_results:
+            for result in sources:
+                if result.categories is None:
+                    continue
+                entry = aggregated.setdefault(result.source, SourceResult(source=result.source, categories={}))
+                for category, score in result.categories.items():
+                    entry.categories[category] = max(entry.categories.get(category, 0.0), score)
+        
+        if not aggregated:
+            # Every frame failed; surface the first error so it is reported
+            return [result for sources in frame_results[:1] for result in sources]
+        return list(aggregated.values())
+    
+    async def _analyze_with_google_vision(self, image_bytes: bytes) -> SourceResult:
+        """Enhanced Google Vision API analysis, skipped while its circuit breaker is open"""
+        if not self.vision_breaker.allow():
+            return SourceResult(source='google_vision', error='Skipped: Google Vision circuit breaker is open')
+        
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                asyncio.get_event_loop().run_in_executor(self.executors.io, self._google_vision_analysis, image_bytes),
+                timeout=settings.GOOGLE_VISION_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Google Vision analysis timed out after {settings.GOOGLE_VISION_TIMEOUT_SECONDS}s")
+            result = SourceResult(source='google_vision', error='Google Vision analysis timed out')
+        except asyncio.CancelledError:
+            # Abandoned by the caller (similarity match, single-flight); no outcome to record
+            self.vision_breaker.release()
+            raise
+        except Exception:
+            self.vision_breaker.record(False, (time.perf_counter() - start) * 1000)
+            raise
+        self.vision_breaker.record(result.error is None, (time.perf_counter() - start) * 1000)
+        return result
+    
+    def _google_vision_analysis(self, image_bytes: bytes) -> SourceResult:
+        try:
+            image = vision.Image(content=image_bytes)
+            
+            # Multiple detection types in a single RPC
+            response = self.google_client.annotate_image({
+                'image': image,
+                'features': [
+                    {'type_': vision.Feature.Type.SAFE_SEARCH_DETECTION},
+                    {'type_': vision.Feature.Type.LABEL_DETECTION},
+                    {'type_': vision.Feature.Type.OBJECT_LOCALIZATION}
+                ]
+            }, timeout=settings.GOOGLE_VISION_TIMEOUT_SECONDS)
+            if response.error.message:
+                raise RuntimeError(response.error.message)
+            
+            safe_search = response.safe_search_annotation
+            labels = response.label_annotations
+            objects = response.localized_object_annotations
             
             # Process safe search results
             likelihood_to_score = {
@@ -171,9 +623,9 @@ class ImageAnalysisService:
             # Analyze objects
             weapon_objects = self._check_objects_for_weapons(objects)
             
-            return {
-                'source': 'google_vision',
-                'categories': {
+            return SourceResult(
+                source='google_vision',
+                categories={
                     'violence': max(violence_score, weapon_objects),
                     'nudity': max(adult_score, racy_score),
                     'weapons': max(weapons_confidence, weapon_objects),
@@ -182,218 +634,209 @@ class ImageAnalysisService:
                     'self_harm': 0.05,  # Google Vision doesn't detect this directly
                     'extremist_propaganda': 0.05
                 },
-                'labels': [{'description': label.description, 'score': float(label.score)} for label in labels[:10]],
-                'objects': [{'name': obj.name, 'score': float(obj.score)} for obj in objects[:10]]
-            }
+                details={
+                    'labels': [{'description': label.description, 'score': float(label.score)} for label in labels[:10]],
+                    'objects': [{'name': obj.name, 'score': float(obj.score)} for obj in objects[:10]]
+                }
+            )
             
         except Exception as e:
             logger.error(f"Google Vision analysis failed: {e}")
-            return {'source': 'google_vision', 'error': str(e)}
+            return SourceResult.failed('google_vision', e)
     
-    async def _analyze_with_cv(self, image: Image.Image) -> Dict[str, Any]:
+    async def _analyze_with_cv(self, image: Image.Image, hough_lines: bool = True) -> SourceResult:
         """Computer vision based analysis using OpenCV"""
-        def _cv_analysis():
-            try:
-                # Convert PIL to CV2
-                cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                
-                # Skin detection for nudity
-                skin_score = self._detect_skin_regions(cv_image)
-                
-                # Edge detection for weapons/violence
-                edges_score = self._analyze_edges_for_weapons(cv_image)
-                
-                # Color analysis for blood/violence
-                blood_score = self._detect_blood_colors(cv_image)
-                
-                # Texture analysis
-                texture_score = self._analyze_texture_patterns(cv_image)
-                
-                return {
-                    'source': 'computer_vision',
-                    'categories': {
-                        'nudity': float(skin_score),
-                        'violence': float(max(blood_score, edges_score)),
-                        'weapons': float(edges_score),
-                        'drugs': float(texture_score * 0.3),
-                        'hate_symbols': float(texture_score * 0.2),
-                        'self_harm': float(blood_score * 0.8),
-                        'extremist_propaganda': 0.05
-                    }
+        return await asyncio.get_event_loop().run_in_executor(self.executors.cv, self._cv_analysis, image, hough_lines)
+    
+    async def _analyze_with_cv_batch(self, images: List[Image.Image], hough_lines: bool = True) -> List[SourceResult]:
+        """Computer vision analysis for several frames in one executor call"""
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executors.cv, lambda: [self._cv_analysis(image, hough_lines) for image in images]
+        )
+    
+    def _cv_analysis(self, image: Image.Image, hough_lines: bool = True) -> SourceResult:
+        try:
+            # Skin (nudity), edges (weapons/violence), blood colors and texture
+            # on a read-only view of PIL's pixels, with pooled working arrays
+            scores = cv_heuristics.analyze(np.asarray(image), cv_buffers, hough_lines=hough_lines)
+            skin_score, edges_score = scores['skin'], scores['edges']
+            blood_score, texture_score = scores['blood'], scores['texture']
+            
+            return SourceResult(
+                source='computer_vision',
+                categories={
+                    'nudity': float(skin_score),
+                    'violence': float(max(blood_score, edges_score)),
+                    'weapons': float(edges_score),
+                    'drugs': float(texture_score * 0.3),
+                    'hate_symbols': float(texture_score * 0.2),
+                    'self_harm': float(blood_score * 0.8),
+                    'extremist_propaganda': 0.05
                 }
-                
-            except Exception as e:
-                logger.error(f"CV analysis failed: {e}")
-                return {'source': 'computer_vision', 'error': str(e)}
-        
-        return await asyncio.get_event_loop().run_in_executor(self.executor, _cv_analysis)
+            )
+            
+        except Exception as e:
+            logger.error(f"CV analysis failed: {e}")
+            return SourceResult.failed('computer_vision', e)
     
-    async def _analyze_with_ml_models(self, image: Image.Image) -> Dict[str, Any]:
+    async def _analyze_with_ml_models(self, image: Image.Image) -> SourceResult:
         """Analysis using pre-trained ML models"""
-        def _ml_analysis():
-            try:
-                results = {'source': 'ml_models', 'categories': {}}
-                
-                # NSFW detection
-                if self.nsfw_classifier:
-                    nsfw_result = self.nsfw_classifier(image)
-                    nsfw_score = 0.05
-                    for result in nsfw_result:
-                        if result['label'].lower() in ['nsfw', 'porn', 'explicit']:
-                            nsfw_score = max(nsfw_score, float(result['score']))
-                    results['categories']['nudity'] = nsfw_score
-                else:
-                    results['categories']['nudity'] = 0.05
-                
-                # Violence detection placeholder
-                violence_score = 0.05
-                
-                results['categories'].update({
-                    'violence': violence_score,
-                    'weapons': violence_score * 0.7,
+        if self.ml_batcher is not None:
+            return await self.ml_batcher.submit(image)
+        results = await self._analyze_with_ml_models_batch([image])
+        return results[0]
+    
+    async def _analyze_with_ml_models_batch(self, images: List[Image.Image]) -> List[SourceResult]:
+        """ML model analysis for several frames as a single model batch"""
+        return await asyncio.get_event_loop().run_in_executor(self.executors.ml, self._ml_analysis, images)
+    
+    def _ml_analysis(self, images: List[Image.Image]) -> List[SourceResult]:
+        try:
+            # One backbone pass per image scores nudity plus every category with a head
+            if self.classifier:
+                image_scores, embeddings = self.classifier(images)
+            else:
+                image_scores, embeddings = [{} for _ in images], [None] * len(images)
+            
+            return [
+                SourceResult(
+                    source='ml_models',
+                    categories={
+                        category: max(baseline, scores.get(category, 0.0))
+                        for category, baseline in ML_BASELINE_SCORES.items()
+                    },
+                    details={'embedding': embedding} if embedding is not None else {}
+                )
+                for scores, embedding in zip(image_scores, embeddings)
+            ]
+            
+        except Exception as e:
+            logger.error(f"ML models analysis failed: {e}")
+            return [SourceResult.failed('ml_models', e) for _ in images]
+    
+    async def _analyze_image_properties(self, image: Image.Image, dominant_colors: bool = True) -> SourceResult:
+        """Analyze basic image properties and statistics"""
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executors.cv, self._properties_analysis, image, dominant_colors
+        )
+    
+    async def _analyze_image_properties_batch(
+        self,
+        images: List[Image.Image],
+        dominant_colors: bool = True
+    ) -> List[SourceResult]:
+        """Image property analysis for several frames in one executor call"""
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executors.cv, lambda: [self._properties_analysis(image, dominant_colors) for image in images]
+        )
+    
+    def _properties_analysis(self, image: Image.Image, dominant_colors: bool = True) -> SourceResult:
+        try:
+            # Color statistics
+            stat = ImageStat.Stat(image)
+            
+            # Calculate brightness and contrast
+            brightness = sum(stat.mean) / len(stat.mean)
+            contrast = sum(stat.stddev) / len(stat.stddev)
+            
+            # Dominant colors analysis (a full color histogram; skipped under load)
+            colors = image.getcolors(maxcolors=256*256*256) if dominant_colors else None
+            if colors:
+                dominant_color = max(colors, key=lambda x: x[0])[1]
+                red_dominance = dominant_color[0] / 255.0 if len(dominant_color) >= 3 else 0
+            else:
+                red_dominance = 0
+            
+            # Heuristic scoring based on properties
+            violence_score = min(red_dominance * 0.3 + (1 - brightness/255) * 0.2, 0.5)
+            
+            return SourceResult(
+                source='image_properties',
+                categories={
+                    'violence': float(violence_score),
+                    'nudity': float(min(brightness/255 * 0.1, 0.3)),
+                    'weapons': float(violence_score * 0.5),
                     'drugs': 0.05,
                     'hate_symbols': 0.05,
-                    'self_harm': 0.05,
+                    'self_harm': float(violence_score * 0.6),
                     'extremist_propaganda': 0.05
-                })
-                
-                return results
-                
-            except Exception as e:
-                logger.error(f"ML models analysis failed: {e}")
-                return {'source': 'ml_models', 'error': str(e)}
-        
-        return await asyncio.get_event_loop().run_in_executor(self.executor, _ml_analysis)
-    
-    async def _analyze_image_properties(self, image: Image.Image) -> Dict[str, Any]:
-        """Analyze basic image properties and statistics"""
-        def _properties_analysis():
-            try:
-                # Color statistics
-                stat = ImageStat.Stat(image)
-                
-                # Calculate brightness and contrast
-                brightness = sum(stat.mean) / len(stat.mean)
-                contrast = sum(stat.stddev) / len(stat.stddev)
-                
-                # Dominant colors analysis
-                colors = image.getcolors(maxcolors=256*256*256)
-                if colors:
-                    dominant_color = max(colors, key=lambda x: x[0])[1]
-                    red_dominance = dominant_color[0] / 255.0 if len(dominant_color) >= 3 else 0
-                else:
-                    red_dominance = 0
-                
-                # Heuristic scoring based on properties
-                violence_score = min(red_dominance * 0.3 + (1 - brightness/255) * 0.2, 0.5)
-                
-                return {
-                    'source': 'image_properties',
-                    'categories': {
-                        'violence': float(violence_score),
-                        'nudity': float(min(brightness/255 * 0.1, 0.3)),
-                        'weapons': float(violence_score * 0.5),
-                        'drugs': 0.05,
-                        'hate_symbols': 0.05,
-                        'self_harm': float(violence_score * 0.6),
-                        'extremist_propaganda': 0.05
-                    },
+                },
+                details={
                     'properties': {
                         'brightness': float(brightness),
                         'contrast': float(contrast),
                         'red_dominance': float(red_dominance)
                     }
                 }
-                
-            except Exception as e:
-                logger.error(f"Properties analysis failed: {e}")
-                return {'source': 'image_properties', 'error': str(e)}
-        
-        return await asyncio.get_event_loop().run_in_executor(self.executor, _properties_analysis)
-    
-    def _detect_skin_regions(self, cv_image: np.ndarray) -> float:
-        """Detect skin-colored regions in the image"""
-        try:
-            # Convert to HSV for better skin detection
-            hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
-            
-            # Define skin color range in HSV
-            lower_skin = np.array([0, 20, 70], dtype=np.uint8)
-            upper_skin = np.array([20, 255, 255], dtype=np.uint8)
-            
-            # Create mask for skin regions
-            skin_mask = cv2.inRange(hsv, lower_skin, upper_skin)
-            
-            # Calculate percentage of skin pixels
-            total_pixels = cv_image.shape[0] * cv_image.shape[1]
-            skin_pixels = np.sum(skin_mask > 0)
-            skin_percentage = skin_pixels / total_pixels
-            
-            # Return confidence score (higher skin percentage = higher NSFW risk)
-            return min(float(skin_percentage * 2.0), 1.0)
+            )
             
-        except Exception:
-            return 0.05
+        except Exception as e:
+            logger.error(f"Properties analysis failed: {e}")
+            return SourceResult.failed('image_properties', e)
     
-    def _analyze_edges_for_weapons(self, cv_image: np.ndarray) -> float:
-        """Analyze edge patterns that might indicate weapons"""
-        try:
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            edges = cv2.Canny(gray, 50, 150)
-            
-            # Look for straight lines (potential weapons)
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=100, minLineLength=50, maxLineGap=10)
-            
-            if lines is not None:
-                # More straight lines might indicate weapons
-                line_score = min(len(lines) / 100.0, 1.0)
-                return float(line_score * 0.5)
-            
-            return 0.05
-            
-        except Exception:
-            return 0.05
+    async def _analyze_tiles(self, image: Image.Image) -> SourceResult:
+        """Classify candidate regions of a large image at full resolution"""
+        return await asyncio.get_event_loop().run_in_executor(self.executors.ml, self._tile_analysis, image)
     
-    def _detect_blood_colors(self, cv_image: np.ndarray) -> float:
-        """Detect red colors that might indicate blood/violence"""
+    def _tile_analysis(self, image: Image.Image) -> SourceResult:
         try:
-            # Convert to HSV
-            hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
-            
-            # Define red color ranges (blood-like colors)
-            lower_red1 = np.array([0, 50, 50])
-            upper_red1 = np.array([10, 255, 255])
-            lower_red2 = np.array([170, 50, 50])
-            upper_red2 = np.array([180, 255, 255])
-            
-            mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-            mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-            red_mask = mask1 + mask2
-            
-            total_pixels = cv_image.shape[0] * cv_image.shape[1]
-            red_pixels = np.sum(red_mask > 0)
-            red_percentage = red_pixels / total_pixels
-            
-            return min(float(red_percentage * 1.5), 0.8)
-            
-        except Exception:
-            return 0.05
-    
-    def _analyze_texture_patterns(self, cv_image: np.ndarray) -> float:
-        """Analyze texture patterns for various content types"""
-        try:
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+            rgb = np.asarray(image)
+            
+            # Find candidate regions cheaply on a thumbnail's skin and red masks
+            hsv = cv2.cvtColor(thumbnail_for_masks(rgb), cv2.COLOR_RGB2HSV)
+            candidate_mask = cv2.max(cv_heuristics.skin_mask(hsv), cv_heuristics.red_mask(hsv))
+            regions = candidate_regions(
+                candidate_mask,
+                image.size,
+                settings.TILE_SIZE,
+                settings.MAX_TILES,
+                settings.TILE_MIN_DENSITY
+            )
+            regions = merge_regions(regions, max_side=settings.TILE_SIZE * 2)
             
-            # Calculate texture using standard deviation of Laplacian
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+            categories = {'nudity': 0.05, 'violence': 0.05, 'self_harm': 0.05}
+            tiles = []
+            batch_size = max(1, settings.TILE_BATCH_SIZE)
             
-            # Normalize the variance score
-            texture_score = min(laplacian_var / 1000.0, 1.0)
+            # Densest regions first, stopping at the first decisive tile
+            for start in range(0, len(regions), batch_size):
+                batch = regions[start:start + batch_size]
+                crops = [image.crop(region[:4]) for region in batch]
+                ml_results = self._ml_analysis(crops) if self.classifier else [None] * len(crops)
+                
+                decisive = False
+                for region, crop, ml_result in zip(batch, crops, ml_results):
+                    crop_rgb = rgb[region[1]:region[3], region[0]:region[2]]
+                    blood_score = cv_heuristics.blood_colors(crop_rgb)
+                    if ml_result and ml_result.categories is not None:
+                        nudity_score = ml_result.categories['nudity']
+                    else:
+                        nudity_score = cv_heuristics.skin_regions(crop_rgb)
+                    
+                    categories['nudity'] = max(categories['nudity'], float(nudity_score))
+                    categories['violence'] = max(categories['violence'], float(blood_score))
+                    categories['self_harm'] = max(categories['self_harm'], float(blood_score * 0.8))
+                    tiles.append({
+                        'box': list(region[:4]),
+                        'candidate_density': round(region[4], 3),
+                        'nudity': round(float(nudity_score), 3),
+                        'violence': round(float(blood_score), 3)
+                    })
+                    if max(nudity_score, blood_score) >= settings.TILE_DECISIVE_SCORE:
+                        decisive = True
+                
+                if decisive:
+                    break
             
-            return float(texture_score * 0.3)
+            return SourceResult(
+                source='roi_tiles',
+                categories=categories,
+                details={'tiles': tiles, 'candidate_regions': len(regions)}
+            )
             
-        except Exception:
-            return 0.05
+        except Exception as e:
+            logger.error(f"Tiled analysis failed: {e}")
+            return SourceResult.failed('roi_tiles', e)
     
     def _check_labels_for_keywords(self, labels, keywords: List[str]) -> float:
         """Check Google Vision labels for specific keywords"""
@@ -417,64 +860,17 @@ class ImageAnalysisService:
                     max_confidence = max(max_confidence, float(obj.score * 0.9))
         return max_confidence
     
-    def _combine_analysis_results(self, results: List[Any], filename: str) -> Dict[str, Any]:
+    def _combine_analysis_results(self, results: List[Any], filename: str) -> AnalysisResult:
         """Combine results from multiple analysis methods"""
-        combined_categories = {
-            'violence': [],
-            'nudity': [],
-            'hate_symbols': [],
-            'self_harm': [],
-            'extremist_propaganda': [],
-            'drugs': [],
-            'weapons': []
-        }
-        
-        analysis_sources = []
-        errors = []
-        
-        # Process each result
-        for result in results:
-            if isinstance(result, Exception):
-                errors.append(str(result))
-                continue
-                
-            if isinstance(result, dict) and 'categories' in result:
-                analysis_sources.append(result.get('source', 'unknown'))
-                for category, score in result['categories'].items():
-                    if category in combined_categories:
-                        combined_categories[category].append(float(score))
-        
-        # Calculate final scores using weighted average and max
-        final_categories = {}
-        for category, scores in combined_categories.items():
-            if scores:
-                # Use a combination of max and weighted average
-                max_score = max(scores)
-                avg_score = sum(scores) / len(scores)
-                # Weight towards the higher score but consider average
-                final_score = (max_score * 0.7) + (avg_score * 0.3)
-                final_categories[category] = {
-                    'detected': bool(final_score >= 0.5),
-                    'confidence': round(float(final_score), 3)
-                }
-            else:
-                final_categories[category] = {
-                    'detected': False,
-                    'confidence': 0.05
-                }
-        
-        # Calculate overall safety
-        max_confidence = max([cat['confidence'] for cat in final_categories.values()])
-        is_safe = max_confidence < 0.5
-        
-        return {
-            'overall_score': round(float(max_confidence), 3),
-            'is_safe': bool(is_safe),
-            'categories': final_categories,
-            'provider': 'enhanced_multi_model',
-            'analysis_sources': analysis_sources,
-            'errors': errors if errors else None
-        }
+        return self.combiner.combine(results, filename)
 
 # Create singleton instance
-image_analysis_service = ImageAnalysisService()
\ No newline at end of file
+image_analysis_service = ImageAnalysisService(
+    similarity_index=index_from_settings(),
+    remote=InferencePool.from_settings()
+)
+# Inference workers run their own ladder; an API process using them only forwards requests
+if settings.QUALITY_LADDER_ENABLED and image_analysis_service.remote is None:
+    image_analysis_service.quality = QualityLadder.from_settings(
+        image_analysis_service.queue_depth, analysis_scheduler.queued
+    )
\ No newline at end of file
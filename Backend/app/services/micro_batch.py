@@ -0,0 +1,73 @@
+# app/services/micro_batch.py
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from app.core.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+micro_batch_size = Histogram(
+    "micro_batch_size",
+    "Items per micro-batch, by batcher",
+    labelnames=("batcher",),
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+
+class MicroBatcher:
+    """
+    Groups items submitted concurrently into one call of a batch function.
+
+    The first item of a batch waits at most max_wait_ms for others to join;
+    a batch is sent as soon as it has max_batch items. fn gets the list of
+    items and must return one result per item, in order. Only used from the
+    event loop, so no locking.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int,
+        max_wait_ms: float
+    ):
+        self.name = name
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Items whose callers went away are dropped before the batch is run
+        batch = [(item, future) for item, future in self._pending if not future.done()]
+        self._pending = []
+        if batch:
+            micro_batch_size.observe(len(batch), batcher=self.name)
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,158 @@
+# app/services/multi_head.py
+
+"""
+One vision backbone, many category heads.
+
+The image is preprocessed and run through the backbone once. The pooled
+feature vector that feeds the backbone's own classifier is captured and
+scored by lightweight per-category linear probes, so adding a category costs
+one dot product per image instead of another model.
+
+Head files live in CATEGORY_HEADS_DIR, one per category, named
+<category>.npz with arrays:
+    weight  float [D]   D = the backbone's feature size
+    bias    float []    (optional, default 0)
+Probes output logits; scores are sigmoid(weight . features + bias).
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Labels of the backbone's own head that count as nudity
+NSFW_LABELS = ('nsfw', 'porn', 'explicit')
+
+
+class LinearHeads:
+    """Per-category linear probes stacked into one [C, D] matrix"""
+
+    def __init__(self, categories: Sequence[str], weight: np.ndarray, bias: np.ndarray):
+        self.categories = list(categories)
+        self.weight = np.ascontiguousarray(weight, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        if self.weight.ndim != 2 or self.weight.shape[0] != len(self.categories) or self.bias.shape != (len(self.categories),):
+            raise ValueError(
+                f"Head weights must be [{len(self.categories)}, D] with bias [{len(self.categories)}], "
+                f"got {self.weight.shape} and {self.bias.shape}"
+            )
+
+    @property
+    def feature_dim(self) -> int:
+        return self.weight.shape[1]
+
+    @classmethod
+    def load_dir(cls, path: str) -> 'LinearHeads':
+        """Load every <category>.npz probe in a directory"""
+        from app.services.ensemble import CATEGORIES
+
+        categories, weights, biases = [], [], []
+        for file in sorted(glob.glob(os.path.join(path, '*.npz'))):
+            category = os.path.splitext(os.path.basename(file))[0]
+            if category not in CATEGORIES:
+                raise ValueError(f"Head file {file} is not for a known category. Expected one of {CATEGORIES}")
+            with np.load(file) as data:
+                weights.append(np.asarray(data['weight'], dtype=np.float32).reshape(-1))
+                biases.append(float(data['bias']) if 'bias' in data else 0.0)
+            categories.append(category)
+
+        if not categories:
+            raise ValueError(f"No category heads (*.npz) found in {path}")
+        if len({weight.shape[0] for weight in weights}) != 1:
+            raise ValueError(f"Category heads in {path} have different feature sizes")
+        return cls(categories, np.stack(weights), np.array(biases))
+
+    def save_dir(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for category, weight, bias in zip(self.categories, self.weight, self.bias):
+            np.savez(os.path.join(path, f"{category}.npz"), weight=weight, bias=bias)
+
+    def fingerprint(self) -> str:
+        """Identifies the head weights, for the analyzer model version"""
+        digest = hashlib.sha256()
+        digest.update(','.join(self.categories).encode())
+        digest.update(self.weight.tobytes())
+        digest.update(self.bias.tobytes())
+        return digest.hexdigest()[:8]
+
+    def __call__(self, features: np.ndarray) -> np.ndarray:
+        """[N, D] features -> [N, C] scores in 0..1"""
+        logits = features.astype(np.float32, copy=False) @ self.weight.T + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+
+class SharedBackboneClassifier:
+    """
+    Image classifier whose pooled features are shared with extra category heads.
+
+    Wraps a Hugging Face image-classification checkpoint (by default the NSFW
+    model). A forward pre-hook on its classifier layer captures the features
+    that layer receives, so one forward pass yields both the checkpoint's own
+    NSFW probability and the inputs for every linear probe.
+    """
+
+    def __init__(self, model_name: str, heads: Optional[LinearHeads] = None, device: Optional[str] = None):
+        import torch
+        from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+        self.model_name = model_name
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.processor = AutoImageProcessor.from_pretrained(model_name)
+        self.model = AutoModelForImageClassification.from_pretrained(model_name).to(self.device).eval()
+        self.heads = heads
+
+        head_layer = getattr(self.model, 'classifier', None)
+        if not isinstance(head_layer, torch.nn.Linear):
+            raise ValueError(f"{model_name} has no linear 'classifier' layer to take shared features from")
+        self.feature_dim = head_layer.in_features
+        if heads is not None and heads.feature_dim != self.feature_dim:
+            raise ValueError(
+                f"Category heads expect {heads.feature_dim} features but {model_name} produces {self.feature_dim}"
+            )
+        # Per thread, since several ML executor threads may share the model
+        self._local = threading.local()
+        head_layer.register_forward_pre_hook(self._capture_features)
+
+        labels = self.model.config.id2label
+        self.nsfw_indices = [int(i) for i, label in labels.items() if label.lower() in NSFW_LABELS]
+
+    def _capture_features(self, module, inputs):
+        self._local.features = inputs[0]
+
+    def forward(self, images: List[Image.Image]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns ([N] NSFW probabilities, [N, D] shared features)"""
+        import torch
+
+        images = [image if image.mode == 'RGB' else image.convert('RGB') for image in images]
+        inputs = self.processor(images=images, return_tensors='pt').to(self.device)
+        with torch.inference_mode():
+            probabilities = self.model(**inputs).logits.softmax(dim=-1)
+            if self.nsfw_indices:
+                nsfw = probabilities[:, self.nsfw_indices].amax(dim=-1)
+            else:
+                nsfw = torch.zeros(len(images))
+        features, self._local.features = self._local.features, None
+        return nsfw.float().cpu().numpy(), features.float().cpu().numpy()
+
+    def __call__(self, images: List[Image.Image]) -> Tuple[List[Dict[str, float]], np.ndarray]:
+        """
+        Category scores for each image (only categories with a head, plus nudity)
+        and the [N, D] shared features, which double as image embeddings.
+        """
+        nsfw, features = self.forward(images)
+        head_scores = self.heads(features) if self.heads is not None else None
+        results = []
+        for i in range(len(images)):
+            scores = {'nudity': float(nsfw[i])}
+            if head_scores is not None:
+                # A nudity probe can raise, but never lower, the backbone's own NSFW score
+                for category, score in zip(self.heads.categories, head_scores[i]):
+                    scores[category] = max(scores.get(category, 0.0), float(score))
+            results.append(scores)
+        return results, features
@@ -0,0 +1,240 @@
+# app/services/profiling.py
+
+"""
+Production latency diagnostics that need no redeploy.
+
+RequestTimingMiddleware attaches a RequestTrace to every HTTP request through
+a context variable; the endpoint, scheduler and analyzers add per-stage and
+per-analyzer timings to whichever trace is current (a no-op outside a
+request). Requests slower than SLOW_REQUEST_THRESHOLD_MS are kept in a
+bounded ring buffer served by /admin/slow-requests.
+
+SamplingProfiler samples every thread's Python stack with
+sys._current_frames() for a fixed window and aggregates them into collapsed
+stacks ("thread;outer;...;inner count"), the input format of flamegraph.pl
+and speedscope. It runs only while a profile is requested.
+"""
+
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Awaitable, Deque, Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+slow_requests_captured = Counter(
+    "slow_requests_captured_total",
+    "Requests slower than SLOW_REQUEST_THRESHOLD_MS captured for /admin/slow-requests"
+)
+
+
+class RequestTrace:
+    """Stage and analyzer timings (ms) collected over one request"""
+
+    __slots__ = ("method", "path", "started", "stages", "analyzers", "info")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        # Repeated stages (e.g. per image of a batch) accumulate
+        self.stages: Dict[str, float] = {}
+        self.analyzers: Dict[str, float] = {}
+        self.info: Dict[str, Any] = {}
+
+    def to_dict(self, status_code: int, total_ms: float) -> Dict[str, Any]:
+        return {
+            'timestamp': datetime.utcnow().isoformat(),
+            'method': self.method,
+            'path': self.path,
+            'status_code': status_code,
+            'total_ms': round(total_ms, 2),
+            'stages_ms': {name: round(ms, 2) for name, ms in self.stages.items()},
+            'analyzers_ms': {name: round(ms, 2) for name, ms in self.analyzers.items()},
+            'info': self.info
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def record_stage(name: str, elapsed_ms: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.stages[name] = trace.stages.get(name, 0.0) + elapsed_ms
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as a stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, (time.perf_counter() - start) * 1000)
+
+
+async def timed_analyzer(name: str, awaitable: Awaitable[Any]) -> Any:
+    """Await an analyzer, adding its wall time (executor queueing included) to the current request"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.analyzers[name] = trace.analyzers.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def annotate(**info: Any):
+    """Attach identifying details (digest, size, ...) to the current request's trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.info.update(info)
+
+
+class SlowRequestLog:
+    """Ring buffer of the most recent slow request traces"""
+
+    def __init__(self, capacity: int):
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=max(1, capacity))
+        self._lock = threading.Lock()
+
+    def add(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries.append(entry)
+        slow_requests_captured.inc()
+
+    def recent(self, limit: int, path_prefix: str = "") -> List[Dict[str, Any]]:
+        """Newest first"""
+        with self._lock:
+            entries = list(self._entries)
+        entries = [entry for entry in reversed(entries) if entry['path'].startswith(path_prefix)]
+        return entries[:limit]
+
+    def clear(self) -> int:
+        with self._lock:
+            cleared = len(self._entries)
+            self._entries.clear()
+        return cleared
+
+
+slow_requests = SlowRequestLog(settings.SLOW_REQUEST_BUFFER_SIZE)
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware that traces each HTTP request and captures slow ones.
+    Timing ends when the response body has been sent, so streamed responses
+    are measured in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or settings.SLOW_REQUEST_THRESHOLD_MS <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        reset = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_trace.reset(reset)
+            total_ms = (time.perf_counter() - trace.started) * 1000
+            if total_ms >= settings.SLOW_REQUEST_THRESHOLD_MS:
+                slow_requests.add(trace.to_dict(status_code, total_ms))
+
+
+def _frame_label(code) -> str:
+    # Last two path components keep labels short but tell the many __init__.py apart
+    path = os.path.join(*code.co_filename.split(os.sep)[-2:]) if code.co_filename else "?"
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler over all threads; one profile at a time per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float, interval_ms: float, thread_prefix: str = "") -> Dict[str, Any]:
+        """
+        Sample for `seconds` (blocking; run it off the event loop). Returns the
+        sample count and {collapsed stack: samples}. Raises RuntimeError if a
+        profile is already running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            return self._sample(seconds, interval_ms / 1000, thread_prefix)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, thread_prefix: str) -> Dict[str, Any]:
+        me = threading.get_ident()
+        stacks: Dict[str, int] = {}
+        labels: Dict[Any, str] = {}
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_tick = start
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == me or not name.startswith(thread_prefix):
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    parts.append(label)
+                    frame = frame.f_back
+                parts.append(name)
+                key = ";".join(reversed(parts))
+                stacks[key] = stacks.get(key, 0) + 1
+            samples += 1
+            next_tick += interval
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+        return {
+            'duration_seconds': round(time.perf_counter() - start, 3),
+            'interval_ms': interval * 1000,
+            'samples': samples,
+            'stacks': stacks
+        }
+
+    @staticmethod
+    def collapsed(stacks: Dict[str, int]) -> str:
+        """flamegraph.pl / speedscope collapsed-stack text, heaviest stacks first"""
+        lines = [f"{stack} {count}" for stack, count in sorted(stacks.items(), key=lambda item: -item[1])]
+        return "\n".join(lines) + "\n"
+
+
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,217 @@
+# app/services/quality.py
+
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QualityLevel:
+    """What an analysis at one rung of the ladder runs"""
+    name: str
+    max_side: Optional[int] = None  # working resolution cap (None = as uploaded)
+    tiles: bool = True
+    hough_lines: bool = True  # computer_vision edge/line score
+    dominant_colors: bool = True  # image_properties getcolors()
+    google_vision: bool = True
+    heuristics: bool = True  # computer_vision and image_properties at all
+
+
+# Most thorough first; each level drops more work than the one before
+QUALITY_LEVELS: Tuple[QualityLevel, ...] = (
+    QualityLevel('full'),
+    QualityLevel('reduced_resolution', max_side=settings.QUALITY_REDUCED_MAX_SIDE, tiles=False),
+    QualityLevel(
+        'fast_heuristics', max_side=settings.QUALITY_REDUCED_MAX_SIDE, tiles=False,
+        hough_lines=False, dominant_colors=False
+    ),
+    QualityLevel(
+        'no_google_vision', max_side=settings.QUALITY_REDUCED_MAX_SIDE, tiles=False,
+        hough_lines=False, dominant_colors=False, google_vision=False
+    ),
+    QualityLevel(
+        'ml_only', max_side=settings.QUALITY_REDUCED_MAX_SIDE, tiles=False,
+        hough_lines=False, dominant_colors=False, google_vision=False, heuristics=False
+    ),
+)
+FULL_QUALITY = QUALITY_LEVELS[0]
+QUALITY_INDEX = {level.name: i for i, level in enumerate(QUALITY_LEVELS)}
+
+quality_analyses = Counter(
+    "analysis_quality_total",
+    "Analyses started, by quality level",
+    labelnames=("level",)
+)
+quality_transitions = Counter(
+    "analysis_quality_transitions_total",
+    "Quality ladder level changes, by the level entered",
+    labelnames=("level",)
+)
+quality_level = Gauge("analysis_quality_level", "Current quality ladder level (0 = full)")
+
+
+def parse_pressures(spec: str) -> List[float]:
+    """'1,1.5,2,3' -> load pressure at which each lower level is entered"""
+    pressures = [float(value) for value in spec.split(',') if value.strip()]
+    if len(pressures) != len(QUALITY_LEVELS) - 1 or pressures != sorted(pressures):
+        raise ValueError(f"Expected {len(QUALITY_LEVELS) - 1} ascending pressures, got {spec!r}")
+    return pressures
+
+
+class QualityLadder:
+    """
+    Picks the quality level of each analysis from live load.
+
+    Load pressure is the worst of executor queue depth, analyses in flight
+    (running here or waiting for a scheduler slot) and recent p95 analysis
+    latency, each as a multiple of its limit. Pressure at or above
+    step_pressures[k] moves straight down to level k + 1. The ladder moves
+    back up one level at a time, once pressure has stayed below
+    recover_ratio x the current level's entry pressure for recover_seconds.
+    """
+
+    def __init__(
+        self,
+        queue_depth: Callable[[], int],
+        waiting: Callable[[], int],
+        queue_depth_limit: float,
+        in_flight_limit: float,
+        p95_limit_ms: float,
+        step_pressures: List[float],
+        recover_ratio: float,
+        recover_seconds: float,
+        latency_window_seconds: float,
+        min_latency_samples: int = 20
+    ):
+        self.queue_depth = queue_depth
+        self.waiting = waiting
+        self.queue_depth_limit = queue_depth_limit
+        self.in_flight_limit = in_flight_limit
+        self.p95_limit_ms = p95_limit_ms
+        self.step_pressures = step_pressures
+        self.recover_ratio = recover_ratio
+        self.recover_seconds = recover_seconds
+        self.latency_window_seconds = latency_window_seconds
+        self.min_latency_samples = min_latency_samples
+        self.index = 0
+        self.pinned: Optional[int] = None
+        self.in_flight = 0
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=4096)
+        self._calm_since: Optional[float] = None
+        self._last_signals: Dict[str, float] = {}
+
+    @classmethod
+    def from_settings(cls, queue_depth: Callable[[], int], waiting: Callable[[], int]) -> 'QualityLadder':
+        return cls(
+            queue_depth,
+            waiting,
+            queue_depth_limit=settings.QUALITY_QUEUE_DEPTH_LIMIT,
+            in_flight_limit=settings.QUALITY_IN_FLIGHT_LIMIT,
+            p95_limit_ms=settings.QUALITY_P95_LIMIT_MS,
+            step_pressures=parse_pressures(settings.QUALITY_STEP_PRESSURES),
+            recover_ratio=settings.QUALITY_RECOVER_RATIO,
+            recover_seconds=settings.QUALITY_RECOVER_SECONDS,
+            latency_window_seconds=settings.QUALITY_LATENCY_WINDOW_SECONDS
+        )
+
+    @property
+    def level_index(self) -> int:
+        return self.pinned if self.pinned is not None else self.index
+
+    @property
+    def level(self) -> QualityLevel:
+        return QUALITY_LEVELS[self.level_index]
+
+    def pin(self, name: Optional[str]):
+        """Hold the ladder at a level (None releases it to follow load again)"""
+        self.pinned = QUALITY_INDEX[name] if name is not None else None
+        quality_level.set(self.level_index)
+
+    def p95_ms(self, now: float) -> float:
+        while self._latencies and self._latencies[0][0] < now - self.latency_window_seconds:
+            self._latencies.popleft()
+        if len(self._latencies) < self.min_latency_samples:
+            return 0.0
+        return float(np.percentile([seconds for _, seconds in self._latencies], 95)) * 1000
+
+    def pressure(self, now: float) -> float:
+        signals = {
+            'queue_depth': self.queue_depth(),
+            'in_flight': self.in_flight + self.waiting(),
+            'p95_ms': self.p95_ms(now)
+        }
+        self._last_signals = signals
+        return max(
+            signals['queue_depth'] / self.queue_depth_limit,
+            signals['in_flight'] / self.in_flight_limit,
+            signals['p95_ms'] / self.p95_limit_ms
+        )
+
+    def update(self, now: Optional[float] = None) -> QualityLevel:
+        """Re-evaluate load and return the level for a new analysis"""
+        now = time.monotonic() if now is None else now
+        pressure = self.pressure(now)
+        target = sum(1 for step in self.step_pressures if pressure >= step)
+        if target > self.index:
+            self._move(target, pressure)
+            self._calm_since = None
+        elif self.index > 0 and pressure < self.step_pressures[self.index - 1] * self.recover_ratio:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.recover_seconds:
+                self._move(self.index - 1, pressure)
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        return self.level
+
+    def _move(self, index: int, pressure: float):
+        logger.warning(
+            f"Analysis quality {QUALITY_LEVELS[self.index].name} -> {QUALITY_LEVELS[index].name} "
+            f"(load pressure {pressure:.2f}: {self._last_signals})"
+        )
+        self.index = index
+        quality_transitions.inc(level=QUALITY_LEVELS[index].name)
+        quality_level.set(self.level_index)
+
+    @contextmanager
+    def admit(self, count: int = 1, timed: bool = True) -> Iterator[QualityLevel]:
+        """Pick the level for count analyses, counting them in flight; timed ones feed the p95"""
+        level = self.update()
+        quality_analyses.inc(count, level=level.name)
+        self.in_flight += count
+        start = time.monotonic()
+        try:
+            yield level
+        finally:
+            self.in_flight -= count
+            if timed:
+                end = time.monotonic()
+                self._latencies.append((end, end - start))
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            'level': self.level.name,
+            'pinned': self.pinned is not None,
+            'load_pressure': round(self.pressure(now), 3),
+            'signals': {key: round(value, 2) for key, value in self._last_signals.items()},
+            'limits': {
+                'queue_depth': self.queue_depth_limit,
+                'in_flight': self.in_flight_limit,
+                'p95_ms': self.p95_limit_ms
+            },
+            'levels': [
+                {'name': level.name, 'entered_at_pressure': ([0.0] + self.step_pressures)[i]}
+                for i, level in enumerate(QUALITY_LEVELS)
+            ],
+            'recovering_for_seconds': round(now - self._calm_since, 1) if self._calm_since is not None else None
+        }
@@ -0,0 +1,134 @@
+# app/services/reevaluation.py
+
+import logging
+import time
+from typing import Dict, Any, Optional, List
+import numpy as np
+from pymongo import UpdateOne
+from app.core.database import get_db
+from app.services.ensemble import CATEGORIES, EnsembleCombiner
+from app.services.verdict_store import RAW_SHAPE, pack_scores, unpack_source_matrices
+
+logger = logging.getLogger(__name__)
+
+# Verdicts combined per vectorized pass
+REEVALUATION_CHUNK_SIZE = 10000
+
+PROJECTION = {'raw': 1, 'raw_mask': 1, 'raw_shape': 1, 'detected': 1, 'is_safe': 1}
+
+
+class ReevaluationReport:
+    """Flip counters accumulated over the chunks of one re-evaluation"""
+
+    def __init__(self):
+        self.scanned = 0
+        self.skipped = 0
+        self.to_unsafe = 0
+        self.to_safe = 0
+        self.newly_detected = np.zeros(len(CATEGORIES), dtype=np.int64)
+        self.cleared = np.zeros(len(CATEGORIES), dtype=np.int64)
+        self.applied = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'scanned': self.scanned,
+            'skipped_without_raw_scores': self.skipped,
+            'verdict_flips': {
+                'total': self.to_unsafe + self.to_safe,
+                'safe_to_unsafe': self.to_unsafe,
+                'unsafe_to_safe': self.to_safe,
+                'rate': round((self.to_unsafe + self.to_safe) / self.scanned, 4) if self.scanned else 0.0
+            },
+            'category_flips': {
+                category: {'newly_detected': int(self.newly_detected[i]), 'cleared': int(self.cleared[i])}
+                for i, category in enumerate(CATEGORIES)
+            },
+            'applied': self.applied
+        }
+
+
+def _compare_chunk(
+    combiner: EnsembleCombiner,
+    docs: List[Dict[str, Any]],
+    report: ReevaluationReport
+) -> Dict[str, np.ndarray]:
+    """Recombine one chunk of stored raw scores and count flips against the stored verdicts"""
+    scores, mask = unpack_source_matrices([doc['raw'] for doc in docs], [doc['raw_mask'] for doc in docs])
+    combined = combiner.combine_batch(scores, mask)
+
+    was_safe = np.array([doc.get('is_safe', True) for doc in docs], dtype=bool)
+    bits = np.arange(len(CATEGORIES), dtype=np.int64)
+    was_detected = ((np.array([doc.get('detected', 0) for doc in docs], dtype=np.int64)[:, None] >> bits) & 1).astype(bool)
+
+    report.scanned += len(docs)
+    report.to_unsafe += int((was_safe & ~combined['is_safe']).sum())
+    report.to_safe += int((~was_safe & combined['is_safe']).sum())
+    report.newly_detected += (combined['detected'] & ~was_detected).sum(axis=0)
+    report.cleared += (~combined['detected'] & was_detected).sum(axis=0)
+    return combined
+
+
+def _update_operations(docs: List[Dict[str, Any]], combined: Dict[str, np.ndarray], model_version: str) -> List[UpdateOne]:
+    detected_bits = (combined['detected'].astype(np.int64) << np.arange(len(CATEGORIES), dtype=np.int64)).sum(axis=1)
+    return [
+        UpdateOne({'_id': doc['_id']}, {'$set': {
+            'scores': pack_scores(combined['confidence'][i]),
+            'detected': int(detected_bits[i]),
+            'overall': float(combined['overall_score'][i]),
+            'is_safe': bool(combined['is_safe'][i]),
+            'model_version': model_version
+        }})
+        for i, doc in enumerate(docs)
+    ]
+
+
+async def reevaluate_verdicts(
+    combiner: EnsembleCombiner,
+    source_model_version: str,
+    apply_as: Optional[str] = None,
+    limit: int = 0
+) -> Dict[str, Any]:
+    """
+    Recompute stored verdicts produced by source_model_version under another
+    combiner config, from their raw source x category scores only (no image
+    decoding or inference). With apply_as, the new verdicts are written back
+    under that model_version.
+    """
+    start = time.perf_counter()
+    db = get_db()
+    report = ReevaluationReport()
+
+    cursor = db.verdicts.find(
+        {'model_version': source_model_version},
+        projection=PROJECTION,
+        batch_size=REEVALUATION_CHUNK_SIZE
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+
+    async def process(chunk: List[Dict[str, Any]]):
+        combined = _compare_chunk(combiner, chunk, report)
+        if apply_as:
+            result = await db.verdicts.bulk_write(_update_operations(chunk, combined, apply_as), ordered=False)
+            report.applied += result.modified_count
+
+    chunk = []
+    async for doc in cursor:
+        if doc.get('raw') is None or tuple(doc.get('raw_shape') or ()) != RAW_SHAPE:
+            # Recorded before raw scores were kept, or with a different source/category layout
+            report.skipped += 1
+            continue
+        chunk.append(doc)
+        if len(chunk) >= REEVALUATION_CHUNK_SIZE:
+            await process(chunk)
+            chunk = []
+    if chunk:
+        await process(chunk)
+
+    summary = report.to_dict()
+    summary['elapsed_ms'] = int((time.perf_counter() - start) * 1000)
+    logger.info(
+        f"Re-evaluated {report.scanned} verdicts from {source_model_version}: "
+        f"{summary['verdict_flips']['total']} flips, {report.applied} applied"
+    )
+    return summary
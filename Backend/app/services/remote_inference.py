@@ -0,0 +1,301 @@
+# app/services/remote_inference.py
+
+"""
+Client side of the inference worker tier (app/worker.py).
+
+API processes started with INFERENCE_WORKERS send each image, as uploaded,
+to one of the workers over pooled keep-alive HTTP connections, and get its
+AnalysisResult back as msgpack:
+
+    POST /analyze   {"image": <bin>, "filename": str}  ->  encode_result(...)
+    POST /embed     {"image": <bin>}                   ->  {"embedding": <bin float32> | None}
+    GET  /health                                       ->  {"status", "model_version", "in_flight"}
+
+Dispatch is least-outstanding-requests over the healthy workers (counted by
+this process). Connection errors, timeouts and 5xx responses retry on a
+different worker, up to INFERENCE_MAX_ATTEMPTS; a worker that fails
+INFERENCE_UNHEALTHY_AFTER times in a row is taken out of rotation until its
+/health check passes again.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Set
+import aiohttp
+import msgpack
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+from app.models.analysis import AnalysisResult, CategoryResult, SourceResult
+
+logger = logging.getLogger(__name__)
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+inference_requests = Counter(
+    "inference_requests_total",
+    "Requests sent to inference workers, by worker and outcome",
+    labelnames=("worker", "outcome")
+)
+inference_latency = Histogram(
+    "inference_request_seconds",
+    "Round-trip time of successful inference worker requests",
+    labelnames=("worker",)
+)
+inference_outstanding = Gauge(
+    "inference_outstanding_requests",
+    "Requests this process has in flight per inference worker",
+    labelnames=("worker",)
+)
+
+
+class InferenceUnavailable(Exception):
+    """No inference worker could analyze the image"""
+
+
+class _RetryableError(Exception):
+    pass
+
+
+def _details_for_wire(details: Dict[str, Any]) -> Dict[str, Any]:
+    # Embeddings only matter to the worker's own similarity lookup
+    return {key: value for key, value in details.items() if key != 'embedding'}
+
+
+def encode_result(results: AnalysisResult) -> Dict[str, Any]:
+    """msgpack-ready form of an AnalysisResult, including the raw source results"""
+    data = results.to_dict()
+    data['source_results'] = [
+        {
+            'source': source.source,
+            'categories': source.categories,
+            'details': _details_for_wire(source.details),
+            'error': source.error
+        }
+        for source in results.source_results
+    ]
+    return data
+
+
+def decode_result(data: Dict[str, Any]) -> AnalysisResult:
+    return AnalysisResult(
+        overall_score=data['overall_score'],
+        is_safe=data['is_safe'],
+        categories={
+            category: CategoryResult(detected=result['detected'], confidence=result['confidence'])
+            for category, result in data['categories'].items()
+        },
+        provider=data['provider'],
+        analysis_sources=data['analysis_sources'],
+        errors=data['errors'],
+        degraded_sources=data['degraded_sources'],
+        source_results=[SourceResult(**source) for source in data.get('source_results', [])],
+        frames=data.get('frames'),
+        model_version=data.get('model_version'),
+        similar_to=data.get('similar_to'),
+        quality_level=data.get('quality_level', 'full')
+    )
+
+
+def pack_message(data: Dict[str, Any]) -> bytes:
+    # default= covers NumPy scalars that analyzers leave in details
+    return msgpack.packb(data, use_bin_type=True, default=lambda value: value.item() if isinstance(value, np.generic) else value)
+
+
+class InferenceWorker:
+    """One worker endpoint and what this process knows about it"""
+
+    __slots__ = ("url", "outstanding", "healthy", "failures", "model_version", "last_checked", "last_error")
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.model_version: Optional[str] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'consecutive_failures': self.failures,
+            'model_version': self.model_version,
+            'seconds_since_check': round(time.monotonic() - self.last_checked, 1) if self.last_checked else None,
+            'last_error': self.last_error
+        }
+
+
+class InferencePool:
+    """Least-outstanding-requests dispatch to a set of inference workers"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        timeout_seconds: float,
+        max_attempts: int,
+        unhealthy_after: int,
+        health_interval_seconds: float,
+        connections_per_worker: int
+    ):
+        if not urls:
+            raise ValueError("An inference pool needs at least one worker URL")
+        self.workers = [InferenceWorker(url) for url in urls]
+        self.timeout_seconds = timeout_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.unhealthy_after = max(1, unhealthy_after)
+        self.health_interval_seconds = health_interval_seconds
+        self.connections_per_worker = connections_per_worker
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> Optional['InferencePool']:
+        urls = [url.strip() for url in settings.INFERENCE_WORKERS.split(',') if url.strip()]
+        if not urls:
+            return None
+        return cls(
+            urls,
+            timeout_seconds=settings.ANALYSIS_TIMEOUT_SECONDS,
+            max_attempts=settings.INFERENCE_MAX_ATTEMPTS,
+            unhealthy_after=settings.INFERENCE_UNHEALTHY_AFTER,
+            health_interval_seconds=settings.INFERENCE_HEALTH_INTERVAL_SECONDS,
+            connections_per_worker=settings.INFERENCE_CONNECTIONS_PER_WORKER
+        )
+
+    @property
+    def model_version(self) -> Optional[str]:
+        """Analyzer version reported by the healthy workers (the first one that reported)"""
+        for worker in self.workers:
+            if worker.healthy and worker.model_version:
+                return worker.model_version
+        return None
+
+    def outstanding(self) -> int:
+        return sum(worker.outstanding for worker in self.workers)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily inside the running loop (and so per forked worker process)
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.connections_per_worker * len(self.workers),
+                    limit_per_host=self.connections_per_worker,
+                    keepalive_timeout=60
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+            )
+        return self._session
+
+    async def start(self):
+        """Check every worker once, then keep checking in the background"""
+        await self.check_health()
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval_seconds)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Inference worker health check failed: {e}")
+
+    async def check_health(self):
+        await asyncio.gather(*(self._check_worker(worker) for worker in self.workers))
+
+    async def _check_worker(self, worker: InferenceWorker):
+        session = self._get_session()
+        try:
+            async with session.get(
+                f"{worker.url}/health", timeout=aiohttp.ClientTimeout(total=min(5.0, self.timeout_seconds))
+            ) as response:
+                if response.status != 200:
+                    raise _RetryableError(f"health check returned HTTP {response.status}")
+                health = msgpack.unpackb(await response.read(), raw=False)
+            if not worker.healthy:
+                logger.info(f"Inference worker {worker.url} is healthy again")
+            worker.healthy = True
+            worker.failures = 0
+            worker.model_version = health.get('model_version')
+            worker.last_error = None
+        except (aiohttp.ClientError, asyncio.TimeoutError, _RetryableError, ValueError) as e:
+            if worker.healthy:
+                logger.warning(f"Inference worker {worker.url} failed its health check: {e!r}")
+            worker.healthy = False
+            worker.last_error = repr(e)
+        worker.last_checked = time.monotonic()
+
+    def _pick(self, tried: Set[InferenceWorker]) -> Optional[InferenceWorker]:
+        candidates = [worker for worker in self.workers if worker not in tried and worker.healthy]
+        if not candidates:
+            # Health may be stale; an untried unhealthy worker beats failing outright
+            candidates = [worker for worker in self.workers if worker not in tried]
+        if not candidates:
+            return None
+        fewest = min(worker.outstanding for worker in candidates)
+        return random.choice([worker for worker in candidates if worker.outstanding == fewest])
+
+    def _record_failure(self, worker: InferenceWorker, error: Exception):
+        worker.failures += 1
+        worker.last_error = repr(error)
+        if worker.healthy and worker.failures >= self.unhealthy_after:
+            logger.warning(f"Taking inference worker {worker.url} out of rotation after {worker.failures} failures: {error!r}")
+            worker.healthy = False
+
+    async def _call(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        body = pack_message(payload)
+        tried: Set[InferenceWorker] = set()
+        last_error: Optional[Exception] = None
+        for _ in range(min(self.max_attempts, len(self.workers))):
+            worker = self._pick(tried)
+            if worker is None:
+                break
+            tried.add(worker)
+            worker.outstanding += 1
+            inference_outstanding.inc(worker=worker.url)
+            start = time.perf_counter()
+            try:
+                async with self._get_session().post(
+                    f"{worker.url}{path}", data=body, headers={"Content-Type": MSGPACK_MEDIA_TYPE}
+                ) as response:
+                    content = await response.read()
+                    if response.status >= 500:
+                        raise _RetryableError(f"HTTP {response.status}")
+                    if response.status != 200:
+                        inference_requests.inc(worker=worker.url, outcome="rejected")
+                        raise InferenceUnavailable(f"Inference worker {worker.url} rejected the request: HTTP {response.status}")
+                worker.failures = 0
+                inference_requests.inc(worker=worker.url, outcome="ok")
+                inference_latency.observe(time.perf_counter() - start, worker=worker.url)
+                return msgpack.unpackb(content, raw=False)
+            except (aiohttp.ClientError, asyncio.TimeoutError, _RetryableError) as e:
+                inference_requests.inc(worker=worker.url, outcome="retried")
+                self._record_failure(worker, e)
+                last_error = e
+            finally:
+                worker.outstanding -= 1
+                inference_outstanding.dec(worker=worker.url)
+        raise InferenceUnavailable(f"No inference worker could serve {path} (tried {len(tried)}): {last_error!r}")
+
+    async def analyze(self, image_bytes: bytes, filename: str = "") -> AnalysisResult:
+        return decode_result(await self._call("/analyze", {"image": image_bytes, "filename": filename}))
+
+    async def embed(self, image_bytes: bytes) -> Optional[np.ndarray]:
+        embedding = (await self._call("/embed", {"image": image_bytes})).get("embedding")
+        return np.frombuffer(embedding, dtype=np.float32) if embedding is not None else None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [worker.snapshot() for worker in self.workers]
@@ -0,0 +1,208 @@
+# app/services/scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import Gauge, Histogram
+from app.services.executors import plan_from_settings
+from app.services.profiling import record_stage
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first; a class is only served while every class before it has nothing queued
+PRIORITY_CLASSES = ('interactive', 'batch', 'background')
+
+# Recent queueing delays kept per class for percentiles in stats()
+DELAY_SAMPLES = 2048
+
+scheduler_queue_delay = Histogram(
+    "analysis_scheduler_queue_delay_seconds",
+    "Time analyses waited for a scheduler slot, by priority class",
+    labelnames=("priority_class",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+scheduler_queued = Gauge(
+    "analysis_scheduler_queued",
+    "Analyses waiting for a scheduler slot, by priority class",
+    labelnames=("priority_class",)
+)
+
+
+def token_scheduling(token: Dict[str, Any], priority_class: str) -> Tuple[str, float]:
+    """
+    Effective (priority class, weight) of a request from a token document.
+
+    The endpoint's class is demoted to the token's priorityClass when that is
+    lower, so a token marked 'batch' cannot jump the queue through the
+    interactive endpoint. Tokens without a stored weight get 1, or
+    SCHEDULER_ADMIN_WEIGHT for admin tokens.
+    """
+    token_class = token.get('priorityClass') or PRIORITY_CLASSES[0]
+    if token_class in PRIORITY_CLASSES:
+        priority_class = max(priority_class, token_class, key=PRIORITY_CLASSES.index)
+    weight = token.get('weight') or (settings.SCHEDULER_ADMIN_WEIGHT if token.get('isAdmin') else 1.0)
+    return priority_class, float(weight)
+
+
+def capacity_from_settings() -> int:
+    """
+    MAX_CONCURRENT_ANALYSES, or with 0 as many analyses as can actually make
+    progress at once. A slot is held for the whole analysis, Google Vision
+    round trip and inference worker call included, so a cap below the
+    executor threads (or worker connections) would idle them on I/O.
+    """
+    if settings.MAX_CONCURRENT_ANALYSES > 0:
+        return settings.MAX_CONCURRENT_ANALYSES
+    workers = [url for url in settings.INFERENCE_WORKERS.split(',') if url.strip()]
+    if workers:
+        return len(workers) * settings.INFERENCE_CONNECTIONS_PER_WORKER
+    plan = plan_from_settings()
+    return plan.io_workers + plan.cv_workers + plan.ml_workers
+
+
+class _Waiter:
+    __slots__ = ("future", "priority_class", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority_class: str):
+        self.future = future
+        self.priority_class = priority_class
+        self.enqueued_at = time.perf_counter()
+
+
+class FairScheduler:
+    """
+    Admission control for analyses: at most `capacity` run at once, the rest
+    wait here instead of in the executor FIFOs.
+
+    Waiting analyses are ordered by strict priority class, then within a class
+    by start-time fair queuing across flows (tokens): each request is tagged
+    start = max(class virtual time, flow's last finish tag) and
+    finish = start + cost / weight, and the smallest finish tag goes next. A
+    token flooding the queue only pushes its own tags further out, so other
+    tokens keep a share of the slots proportional to their weight.
+
+    Only used from the event loop, so no locking.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self._running = 0
+        self._seq = itertools.count()
+        # Per class: heap of (finish tag, seq, waiter), virtual time, flow -> last finish tag
+        self._queues: Dict[str, List[Tuple[float, int, _Waiter]]] = {cls: [] for cls in PRIORITY_CLASSES}
+        self._virtual_time: Dict[str, float] = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._finish_tags: Dict[str, Dict[str, float]] = {cls: {} for cls in PRIORITY_CLASSES}
+        self._start_tags: Dict[int, float] = {}
+        self._delays: Dict[str, Deque[float]] = {cls: deque(maxlen=DELAY_SAMPLES) for cls in PRIORITY_CLASSES}
+        Gauge(
+            f"analysis_scheduler_{name}_running",
+            f"Analyses currently holding one of the {name} scheduler's slots",
+            function=lambda: self._running
+        )
+
+    async def run(
+        self,
+        token: Dict[str, Any],
+        priority_class: str,
+        fn: Callable[[], Awaitable[Any]],
+        cost: float = 1.0
+    ) -> Any:
+        """Wait for a slot as `token` in `priority_class`, then await fn()"""
+        priority_class, weight = token_scheduling(token, priority_class)
+        start = time.perf_counter()
+        await self.acquire(token.get('token', ''), priority_class, weight, cost)
+        record_stage('scheduler_queue', (time.perf_counter() - start) * 1000)
+        try:
+            return await fn()
+        finally:
+            self.release()
+
+    async def acquire(self, flow: str, priority_class: str, weight: float = 1.0, cost: float = 1.0):
+        if priority_class not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class {priority_class!r}. Expected one of {PRIORITY_CLASSES}")
+        if self._running < self.capacity:
+            # Free slots only exist while nothing is queued (release() dispatches synchronously)
+            self._running += 1
+            self._observe(priority_class, 0.0)
+            return
+
+        finish_tags = self._finish_tags[priority_class]
+        start = max(self._virtual_time[priority_class], finish_tags.get(flow, 0.0))
+        finish_tags[flow] = start + cost / max(weight, 1e-6)
+        waiter = _Waiter(asyncio.get_event_loop().create_future(), priority_class)
+        seq = next(self._seq)
+        self._start_tags[seq] = start
+        heapq.heappush(self._queues[priority_class], (finish_tags[flow], seq, waiter))
+        scheduler_queued.inc(priority_class=priority_class)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted a slot but cancelled before it could run; hand it on
+                self.release()
+            raise
+
+    def release(self):
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._running < self.capacity:
+            entry = self._next()
+            if entry is None:
+                return
+            seq, waiter = entry
+            self._virtual_time[waiter.priority_class] = self._start_tags.pop(seq)
+            if waiter.future.done():
+                # Cancelled while queued
+                continue
+            self._running += 1
+            waiter.future.set_result(None)
+            self._observe(waiter.priority_class, time.perf_counter() - waiter.enqueued_at)
+
+    def _next(self) -> Optional[Tuple[int, _Waiter]]:
+        for priority_class in PRIORITY_CLASSES:
+            queue = self._queues[priority_class]
+            if queue:
+                _, seq, waiter = heapq.heappop(queue)
+                scheduler_queued.dec(priority_class=priority_class)
+                if not queue:
+                    # Class went idle: flows start afresh in the next busy period
+                    self._finish_tags[priority_class].clear()
+                return seq, waiter
+        return None
+
+    def _observe(self, priority_class: str, delay: float):
+        scheduler_queue_delay.observe(delay, priority_class=priority_class)
+        self._delays[priority_class].append(delay)
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, Any]:
+        classes = {}
+        for priority_class in PRIORITY_CLASSES:
+            delays = np.array(self._delays[priority_class]) * 1000
+            percentiles = np.percentile(delays, [50, 95, 99]) if len(delays) else [0.0, 0.0, 0.0]
+            classes[priority_class] = {
+                'queued': len(self._queues[priority_class]),
+                'active_flows': len(self._finish_tags[priority_class]),
+                'recent_requests': len(delays),
+                'queue_delay_ms': {
+                    'p50': round(float(percentiles[0]), 2),
+                    'p95': round(float(percentiles[1]), 2),
+                    'p99': round(float(percentiles[2]), 2)
+                }
+            }
+        return {'capacity': self.capacity, 'running': self._running, 'classes': classes}
+
+
+# One scheduler per worker process in front of all request-path analyses
+analysis_scheduler = FairScheduler("analysis", capacity_from_settings())
@@ -0,0 +1,211 @@
+# app/services/shadow.py
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+import numpy as np
+from app.core.config import settings
+from app.models.analysis import AnalysisResult, SourceResult
+from app.services.ensemble import CATEGORIES, Calibration, EnsembleCombiner, parse_source_weights
+
+logger = logging.getLogger(__name__)
+
+# Nice value for shadow threads so they only use spare CPU
+SHADOW_THREAD_NICENESS = 10
+
+
+def _lower_thread_priority():
+    """Executor initializer: deprioritize the calling thread (Linux applies nice per thread)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), SHADOW_THREAD_NICENESS)
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Could not lower shadow thread priority: {e}")
+
+
+class ShadowStore:
+    """
+    Fixed-size ring buffer of shadow comparisons held in flat NumPy arrays.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.score_deltas = np.zeros((self.capacity, len(CATEGORIES)), dtype=np.float32)
+        self.detected_flips = np.zeros((self.capacity, len(CATEGORIES)), dtype=bool)
+        self.verdict_flips = np.zeros(self.capacity, dtype=bool)
+        self.latency_deltas_ms = np.zeros(self.capacity, dtype=np.float32)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, primary: AnalysisResult, candidate: AnalysisResult, latency_delta_ms: float):
+        deltas = [
+            candidate.categories[category].confidence - primary.categories[category].confidence
+            for category in CATEGORIES
+        ]
+        flips = [
+            candidate.categories[category].detected != primary.categories[category].detected
+            for category in CATEGORIES
+        ]
+        with self._lock:
+            slot = self.count % self.capacity
+            self.score_deltas[slot] = deltas
+            self.detected_flips[slot] = flips
+            self.verdict_flips[slot] = candidate.is_safe != primary.is_safe
+            self.latency_deltas_ms[slot] = latency_delta_ms
+            self.timestamps[slot] = time.time()
+            self.count += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            n = min(self.count, self.capacity)
+            score_deltas = self.score_deltas[:n].copy()
+            detected_flips = self.detected_flips[:n].copy()
+            verdict_flips = self.verdict_flips[:n].copy()
+            latency_deltas = self.latency_deltas_ms[:n].copy()
+            timestamps = self.timestamps[:n].copy()
+
+        if n == 0:
+            return {'samples': 0, 'total_recorded': self.count}
+
+        abs_deltas = np.abs(score_deltas)
+        categories = {
+            category: {
+                'mean_delta': round(float(score_deltas[:, i].mean()), 4),
+                'mean_abs_delta': round(float(abs_deltas[:, i].mean()), 4),
+                'p95_abs_delta': round(float(np.percentile(abs_deltas[:, i], 95)), 4),
+                'max_abs_delta': round(float(abs_deltas[:, i].max()), 4),
+                'detection_flip_rate': round(float(detected_flips[:, i].mean()), 4)
+            }
+            for i, category in enumerate(CATEGORIES)
+        }
+        return {
+            'samples': n,
+            'total_recorded': self.count,
+            'window_start': float(timestamps.min()),
+            'window_end': float(timestamps.max()),
+            'verdict_flip_rate': round(float(verdict_flips.mean()), 4),
+            'categories': categories,
+            'latency_delta_ms': {
+                'mean': round(float(latency_deltas.mean()), 2),
+                'p50': round(float(np.percentile(latency_deltas, 50)), 2),
+                'p95': round(float(np.percentile(latency_deltas, 95)), 2)
+            }
+        }
+
+
+class ShadowScorer:
+    """
+    Runs a candidate analyzer configuration on a sample of live requests after
+    the response has been sent, and records how its verdicts differ.
+
+    The candidate reuses the primary's Google Vision result rather than calling
+    the API again. Latency deltas compare local_analysis_ms of both sides:
+    decode to combine in this process, without Vision, scheduler queueing or
+    single-flight waits.
+    """
+
+    def __init__(self):
+        self.enabled = settings.SHADOW_MODE_ENABLED
+        if self.enabled and settings.INFERENCE_WORKERS.strip():
+            # The candidate would load a second model set into an API process meant to load none,
+            # and a local candidate does not compare with a primary that runs on the workers
+            logger.warning("Shadow scoring is disabled: analyses run on inference workers (INFERENCE_WORKERS)")
+            self.enabled = False
+        self.sample_rate = settings.SHADOW_SAMPLE_RATE
+        self.store = ShadowStore(settings.SHADOW_STORE_SIZE)
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="shadow",
+            initializer=_lower_thread_priority
+        )
+        self.candidate = None
+        self.in_flight = 0
+        self.skipped_overload = 0
+        self.failures = 0
+        self._candidate_lock = asyncio.Lock()
+
+    def _build_candidate(self):
+        from app.services.image_analysis import ImageAnalysisService
+
+        calibration = None
+        if settings.SHADOW_CALIBRATION_PATH:
+            calibration = Calibration.load(settings.SHADOW_CALIBRATION_PATH)
+        combiner = EnsembleCombiner(
+            weights=parse_source_weights(settings.SHADOW_SOURCE_WEIGHTS or settings.ENSEMBLE_SOURCE_WEIGHTS),
+            calibration=calibration
+        )
+        return ImageAnalysisService(
+            nsfw_model=settings.SHADOW_NSFW_MODEL or settings.NSFW_MODEL,
+            combiner=combiner,
+            use_google_vision=False,
+            executor=self.executor
+        )
+
+    def _overloaded(self, primary_queue_depth: int) -> bool:
+        return (
+            primary_queue_depth > settings.SHADOW_MAX_QUEUE_DEPTH
+            or self.in_flight >= settings.SHADOW_MAX_IN_FLIGHT
+        )
+
+    def should_sample(self, primary_queue_depth: int) -> bool:
+        """Decide whether this request gets a shadow run; never when the primary path is busy"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        if self._overloaded(primary_queue_depth):
+            self.skipped_overload += 1
+            return False
+        return True
+
+    async def run(
+        self,
+        image_bytes: bytes,
+        filename: str,
+        primary: AnalysisResult,
+        source_results: List[SourceResult]
+    ):
+        """Score the image with the candidate configuration and record the comparison"""
+        self.in_flight += 1
+        try:
+            async with self._candidate_lock:
+                if self.candidate is None:
+                    self.candidate = await asyncio.get_event_loop().run_in_executor(
+                        self.executor, self._build_candidate
+                    )
+
+            reused = [result for result in source_results if result.source == 'google_vision']
+            candidate = await self.candidate.analyze_image(image_bytes, filename, extra_results=reused)
+            if primary.local_analysis_ms is None or candidate.local_analysis_ms is None:
+                # One side failed before its analyzers finished; nothing comparable
+                self.failures += 1
+                return
+
+            self.store.record(primary, candidate, candidate.local_analysis_ms - primary.local_analysis_ms)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Shadow scoring failed: {e}")
+        finally:
+            self.in_flight -= 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'candidate': {
+                'nsfw_model': settings.SHADOW_NSFW_MODEL or settings.NSFW_MODEL,
+                'source_weights': parse_source_weights(settings.SHADOW_SOURCE_WEIGHTS or settings.ENSEMBLE_SOURCE_WEIGHTS),
+                'calibration_path': settings.SHADOW_CALIBRATION_PATH or None,
+                'reuses_primary_google_vision': True
+            },
+            'in_flight': self.in_flight,
+            'skipped_overload': self.skipped_overload,
+            'failures': self.failures,
+            'comparison': self.store.summary()
+        }
+
+
+shadow_scorer = ShadowScorer()
@@ -0,0 +1,87 @@
+# app/services/single_flight.py
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from app.core.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+singleflight_calls = Counter(
+    "moderation_singleflight_calls_total",
+    "Analysis requests by whether they started an analysis (leader) or attached to one in flight (coalesced)",
+    labelnames=("role",)
+)
+singleflight_abandoned = Counter(
+    "moderation_singleflight_abandoned_total",
+    "In-flight analyses cancelled because every waiting request went away"
+)
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key onto one in-flight task.
+
+    The first caller for a key starts the work; callers arriving while it is
+    running await the same task and get the same result (or exception). Each
+    caller waits through asyncio.shield, so a cancelled caller (e.g. the client
+    disconnected) only drops its own wait. The shared task is cancelled once
+    the last waiter has gone. Keys are forgotten as soon as the task finishes,
+    so nothing is cached beyond the lifetime of the call.
+
+    Only used from the event loop, so no locking.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        Gauge(
+            f"moderation_singleflight_{name}_in_flight",
+            f"Distinct {name} calls currently in flight",
+            function=lambda: len(self._calls)
+        )
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn() for key, or join the run already in flight. Returns (result, coalesced)."""
+        call = self._calls.get(key)
+        coalesced = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        singleflight_calls.inc(role="coalesced" if coalesced else "leader")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), coalesced
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left to receive the result; stop the work and make
+                # sure a later caller starts afresh instead of joining a dying task
+                logger.info(f"Single-flight '{self.name}': abandoning call with no waiters left")
+                singleflight_abandoned.inc()
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if call.task.done() and not call.task.cancelled():
+            # Mark the exception retrieved so one nobody awaited is not logged as unhandled
+            call.task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+# Identical image bytes uploaded concurrently share one analysis, keyed by SHA-256
+analysis_flight = SingleFlight("analysis")
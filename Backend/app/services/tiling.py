@@ -0,0 +1,112 @@
+# app/services/tiling.py
+
+from typing import List, Tuple
+import numpy as np
+import cv2
+
+# (x0, y0, x1, y1, score) in full-resolution pixel coordinates
+Region = Tuple[int, int, int, int, float]
+
+# Long side of the thumbnail used to find candidate regions
+MASK_RESOLUTION = 256
+
+
+def _overlap(a: Region, b: Region) -> float:
+    """Intersection area over the smaller box's area"""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return (ix * iy) / smaller if smaller > 0 else 0.0
+
+
+def candidate_regions(
+    mask: np.ndarray,
+    image_size: Tuple[int, int],
+    tile_size: int,
+    max_tiles: int,
+    min_density: float
+) -> List[Region]:
+    """
+    Pick the densest tile windows of a low-resolution binary mask.
+
+    mask is a uint8 mask (0/255) computed on a thumbnail of the image;
+    image_size is the full-resolution (width, height). Windows are scanned
+    at half-tile stride and returned in full-resolution coordinates, densest
+    first, with heavily overlapping windows suppressed. On an axis shorter
+    than a tile (e.g. the height of a wide banner) windows span the whole
+    axis and slide along the other one only.
+    """
+    width, height = image_size
+    mask_h, mask_w = mask.shape[:2]
+    scale = mask_w / float(width)
+    window = max(2, int(round(tile_size * scale)))
+    window_w, window_h = min(window, mask_w), min(window, mask_h)
+    if window_w == mask_w and window_h == mask_h:
+        # The whole image fits in one tile; the full-image analyzers already cover it
+        return []
+    tile_w, tile_h = min(tile_size, width), min(tile_size, height)
+
+    # Mean mask value over every window via a box filter, sampled at half-window stride
+    density = cv2.boxFilter(mask.astype(np.float32) / 255.0, -1, (window_w, window_h), normalize=True,
+                            borderType=cv2.BORDER_CONSTANT)
+    ys = _window_centers(mask_h, window_h)
+    xs = _window_centers(mask_w, window_w)
+    if len(ys) == 0 or len(xs) == 0:
+        return []
+    grid = density[np.ix_(ys, xs)]
+
+    order = np.argsort(grid, axis=None)[::-1]
+    selected: List[Region] = []
+    for flat in order:
+        score = float(grid.flat[flat])
+        if score < min_density or len(selected) >= max_tiles:
+            break
+        cy, cx = ys[flat // len(xs)], xs[flat % len(xs)]
+        x0 = int(max(0, (cx - window_w // 2) / scale))
+        y0 = int(max(0, (cy - window_h // 2) / scale))
+        x0, y0 = min(x0, width - tile_w), min(y0, height - tile_h)
+        region = (x0, y0, x0 + tile_w, y0 + tile_h, score)
+        if all(_overlap(region, other) < 0.5 for other in selected):
+            selected.append(region)
+    return selected
+
+
+def _window_centers(length: int, window: int) -> np.ndarray:
+    """Window centers along one mask axis at half-window stride (one centered window if it spans the axis)"""
+    if window >= length:
+        return np.array([length // 2])
+    half = window // 2
+    return np.arange(half, length - half, max(1, half))
+
+
+def merge_regions(regions: List[Region], max_side: int) -> List[Region]:
+    """
+    Merge overlapping regions into their bounding box, as long as the merged
+    box stays within max_side on both axes. Keeps densest-first order.
+    """
+    merged: List[Region] = []
+    for region in regions:
+        for i, other in enumerate(merged):
+            if _overlap(region, other) <= 0:
+                continue
+            box = (
+                min(region[0], other[0]), min(region[1], other[1]),
+                max(region[2], other[2]), max(region[3], other[3]),
+                max(region[4], other[4])
+            )
+            if box[2] - box[0] <= max_side and box[3] - box[1] <= max_side:
+                merged[i] = box
+                break
+        else:
+            merged.append(region)
+    return merged
+
+
+def thumbnail_for_masks(image: np.ndarray) -> np.ndarray:
+    """Downscale an image array so mask computation costs the same for any input size"""
+    height, width = image.shape[:2]
+    scale = MASK_RESOLUTION / float(max(height, width))
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                      interpolation=cv2.INTER_AREA)
@@ -0,0 +1,131 @@
+# app/services/tuning.py
+
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional
+import numpy as np
+from PIL import Image
+from app.core.config import settings
+from app.services.executors import ExecutorPlan, core_budget
+from app.services.image_analysis import image_analysis_service
+
+logger = logging.getLogger(__name__)
+
+# Synthetic workload used for probing
+PROBE_IMAGE_SIZE = (640, 480)
+PROBE_IMAGES = 16
+
+
+def candidate_plans(cores: int, io_workers: int) -> List[ExecutorPlan]:
+    """A small grid of pool sizes / thread counts that fit the core budget"""
+    plans = []
+    seen = set()
+    for cv_workers in sorted({1, max(1, cores // 4), max(1, cores // 2), cores}):
+        for ml_workers in (1, 2):
+            torch_threads = max(1, (cores - cv_workers) // ml_workers)
+            key = (cv_workers, ml_workers, torch_threads)
+            if key in seen:
+                continue
+            seen.add(key)
+            plans.append(ExecutorPlan(
+                io_workers=io_workers,
+                cv_workers=cv_workers,
+                ml_workers=ml_workers,
+                torch_threads=torch_threads,
+                cv2_threads=1
+            ))
+    return plans
+
+
+class ExecutorAutoTuner:
+    """
+    Probes analyzer throughput under a few executor plans with a synthetic
+    workload and keeps the fastest. Google Vision is not called while probing.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.last_results: List[Dict[str, Any]] = []
+        self.last_tuned_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _probe_images(self) -> List[Image.Image]:
+        rng = np.random.default_rng(0)
+        return [
+            Image.fromarray(rng.integers(0, 256, (PROBE_IMAGE_SIZE[1], PROBE_IMAGE_SIZE[0], 3), dtype=np.uint8))
+            for _ in range(PROBE_IMAGES)
+        ]
+
+    async def _measure(self, images: List[Image.Image]) -> float:
+        """Images per second through the local analyzers, all images in flight at once"""
+        async def analyze(image):
+            await asyncio.gather(
+                self.service._analyze_with_cv(image),
+                self.service._analyze_with_ml_models(image),
+                self.service._analyze_image_properties(image)
+            )
+
+        start = time.perf_counter()
+        await asyncio.gather(*(analyze(image) for image in images))
+        return len(images) / (time.perf_counter() - start)
+
+    async def tune(self) -> ExecutorPlan:
+        images = self._probe_images()
+        executors = self.service.executors
+        original = executors.plan
+        results = []
+
+        try:
+            # Warm up model and caches so the first candidate is not penalized
+            await self._measure(images[:2])
+
+            for plan in candidate_plans(core_budget(), original.io_workers):
+                executors.resize(plan)
+                throughput = await self._measure(images)
+                results.append({'plan': plan.to_dict(), 'images_per_second': round(throughput, 2)})
+                logger.info(f"Executor probe {plan.to_dict()}: {throughput:.2f} images/s")
+        except Exception:
+            executors.resize(original)
+            raise
+
+        best = max(results, key=lambda result: result['images_per_second'], default=None)
+        chosen = ExecutorPlan(**best['plan']) if best else original
+        executors.resize(chosen)
+
+        self.last_results = results
+        self.last_tuned_at = time.time()
+        logger.info(f"Executor auto-tune chose {chosen.to_dict()}")
+        return chosen
+
+    async def _periodic(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.tune()
+            except Exception as e:
+                logger.error(f"Executor auto-tune failed: {e}")
+
+    async def start(self):
+        """Tune once now and, if configured, periodically in the background"""
+        try:
+            await self.tune()
+        except Exception as e:
+            logger.error(f"Executor auto-tune failed, keeping {self.service.executors.plan.to_dict()}: {e}")
+        if settings.AUTO_TUNE_INTERVAL_SECONDS > 0 and self._task is None:
+            self._task = asyncio.create_task(self._periodic(settings.AUTO_TUNE_INTERVAL_SECONDS))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'current': self.service.executors.stats(),
+            'last_tuned_at': self.last_tuned_at,
+            'probe_results': self.last_results
+        }
+
+
+executor_tuner = ExecutorAutoTuner(image_analysis_service)
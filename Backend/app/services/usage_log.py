@@ -0,0 +1,80 @@
+# app/services/usage_log.py
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.database import get_collection
+from app.core.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+usage_writes = Counter(
+    "usage_log_writes_total",
+    "Usage records handed to MongoDB by outcome",
+    labelnames=("outcome",)
+)
+
+
+class UsageLog:
+    """
+    Buffers API usage records and writes them with unordered insert_many.
+
+    Flushed when the buffer fills or on a short timer, using the telemetry
+    write concern, so requests never wait on a usage insert. Records are
+    telemetry: a crash loses at most one flush interval of them.
+    """
+
+    def __init__(self):
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def record(self, token: str, endpoint: str):
+        self._pending.append({
+            "token": token,
+            "endpoint": endpoint,
+            "timestamp": datetime.utcnow()
+        })
+        if len(self._pending) >= settings.USAGE_FLUSH_BATCH_SIZE:
+            asyncio.ensure_future(self.flush())
+
+    def discard(self, token: str):
+        """Drop buffered records for a token, e.g. when it is deleted"""
+        self._pending = [doc for doc in self._pending if doc["token"] != token]
+
+    def discard_many(self, tokens: List[str]):
+        """Drop buffered records for several tokens"""
+        dropped = set(tokens)
+        self._pending = [doc for doc in self._pending if doc["token"] not in dropped]
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            docs, self._pending = self._pending, []
+            try:
+                await get_collection("usages", "telemetry").insert_many(docs, ordered=False)
+                usage_writes.inc(len(docs), outcome="ok")
+            except Exception as e:
+                usage_writes.inc(len(docs), outcome="failed")
+                logger.error(f"Failed to write {len(docs)} usage records: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.USAGE_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+usage_log = UsageLog()
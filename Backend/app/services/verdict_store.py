@@ -0,0 +1,258 @@
+# app/services/verdict_store.py
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+import numpy as np
+from bson.binary import Binary
+from pymongo import UpdateOne
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.analysis import AnalysisResult, CategoryResult, SourceResult
+from app.services.ensemble import CATEGORIES, CATEGORY_INDEX, SOURCES, SOURCE_INDEX
+
+logger = logging.getLogger(__name__)
+
+SCORE_DTYPE = np.dtype('<f4')
+# Raw scores are re-thresholded later, so keep full precision (float32 moves e.g. 0.7 below 0.7)
+RAW_DTYPE = np.dtype('<f8')
+RAW_SHAPE = (len(SOURCES), len(CATEGORIES))
+
+
+def pack_scores(values: List[float]) -> Binary:
+    """Pack a float vector as little-endian float32 bytes"""
+    return Binary(np.asarray(values, dtype=SCORE_DTYPE).tobytes())
+
+
+def unpack_scores(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=SCORE_DTYPE)
+
+
+def pack_detected(categories: Dict[str, CategoryResult]) -> int:
+    """Bitmask of detected categories, bit i = CATEGORIES[i]"""
+    mask = 0
+    for category, data in categories.items():
+        if data.detected and category in CATEGORY_INDEX:
+            mask |= 1 << CATEGORY_INDEX[category]
+    return mask
+
+
+def pack_source_matrix(source_results: List[SourceResult]) -> Tuple[Binary, int]:
+    """
+    Pack raw per-source scores as a row-major [source, category] float64 matrix
+    plus a bitmask of the cells that were reported (bit s * C + c)
+    """
+    scores = np.zeros(RAW_SHAPE, dtype=RAW_DTYPE)
+    mask = 0
+    for result in source_results:
+        row = SOURCE_INDEX.get(result.source)
+        if row is None or result.categories is None:
+            continue
+        for category, score in result.categories.items():
+            column = CATEGORY_INDEX.get(category)
+            if column is not None:
+                scores[row, column] = float(score)
+                mask |= 1 << (row * len(CATEGORIES) + column)
+    return Binary(scores.tobytes()), mask
+
+
+def unpack_source_matrices(raw: List[bytes], masks: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack packed matrices into [B, S, C] scores and a [B, S, C] reported mask"""
+    scores = np.frombuffer(b''.join(raw), dtype=RAW_DTYPE).reshape((len(raw),) + RAW_SHAPE)
+    bits = np.arange(RAW_SHAPE[0] * RAW_SHAPE[1], dtype=np.int64)
+    mask = (np.asarray(masks, dtype=np.int64)[:, None] >> bits) & 1
+    return scores, mask.astype(bool).reshape(scores.shape)
+
+
+def to_verdict_doc(
+    digest: str,
+    results: AnalysisResult,
+    model_version: str,
+    image_info: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Compact document for one moderation verdict"""
+    doc = {
+        '_id': digest,
+        'scores': pack_scores([results.categories[category].confidence for category in CATEGORIES]),
+        'detected': pack_detected(results.categories),
+        'overall': results.overall_score,
+        'is_safe': results.is_safe,
+        'sources': list(results.analysis_sources),
+        'model_version': model_version,
+        'createdAt': datetime.utcnow()
+    }
+    if image_info:
+        # Lets cached verdicts be served as full reports without the image bytes
+        doc['image'] = image_info
+    if results.source_results:
+        # Lets verdicts be recomputed under new thresholds/weights without re-analysis
+        doc['raw'], doc['raw_mask'] = pack_source_matrix(results.source_results)
+        doc['raw_shape'] = list(RAW_SHAPE)
+    return doc
+
+
+def from_verdict_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Expand a stored verdict into the API shape"""
+    scores = unpack_scores(doc['scores']).tolist()
+    detected = int(doc.get('detected', 0))
+    return {
+        'digest': doc['_id'],
+        'is_safe': doc.get('is_safe', True),
+        'overall_score': round(float(doc.get('overall', 0.0)), 3),
+        'categories': {
+            category: {'detected': bool(detected >> i & 1), 'confidence': round(scores[i], 3)}
+            for i, category in enumerate(CATEGORIES)
+        },
+        'analysis_sources': doc.get('sources', []),
+        'image': doc.get('image'),
+        'model_version': doc.get('model_version'),
+        'createdAt': doc.get('createdAt')
+    }
+
+
+class VerdictStore:
+    """
+    Persists moderation verdicts keyed by SHA-256 content digest.
+
+    Writes are buffered and flushed as unordered bulk upserts, either when the
+    buffer fills or on a short timer, so the request path never waits on them.
+
+    Clients that downscale images before upload register the digest of the
+    original as an alias of the uploaded one. Aliases are asserted by the
+    client, so each is only honored for lookups by the token that made it.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_aliases: Dict[Tuple[str, str], str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def record(
+        self,
+        digest: str,
+        results: AnalysisResult,
+        model_version: str,
+        image_info: Optional[Dict[str, Any]] = None
+    ):
+        """Queue a verdict for the next bulk write (latest verdict per digest wins)"""
+        if results.degraded or (results.errors and not results.analysis_sources):
+            # Missing analyzers (or nothing analyzed at all); don't serve this verdict from cache
+            return
+        if not results.source_results:
+            # Taken from another verdict (similarity match); no analyzer outputs to store or re-evaluate
+            return
+        if results.quality_level != 'full':
+            # Analyzed at reduced quality under load; the next upload gets a full analysis
+            return
+        self._pending[digest] = to_verdict_doc(digest, results, model_version, image_info)
+        self._flush_if_full()
+
+    def record_alias(self, token: str, original: str, digest: str):
+        """Queue an alias: token may look up the verdict for digest by the digest of its original"""
+        self._pending_aliases[(token, original)] = digest
+        self._flush_if_full()
+
+    def _flush_if_full(self):
+        if len(self._pending) + len(self._pending_aliases) >= settings.VERDICT_FLUSH_BATCH_SIZE:
+            asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        async with self._lock:
+            if self._pending:
+                docs, self._pending = list(self._pending.values()), {}
+                operations = [
+                    UpdateOne({'_id': doc['_id']}, {'$set': doc}, upsert=True)
+                    for doc in docs
+                ]
+                try:
+                    await get_db().verdicts.bulk_write(operations, ordered=False)
+                except Exception as e:
+                    logger.error(f"Failed to write {len(operations)} verdicts: {e}")
+            if self._pending_aliases:
+                aliases, self._pending_aliases = self._pending_aliases, {}
+                now = datetime.utcnow()
+                operations = [
+                    UpdateOne(
+                        {'token': token, 'original': original},
+                        {'$set': {'digest': digest, 'createdAt': now}},
+                        upsert=True
+                    )
+                    for (token, original), digest in aliases.items()
+                ]
+                try:
+                    await get_db().verdict_aliases.bulk_write(operations, ordered=False)
+                except Exception as e:
+                    logger.error(f"Failed to write {len(operations)} verdict aliases: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.VERDICT_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def get(self, digest: str, token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Verdict for a digest; with a token, also through that token's aliases"""
+        if token is not None:
+            return (await self.get_many([digest], token)).get(digest)
+        pending = self._pending.get(digest)
+        if pending is not None:
+            return from_verdict_doc(pending)
+        doc = await get_db().verdicts.find_one({'_id': digest})
+        return from_verdict_doc(doc) if doc else None
+
+    async def get_many(self, digests: List[str], token: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up many digests in one query; unknown digests are omitted. With a
+        token, digests without a verdict of their own are resolved through that
+        token's aliases (the verdict keeps the digest that was analyzed).
+        """
+        found = {}
+        missing = []
+        for digest in dict.fromkeys(digests):
+            if digest in self._pending:
+                found[digest] = from_verdict_doc(self._pending[digest])
+            else:
+                missing.append(digest)
+        if missing:
+            cursor = get_db().verdicts.find({'_id': {'$in': missing}}, batch_size=len(missing))
+            async for doc in cursor:
+                found[doc['_id']] = from_verdict_doc(doc)
+        if token is not None:
+            aliases = await self._resolve_aliases(token, [digest for digest in missing if digest not in found])
+            if aliases:
+                targets = await self.get_many(list(set(aliases.values())))
+                for original, digest in aliases.items():
+                    if digest in targets:
+                        found[original] = targets[digest]
+        return found
+
+    async def _resolve_aliases(self, token: str, originals: List[str]) -> Dict[str, str]:
+        aliases = {}
+        missing = []
+        for original in originals:
+            digest = self._pending_aliases.get((token, original))
+            if digest is not None:
+                aliases[original] = digest
+            else:
+                missing.append(original)
+        if missing:
+            cursor = get_db().verdict_aliases.find(
+                {'token': token, 'original': {'$in': missing}}, {'original': 1, 'digest': 1}
+            )
+            async for doc in cursor:
+                aliases[doc['original']] = doc['digest']
+        return aliases
+
+
+verdict_store = VerdictStore()
@@ -0,0 +1,70 @@
+# app/worker.py
+"""
+Inference worker: loads the models and runs analyses for API processes
+started with INFERENCE_WORKERS, over the msgpack protocol described in
+app/services/remote_inference.py. Concurrent requests share batched model
+calls (ML_BATCH_WAIT_MS, 5 ms by default here).
+
+Usage:
+    python -m app.worker --port 7101
+    python -m app.worker --port 7101 --count 3    # workers on 7101-7103
+
+    INFERENCE_WORKERS=http://gpu-1:7101,http://gpu-1:7102 python -m app.server
+"""
+
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+
+from app.server import _configure_thread_env
+
+
+def run_many(host: str, port: int, count: int) -> int:
+    """Start count single workers on consecutive ports and wait for them"""
+    children = [
+        subprocess.Popen([sys.executable, "-m", "app.worker", "--host", host, "--port", str(port + i)])
+        for i in range(count)
+    ]
+
+    def stop(*_):
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    return max(child.wait() for child in children)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    parser = argparse.ArgumentParser(description="Run inference workers")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=7101)
+    parser.add_argument("--count", type=int, default=1, help="Workers to start on consecutive ports")
+    args = parser.parse_args()
+
+    # A worker always analyzes in-process; set before settings are first read
+    os.environ["INFERENCE_WORKERS"] = ""
+    os.environ.setdefault("ML_BATCH_WAIT_MS", "5")
+    count = max(1, args.count)
+    threads = max(1, (os.cpu_count() or 1) // count)
+    # The executor plan reads the same budget, so torch/OpenCV threads agree with OMP/MKL
+    os.environ.setdefault("THREADS_PER_WORKER", str(threads))
+    _configure_thread_env(int(os.environ["THREADS_PER_WORKER"]))
+    if count > 1:
+        # Children inherit the environment; the supervisor never loads the models itself
+        return run_many(args.host, args.port, count)
+
+    import uvicorn
+    from app.worker_app import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info", access_log=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# app/worker_app.py
+"""
+Inference worker application, run by app/worker.py: analyzes images for API
+processes over the msgpack protocol described in
+app/services/remote_inference.py.
+"""
+
+import msgpack
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse, Response
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.metrics import Gauge, REGISTRY
+from app.services.image_analysis import image_analysis_service
+from app.services.remote_inference import MSGPACK_MEDIA_TYPE, encode_result, pack_message
+
+app = FastAPI(title="Image Moderation inference worker", version="1.0.0")
+
+_in_flight = 0
+Gauge("inference_worker_in_flight", "Requests this inference worker is processing", function=lambda: _in_flight)
+
+
+async def _read_payload(request: Request) -> dict:
+    try:
+        payload = msgpack.unpackb(await request.body(), raw=False)
+    except Exception:
+        payload = None
+    if not isinstance(payload, dict) or not isinstance(payload.get("image"), bytes):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a msgpack map with binary 'image'"
+        )
+    return payload
+
+
+def _msgpack_response(data: dict) -> Response:
+    return Response(pack_message(data), media_type=MSGPACK_MEDIA_TYPE)
+
+
+@app.post("/analyze")
+async def analyze(request: Request):
+    global _in_flight
+    payload = await _read_payload(request)
+    _in_flight += 1
+    try:
+        results = await image_analysis_service.analyze_image(payload["image"], payload.get("filename") or "")
+    finally:
+        _in_flight -= 1
+    data = encode_result(results)
+    data["model_version"] = results.model_version or image_analysis_service.model_version
+    return _msgpack_response(data)
+
+
+@app.post("/embed")
+async def embed(request: Request):
+    global _in_flight
+    payload = await _read_payload(request)
+    _in_flight += 1
+    try:
+        embedding = await image_analysis_service.embed(payload["image"])
+    finally:
+        _in_flight -= 1
+    return _msgpack_response({
+        "embedding": np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+    })
+
+
+@app.get("/health")
+async def health():
+    return _msgpack_response({
+        "status": "ok",
+        "model_version": image_analysis_service.model_version,
+        "classifier_loaded": image_analysis_service.classifier is not None,
+        "in_flight": _in_flight
+    })
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.on_event("startup")
+async def startup_event():
+    # Only the similarity lookup reads the database (stored verdicts)
+    if image_analysis_service.similarity_index is not None:
+        await connect_to_mongo()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if image_analysis_service.similarity_index is not None:
+        await close_mongo_connection()
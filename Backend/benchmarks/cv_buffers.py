@@ -0,0 +1,145 @@
+"""
+Peak RSS and allocation cost of the OpenCV heuristics under concurrent load:
+the previous per-call implementation versus cv_heuristics.analyze without
+and with a warm buffer pool.
+
+Each variant runs in a fresh subprocess that scores --requests images on
+--concurrency threads. Reported per variant: wall time, peak RSS above the
+process's idle baseline, and the minor page faults and system CPU time taken
+while scoring. For large arrays, allocator cost is mostly the kernel mapping
+and zeroing fresh pages, so faults and system time measure it directly.
+It also checks that every variant produces the same scores.
+
+    python -m benchmarks.cv_buffers --width 2000 --height 1500 --concurrency 16
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+VARIANTS = ('legacy', 'unpooled', 'pooled')
+
+
+def legacy_analyze(rgb: np.ndarray) -> dict:
+    """The computer_vision heuristics as they were before pooling, for reference"""
+    import cv2
+
+    cv_image = cv2.cvtColor(np.array(rgb), cv2.COLOR_RGB2BGR)
+    total = cv_image.shape[0] * cv_image.shape[1]
+
+    hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
+    skin = cv2.inRange(hsv, np.array([0, 20, 70], dtype=np.uint8), np.array([20, 255, 255], dtype=np.uint8))
+    skin_score = min(float(np.sum(skin > 0) / total * 2.0), 1.0)
+
+    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 50, 150)
+    lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=100, minLineLength=50, maxLineGap=10)
+    edges_score = float(min(len(lines) / 100.0, 1.0) * 0.5) if lines is not None else 0.05
+
+    hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
+    red = cv2.inRange(hsv, np.array([0, 50, 50]), np.array([10, 255, 255])) + \
+        cv2.inRange(hsv, np.array([170, 50, 50]), np.array([180, 255, 255]))
+    blood_score = min(float(np.sum(red > 0) / total * 1.5), 0.8)
+
+    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+    texture_score = float(min(cv2.Laplacian(gray, cv2.CV_64F).var() / 1000.0, 1.0) * 0.3)
+    return {'skin': skin_score, 'edges': edges_score, 'blood': blood_score, 'texture': texture_score}
+
+
+def make_images(width: int, height: int, count: int):
+    """Photo-like test images: smooth color fields with edges, blobs and noise"""
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        low = rng.integers(0, 255, (height // 50 + 1, width // 50 + 1, 3), dtype=np.uint8)
+        image = Image.fromarray(low).resize((width, height), Image.BILINEAR)
+        pixels = np.asarray(image).astype(np.int16) + rng.integers(-12, 12, (height, width, 3), dtype=np.int16)
+        pixels[:, width // 3:width // 3 + 4] = 255
+        images.append(Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)))
+    return images
+
+
+def run_variant(variant: str, args) -> dict:
+    import cv2
+    from app.services import cv_heuristics
+    from app.services.buffer_pool import BufferPool
+
+    cv2.setNumThreads(1)  # as with the default executor plan: parallel across images, not inside OpenCV
+    images = make_images(args.width, args.height, args.distinct)
+    pool = BufferPool(f"bench_{variant}", args.pool_mb * 2**20 if variant == 'pooled' else 0)
+
+    def score(i: int) -> dict:
+        image = images[i % len(images)]
+        if variant == 'legacy':
+            return legacy_analyze(np.array(image))
+        return cv_heuristics.analyze(np.asarray(image), pool)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        # Warm-up: thread stacks, OpenCV internals and (for 'pooled') the pool itself
+        list(executor.map(score, range(args.concurrency)))
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+        scores = list(executor.map(score, range(args.requests)))
+        wall = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_SELF)
+
+    return {
+        'wall_ms_per_image': wall / args.requests * 1000,
+        'peak_rss_mb': after.ru_maxrss / 1024,
+        'rss_above_warm_mb': (after.ru_maxrss - baseline_rss) / 1024,
+        'minor_faults_per_image': (after.ru_minflt - before.ru_minflt) / args.requests,
+        'system_ms_per_image': (after.ru_stime - before.ru_stime) / args.requests * 1000,
+        'scores': scores[:len(images)]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=2000)
+    parser.add_argument("--height", type=int, default=1500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=96)
+    parser.add_argument("--distinct", type=int, default=4, help="Distinct test images cycled through")
+    parser.add_argument("--pool-mb", type=int, default=1024, help="Pool size for the 'pooled' variant")
+    parser.add_argument("--run", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_variant(args.run, args)))
+        return
+
+    passthrough = [arg for arg in sys.argv[1:]]
+    results = {}
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.cv_buffers", *passthrough, "--run", variant],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[variant] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{args.width}x{args.height}, {args.concurrency} concurrent, {args.requests} images")
+    print(f"{'variant':>10}{'ms/img':>9}{'peak RSS MB':>13}{'above warm MB':>15}{'faults/img':>12}{'sys ms/img':>12}")
+    for variant, result in results.items():
+        print(f"{variant:>10}{result['wall_ms_per_image']:>9.1f}{result['peak_rss_mb']:>13.0f}"
+              f"{result['rss_above_warm_mb']:>15.0f}{result['minor_faults_per_image']:>12.0f}"
+              f"{result['system_ms_per_image']:>12.2f}")
+
+    reference = results['legacy']['scores']
+    for variant in VARIANTS[1:]:
+        worst = max(
+            abs(a[key] - b[key]) for a, b in zip(reference, results[variant]['scores']) for key in a
+        )
+        print(f"max score difference {variant} vs legacy: {worst:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Interactive queueing delay during a batch flood: FIFO admission versus the
+priority / weighted-fair scheduler in app/services/scheduler.py.
+
+Analyses are simulated with a fixed service time, so this measures only the
+admission policy. One token floods the batch class with --flood requests
+while a second token sends interactive requests at --interactive-rate per
+second; a third batch token with --weight shows how weights split the
+batch share.
+
+    python -m benchmarks.fair_scheduler --capacity 4 --service-ms 50
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+
+async def run_policy(policy: str, args) -> dict:
+    from app.services.scheduler import FairScheduler
+
+    scheduler = FairScheduler(f"bench_{policy}", args.capacity)
+    fifo = asyncio.Semaphore(args.capacity)
+    delays = {'interactive': [], 'flood': [], 'weighted': []}
+    finished = {'flood': 0, 'weighted': 0}
+    service = args.service_ms / 1000
+
+    async def analysis(kind: str, token: dict, priority_class: str):
+        enqueued = time.perf_counter()
+
+        async def work():
+            delays[kind].append((time.perf_counter() - enqueued) * 1000)
+            await asyncio.sleep(service)
+            if kind in finished:
+                finished[kind] += 1
+
+        if policy == 'fifo':
+            async with fifo:
+                await work()
+        else:
+            await scheduler.run(token, priority_class, work)
+
+    flood = [asyncio.ensure_future(analysis('flood', {'token': 'flood'}, 'batch')) for _ in range(args.flood)]
+    weighted = [
+        asyncio.ensure_future(analysis('weighted', {'token': 'weighted', 'weight': args.weight}, 'batch'))
+        for _ in range(args.flood)
+    ]
+    interactive = []
+    for _ in range(args.interactive):
+        await asyncio.sleep(1 / args.interactive_rate)
+        interactive.append(asyncio.ensure_future(analysis('interactive', {'token': 'user'}, 'interactive')))
+    await asyncio.gather(*interactive)
+    share = dict(finished)
+    await asyncio.gather(*flood, *weighted)
+    return {'delays': delays, 'share': share}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=4, help="Concurrent analyses (MAX_CONCURRENT_ANALYSES)")
+    parser.add_argument("--service-ms", type=float, default=50)
+    parser.add_argument("--flood", type=int, default=300, help="Batch requests queued by each batch token")
+    parser.add_argument("--interactive", type=int, default=100)
+    parser.add_argument("--interactive-rate", type=float, default=20, help="Interactive requests per second")
+    parser.add_argument("--weight", type=float, default=3, help="Weight of the second batch token")
+    args = parser.parse_args()
+
+    print(f"{'policy':>8}{'interactive p50 ms':>20}{'p99':>9}{'batch share flood:weighted':>29}")
+    for policy in ('fifo', 'fair'):
+        result = asyncio.run(run_policy(policy, args))
+        p50, p99 = np.percentile(result['delays']['interactive'], [50, 99])
+        share = result['share']
+        print(f"{policy:>8}{p50:>20.1f}{p99:>9.1f}{share['flood']:>20}:{share['weighted']}")
+
+
+if __name__ == "__main__":
+    main()
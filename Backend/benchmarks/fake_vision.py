@@ -0,0 +1,106 @@
+"""
+Local fake of the Google Cloud Vision ImageAnnotator gRPC service that injects
+latency and errors, for exercising the Vision circuit breaker.
+
+Run it, then point the API at it:
+    python -m benchmarks.fake_vision --port 50051 --phases healthy=20,error=30,slow=30,healthy
+    GOOGLE_VISION_ENDPOINT=localhost:50051 uvicorn app.main:app --port 7000
+
+Each phase is mode[=seconds]; the last phase runs until stopped. Modes:
+    healthy  answer after --latency-ms
+    error    fail --error-rate of calls with UNAVAILABLE
+    slow     answer after --slow-ms
+Watch the breaker via GET /health.
+"""
+
+import argparse
+import logging
+import random
+import time
+from concurrent import futures
+from typing import List, Tuple
+
+import grpc
+from google.cloud import vision_v1
+
+logger = logging.getLogger("fake_vision")
+
+SERVICE = "google.cloud.vision.v1.ImageAnnotator"
+
+
+def parse_phases(spec: str) -> List[Tuple[str, float]]:
+    phases = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        mode, _, seconds = item.partition("=")
+        if mode not in ("healthy", "error", "slow"):
+            raise SystemExit(f"Unknown phase mode '{mode}'")
+        phases.append((mode, float(seconds) if seconds else float("inf")))
+    return phases or [("healthy", float("inf"))]
+
+
+class FakeImageAnnotator:
+    def __init__(self, phases: List[Tuple[str, float]], latency_ms: float, slow_ms: float, error_rate: float):
+        self.phases = phases
+        self.latency_ms = latency_ms
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.started = time.monotonic()
+
+    def mode(self) -> str:
+        elapsed = time.monotonic() - self.started
+        for mode, seconds in self.phases:
+            if elapsed < seconds:
+                return mode
+            elapsed -= seconds
+        return self.phases[-1][0]
+
+    def batch_annotate_images(self, request: vision_v1.BatchAnnotateImagesRequest, context):
+        mode = self.mode()
+        if mode == "error" and random.random() < self.error_rate:
+            context.abort(grpc.StatusCode.UNAVAILABLE, "fake_vision: injected error")
+        time.sleep((self.slow_ms if mode == "slow" else self.latency_ms) / 1000.0)
+
+        likelihood = vision_v1.Likelihood.VERY_UNLIKELY
+        responses = [
+            vision_v1.AnnotateImageResponse(
+                safe_search_annotation=vision_v1.SafeSearchAnnotation(
+                    adult=likelihood, violence=likelihood, racy=likelihood
+                ),
+                label_annotations=[vision_v1.EntityAnnotation(description="fake", score=0.9)]
+            )
+            for _ in request.requests
+        ]
+        return vision_v1.BatchAnnotateImagesResponse(responses=responses)
+
+    def handler(self) -> grpc.GenericRpcHandler:
+        return grpc.method_handlers_generic_handler(SERVICE, {
+            "BatchAnnotateImages": grpc.unary_unary_rpc_method_handler(
+                self.batch_annotate_images,
+                request_deserializer=vision_v1.BatchAnnotateImagesRequest.deserialize,
+                response_serializer=vision_v1.BatchAnnotateImagesResponse.serialize
+            )
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--phases", default="healthy")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--slow-ms", type=float, default=4000)
+    parser.add_argument("--error-rate", type=float, default=1.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+    annotator = FakeImageAnnotator(parse_phases(args.phases), args.latency_ms, args.slow_ms, args.error_rate)
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    server.add_generic_rpc_handlers((annotator.handler(),))
+    server.add_insecure_port(f"[::]:{args.port}")
+    server.start()
+    logger.info(f"Fake Vision listening on :{args.port}, phases {annotator.phases}")
+    server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Cost per added moderation category: one shared backbone with linear heads
+versus one image-classification model per category.
+
+"shared" runs the backbone once per batch and scores k linear probes on its
+features (SharedBackboneClassifier). "separate" runs k full forward passes,
+which is what k independent fine-tuned models of the same architecture cost;
+the same weights are reused for each pass so the numbers are not skewed by
+loading k checkpoints, and their memory is reported as k x the backbone.
+
+    python -m benchmarks.multi_head --model Falconsai/nsfw_image_detection
+    python -m benchmarks.multi_head --random-vit   # offline: untrained ViT-Base, same compute
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def build_random_vit(path: str):
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor
+
+    config = ViTConfig(num_labels=2, id2label={0: 'normal', 1: 'nsfw'}, label2id={'normal': 0, 'nsfw': 1})
+    ViTForImageClassification(config).save_pretrained(path)
+    ViTImageProcessor().save_pretrained(path)
+
+
+def random_heads(categories, feature_dim, rng):
+    from app.services.multi_head import LinearHeads
+    return LinearHeads(categories, rng.standard_normal((len(categories), feature_dim)) * 0.01, np.zeros(len(categories)))
+
+
+def time_per_image(fn, images, repeats):
+    fn(images)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(images)
+    return (time.perf_counter() - start) / (repeats * len(images)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="Falconsai/nsfw_image_detection")
+    parser.add_argument("--random-vit", action="store_true", help="Use an untrained ViT-Base instead of downloading --model")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    import torch
+    from app.services.ensemble import CATEGORIES
+    from app.services.multi_head import SharedBackboneClassifier
+
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8))
+        for _ in range(args.batch_size)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_name = args.model
+        if args.random_vit:
+            build_random_vit(tmp)
+            model_name = tmp
+        backbone = SharedBackboneClassifier(model_name, device='cpu')
+
+    backbone_mb = sum(p.numel() * p.element_size() for p in backbone.model.parameters()) / 2**20
+    print(f"model {args.model if not args.random_vit else 'random ViT-Base'}, "
+          f"{backbone.feature_dim} features, {backbone_mb:.0f} MB weights, torch threads {torch.get_num_threads()}")
+    print(f"{'categories':>10}{'shared ms/img':>15}{'separate ms/img':>17}{'shared MB':>11}{'separate MB':>13}")
+
+    for k in range(1, len(CATEGORIES) + 1):
+        backbone.heads = random_heads(CATEGORIES[:k], backbone.feature_dim, rng)
+        shared_ms = time_per_image(backbone, images, args.repeats)
+
+        def separate(batch):
+            for _ in range(k):
+                backbone.forward(batch)
+        separate_ms = time_per_image(separate, images, max(1, args.repeats // k))
+
+        heads_mb = backbone.heads.weight.nbytes / 2**20
+        print(f"{k:>10}{shared_ms:>15.1f}{separate_ms:>17.1f}{backbone_mb + heads_mb:>11.1f}{backbone_mb * k:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Throughput ceiling of each quality ladder level (app/services/quality.py).
+
+The analysis service is pinned to one level at a time and fed --requests
+images on --concurrency concurrent analyze_image calls, in-process and with
+the configured executors, so nothing but the level changes between runs.
+Reported per level: images/s, p50/p95 latency, and the largest overall
+score and per-category confidence differences from the full-quality run
+over the same images. The ratio column is throughput relative to full.
+
+Google Vision only costs time when it is configured; to include it with a
+realistic latency, run the fake service:
+    python -m benchmarks.fake_vision --port 50051 --latency-ms 150
+    GOOGLE_VISION_ENDPOINT=localhost:50051 python -m benchmarks.quality_ladder
+
+    python -m benchmarks.quality_ladder --width 3000 --height 2000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import io
+import time
+
+import numpy as np
+
+
+def make_jpegs(width: int, height: int, count: int):
+    """Photo-like JPEGs: smooth color fields with noise, a straight edge and a skin-toned blob"""
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        low = rng.integers(0, 255, (height // 50 + 1, width // 50 + 1, 3), dtype=np.uint8)
+        image = Image.fromarray(low).resize((width, height), Image.BILINEAR)
+        pixels = np.asarray(image).astype(np.int16) + rng.integers(-12, 12, (height, width, 3), dtype=np.int16)
+        pixels[:, width // 3:width // 3 + 4] = 255
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+        ImageDraw.Draw(image).ellipse(
+            (width // 2, height // 4, width // 2 + width // 5, height // 4 + height // 3), fill=(220, 170, 140)
+        )
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+async def run_level(service, level: str, images, args) -> dict:
+    service.quality.pin(level)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = [0.0] * args.requests
+    results = [None] * args.requests
+
+    async def analyze(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            results[i] = await service.analyze_image(images[i % len(images)], f"bench_{i}.jpg")
+            latencies[i] = time.perf_counter() - start
+
+    # Warm-up: executor threads, buffer pools and model batches at this level
+    await asyncio.gather(*(service.analyze_image(images[i % len(images)]) for i in range(args.concurrency)))
+    start = time.perf_counter()
+    await asyncio.gather(*(analyze(i) for i in range(args.requests)))
+    wall = time.perf_counter() - start
+
+    assert all(result.quality_level == level for result in results)
+    p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+    return {
+        'images_per_second': args.requests / wall,
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'results': results[:len(images)]
+    }
+
+
+async def run(args):
+    from app.services.image_analysis import image_analysis_service
+    from app.services.quality import QUALITY_LEVELS, QualityLadder
+
+    if image_analysis_service.remote is not None:
+        raise SystemExit("Unset INFERENCE_WORKERS; this measures analysis in this process")
+    if image_analysis_service.quality is None:
+        image_analysis_service.quality = QualityLadder.from_settings(image_analysis_service.queue_depth, lambda: 0)
+
+    images = make_jpegs(args.width, args.height, args.distinct)
+    levels = {}
+    for level in QUALITY_LEVELS:
+        levels[level.name] = await run_level(image_analysis_service, level.name, images, args)
+    image_analysis_service.quality.pin(None)
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--distinct", type=int, default=8, help="Distinct test images cycled through")
+    args = parser.parse_args()
+
+    levels = asyncio.run(run(args))
+
+    full = levels['full']
+    print(f"{args.width}x{args.height} JPEG, {args.concurrency} concurrent, {args.requests} images per level")
+    print(f"{'level':>20}{'img/s':>9}{'x full':>8}{'p50 ms':>9}{'p95 ms':>9}{'max d score':>13}{'max d category':>16}")
+    for name, result in levels.items():
+        score_delta = max(
+            abs(a.overall_score - b.overall_score) for a, b in zip(full['results'], result['results'])
+        )
+        category_delta = max(
+            abs(a.categories[category].confidence - b.categories[category].confidence)
+            for a, b in zip(full['results'], result['results']) for category in a.categories
+        )
+        print(f"{name:>20}{result['images_per_second']:>9.2f}"
+              f"{result['images_per_second'] / full['images_per_second']:>8.2f}"
+              f"{result['p50_ms']:>9.0f}{result['p95_ms']:>9.0f}{score_delta:>13.3f}{category_delta:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
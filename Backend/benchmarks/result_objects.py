@@ -0,0 +1,155 @@
+"""
+Per-request CPU and allocation cost of turning analyzer outputs into the
+/moderate/analyze response body.
+
+"dicts" replays the previous path: analyzers emit nested dicts, the combined
+verdict is walked recursively by _ensure_python_types, the report is rebuilt
+in moderate_image, then FastAPI validates it against response_model=dict and
+runs jsonable_encoder before json.dumps. "objects" is the current path: slotted
+result objects straight from the analyzers and combiner, serialized once.
+
+    python -m benchmarks.result_objects --iterations 5000
+"""
+
+import argparse
+import functools
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def _ensure_python_types(obj):
+    """The recursive numpy-to-Python walk every result used to go through"""
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    elif isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, dict):
+        return {key: _ensure_python_types(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [_ensure_python_types(item) for item in obj]
+    else:
+        return obj
+
+
+def _analyzer_scores(rng):
+    from app.services.ensemble import CATEGORIES
+    sources = ('computer_vision', 'ml_models', 'image_properties')
+    return [(source, dict(zip(CATEGORIES, rng.random(len(CATEGORIES)).round(3).tolist()))) for source in sources]
+
+
+@functools.lru_cache(maxsize=None)
+def _response_model():
+    """FastAPI builds the response_model validator once per route, not per request"""
+    from pydantic import TypeAdapter
+    return TypeAdapter(dict)
+
+
+def dict_path(combiner, scores, file_info):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from app.models.analysis import SourceResult
+
+    results = [{'source': source, 'categories': categories} for source, categories in scores]
+    combined = combiner.combine([SourceResult(source=r['source'], categories=r['categories']) for r in results])
+    moderation_results = _ensure_python_types({
+        'overall_score': combined.overall_score,
+        'is_safe': combined.is_safe,
+        'categories': {
+            category: {'detected': data.detected, 'confidence': data.confidence}
+            for category, data in combined.categories.items()
+        },
+        'provider': combined.provider,
+        'analysis_sources': combined.analysis_sources,
+        'errors': combined.errors,
+        'source_results': [{'source': r['source'], 'categories': dict(r['categories'])} for r in results]
+    })
+    moderation_results.pop('source_results')
+    report = {
+        'file_info': file_info,
+        'moderation_results': moderation_results,
+        'processing_info': {
+            'api_version': '2.0.0',
+            'analysis_provider': moderation_results.get('provider', 'unknown'),
+            'analysis_sources': moderation_results.get('analysis_sources', []),
+            'processing_time_ms': 0,
+            'timestamp': 0
+        },
+        'safety_summary': {
+            'is_safe': moderation_results.get('is_safe', True),
+            'overall_risk_score': moderation_results.get('overall_score', 0.0),
+            'flagged_categories': [
+                category for category, data in moderation_results.get('categories', {}).items()
+                if data.get('detected', False)
+            ],
+            'highest_risk_category': max(
+                moderation_results.get('categories', {}).items(),
+                key=lambda x: x[1].get('confidence', 0),
+                default=('none', {'confidence': 0})
+            )[0]
+        }
+    }
+    return JSONResponse(jsonable_encoder(_response_model().validate_python(report))).body
+
+
+def object_path(combiner, scores, file_info):
+    from fastapi.responses import JSONResponse
+    from app.api.moderation import _build_report
+    from app.models.analysis import SourceResult
+
+    combined = combiner.combine([SourceResult(source=source, categories=categories) for source, categories in scores])
+    return JSONResponse(_build_report(file_info, combined, 0)).body
+
+
+def measure(fn, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    cpu_us = (time.perf_counter() - start) / len(args_list) * 1e6
+
+    sample = args_list[:min(500, len(args_list))]
+    peak_bytes = 0
+    tracemalloc.start()
+    for args in sample:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes += peak - current
+    tracemalloc.stop()
+    return cpu_us, peak_bytes / len(sample)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    from app.services.ensemble import EnsembleCombiner
+
+    combiner = EnsembleCombiner()
+    rng = np.random.default_rng(0)
+    file_info = {
+        "filename": "bench.jpg", "size_bytes": 123456, "content_type": "image/jpeg",
+        "dimensions": {"width": 640, "height": 480}, "format": "JPEG", "mode": "RGB",
+        "hash": "0" * 32, "sha256": "0" * 64
+    }
+    args_list = [(combiner, _analyzer_scores(rng), file_info) for _ in range(args.iterations)]
+
+    # Warm imports and caches
+    dict_path(*args_list[0])
+    object_path(*args_list[0])
+
+    print(f"{'path':<10}{'us/request':>12}{'peak KB/request':>18}")
+    for name, fn in (('dicts', dict_path), ('objects', object_path)):
+        cpu_us, peak_bytes = measure(fn, args_list)
+        print(f"{name:<10}{cpu_us:>12.1f}{peak_bytes / 1024:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
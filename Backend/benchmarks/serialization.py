@@ -0,0 +1,128 @@
+"""
+Compare the JSON report path of /moderate/analyze with the msgpack frames of
+/internal/moderate.
+
+Serialization only (in process, no server needed):
+    python -m benchmarks.serialization
+
+End-to-end throughput against a running server:
+    python -m benchmarks.serialization --url http://localhost:7000 --token <token> --images 64
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import time
+from typing import List
+
+import msgpack
+import numpy as np
+from PIL import Image
+
+
+def synthetic_images(count: int, size=(640, 480)) -> List[bytes]:
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_serialization(iterations: int):
+    from fastapi.responses import JSONResponse
+    from app.api.internal import encode_result
+    from app.api.moderation import _build_report
+    from app.services.image_analysis import image_analysis_service
+
+    image = synthetic_images(1)[0]
+    results = asyncio.run(image_analysis_service.analyze_image(image))
+    digest = hashlib.sha256(image).digest()
+    file_info = {
+        "filename": "bench.jpg", "size_bytes": len(image), "content_type": "image/jpeg",
+        "dimensions": {"width": 640, "height": 480}, "format": "JPEG", "mode": "RGB",
+        "hash": hashlib.md5(image).hexdigest(), "sha256": digest.hex()
+    }
+    def json_path():
+        # What /moderate/analyze does after analysis: build the report and encode it
+        return JSONResponse(_build_report(file_info, results, 0)).body
+
+    def msgpack_path():
+        return encode_result(0, digest, results)
+
+    json_us = time_per_call(json_path, iterations)
+    msgpack_us = time_per_call(msgpack_path, iterations)
+    print(f"{'path':<10}{'us/result':>12}{'bytes/result':>14}")
+    print(f"{'json':<10}{json_us:>12.1f}{len(json_path()):>14}")
+    print(f"{'msgpack':<10}{msgpack_us:>12.1f}{len(msgpack_path()):>14}")
+    print(f"speedup: {json_us / msgpack_us:.1f}x")
+
+
+async def bench_throughput(url: str, token: str, count: int, concurrency: int):
+    import aiohttp
+
+    images = synthetic_images(count)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def post_json(i: int, image: bytes):
+            async with semaphore:
+                form = aiohttp.FormData()
+                form.add_field("file", image, filename=f"{i}.jpg", content_type="image/jpeg")
+                async with session.post(f"{url}/moderate/analyze", data=form) as response:
+                    response.raise_for_status()
+                    await response.json()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post_json(i, image) for i, image in enumerate(images)))
+        json_elapsed = time.perf_counter() - start
+
+        async def frames():
+            for i, image in enumerate(images):
+                yield msgpack.packb({"id": i, "image": image}, use_bin_type=True)
+
+        start = time.perf_counter()
+        unpacker = msgpack.Unpacker(raw=False)
+        received = 0
+        async with session.post(
+            f"{url}/internal/moderate", data=frames(), headers={"Content-Type": "application/x-msgpack"}
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_any():
+                unpacker.feed(chunk)
+                received += sum(1 for frame in unpacker if "scores" in frame or "error" in frame)
+        msgpack_elapsed = time.perf_counter() - start
+
+    print(f"{'path':<10}{'images':>8}{'images/s':>12}")
+    print(f"{'json':<10}{count:>8}{count / json_elapsed:>12.2f}")
+    print(f"{'msgpack':<10}{received:>8}{received / msgpack_elapsed:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="serialization iterations per path")
+    parser.add_argument("--url", help="base URL of a running server for the throughput comparison")
+    parser.add_argument("--token", help="bearer token for --url")
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent JSON uploads")
+    args = parser.parse_args()
+
+    bench_serialization(args.iterations)
+    if args.url:
+        asyncio.run(bench_throughput(args.url.rstrip("/"), args.token, args.images, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Query latency and recall of the known-unsafe embedding index at scale.
+
+Builds an IVF segment over synthetic clustered embeddings (int8 codes on
+disk, memory-mapped like in production), then times EmbeddingIndex.search for
+near-duplicates of indexed vectors (should hit) and unrelated vectors (should
+miss) at several nprobe values, against an exhaustive scan.
+
+    python -m benchmarks.similarity_index --vectors 1000000 --dim 768
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def synthetic_embeddings(path: str, count: int, dim: int, clusters: int, rng: np.random.Generator):
+    """Clustered unit vectors, quantized straight into an int8 memmap"""
+    from app.services.embedding_index import CODE_DTYPE, normalize, quantize
+
+    centers = normalize(rng.standard_normal((clusters, dim)))
+    codes = np.lib.format.open_memmap(path, mode='w+', dtype=CODE_DTYPE, shape=(count, dim))
+    scales = np.empty(count, dtype=np.float32)
+    for start in range(0, count, 65536):
+        n = min(65536, count - start)
+        points = centers[rng.integers(0, clusters, n)] + rng.standard_normal((n, dim)).astype(np.float32) * 0.5 / np.sqrt(dim)
+        codes[start:start + n], scales[start:start + n] = quantize(points)
+    codes.flush()
+    return codes, scales
+
+
+def percentiles(samples_ms):
+    return np.percentile(samples_ms, [50, 95, 99])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=20000, help="Synthetic content clusters")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists; 0 = ~sqrt(vectors)")
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--dir", default="", help="Keep the index here instead of a temporary directory")
+    args = parser.parse_args()
+
+    from app.services.embedding_index import EmbeddingIndex, build_segment, dequantize, normalize
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.dir or tmp
+        os.makedirs(path, exist_ok=True)
+
+        start = time.perf_counter()
+        codes, scales = synthetic_embeddings(os.path.join(tmp, 'source.npy'), args.vectors, args.dim, args.clusters, rng)
+        digests = np.array([hashlib.sha256(i.to_bytes(8, 'little')).hexdigest() for i in range(args.vectors)], dtype='S64')
+        print(f"generated {args.vectors} x {args.dim} embeddings in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        manifest = build_segment(path, 1, codes, scales, digests, 'benchmark', args.nlist)
+        print(f"built {manifest['nlist']} lists in {time.perf_counter() - start:.1f}s, "
+              f"{os.path.getsize(os.path.join(path, 'gen-000001', 'vectors.npy')) / 2**20:.0f} MB of vectors")
+
+        # Near-duplicates: indexed vectors with a little noise (a re-crop / overlay)
+        targets = rng.integers(0, args.vectors, args.queries)
+        duplicates = normalize(
+            dequantize(codes[np.sort(targets)], scales[np.sort(targets)])[np.argsort(np.argsort(targets))]
+            + rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 0.1 / np.sqrt(args.dim)
+        )
+        unrelated = normalize(rng.standard_normal((args.queries, args.dim)))
+
+        print(f"{'nprobe':>8}{'dup p50 ms':>12}{'p95':>8}{'p99':>8}{'recall':>8}{'miss p50 ms':>13}{'p95':>8}{'false hits':>12}")
+        for nprobe in (int(n) for n in args.nprobe.split(',')):
+            index = EmbeddingIndex(path, 'benchmark', args.threshold, nprobe)
+            for query in duplicates[:10]:
+                index.search(query)  # warm the page cache for a fair steady-state number
+
+            dup_ms, hits = [], 0
+            for target, query in zip(targets, duplicates):
+                t = time.perf_counter()
+                match = index.search(query)
+                dup_ms.append((time.perf_counter() - t) * 1000)
+                hits += match is not None and match[0] == digests[target].decode()
+            miss_ms, false_hits = [], 0
+            for query in unrelated:
+                t = time.perf_counter()
+                false_hits += index.search(query) is not None
+                miss_ms.append((time.perf_counter() - t) * 1000)
+
+            d50, d95, d99 = percentiles(dup_ms)
+            m50, m95, _ = percentiles(miss_ms)
+            print(f"{nprobe:>8}{d50:>12.2f}{d95:>8.2f}{d99:>8.2f}{hits / args.queries:>8.3f}{m50:>13.2f}{m95:>8.2f}{false_hits:>12}")
+
+        # Exhaustive scan over the same memory-mapped vectors, for reference
+        segment = index.segment
+        scan_ms = []
+        for query in duplicates[:5]:
+            t = time.perf_counter()
+            for start in range(0, len(segment.vectors), 65536):
+                np.max((segment.vectors[start:start + 65536].astype(np.float32) @ query) * segment.scales[start:start + 65536])
+            scan_ms.append((time.perf_counter() - t) * 1000)
+        print(f"exhaustive scan: {np.median(scan_ms):.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
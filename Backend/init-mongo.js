@@ -4,13 +4,25 @@ db = db.getSiblingDB('image_moderation');
 // Create collections
 db.createCollection('tokens');
 db.createCollection('usages');
+db.createCollection('verdicts');
+db.createCollection('verdict_aliases');
 
 // Create indexes for better performance
 db.tokens.createIndex({ "token": 1 }, { unique: true });
 db.tokens.createIndex({ "createdAt": 1 });
+// Keyset pagination of the admin listing, optionally filtered by isAdmin
+db.tokens.createIndex({ "createdAt": -1, "_id": -1 });
+db.tokens.createIndex({ "isAdmin": 1, "createdAt": -1, "_id": -1 });
 
 db.usages.createIndex({ "token": 1 });
 db.usages.createIndex({ "timestamp": 1 });
 db.usages.createIndex({ "token": 1, "timestamp": -1 });
 
+db.verdicts.createIndex({ "createdAt": 1 });
+db.verdicts.createIndex({ "model_version": 1, "createdAt": -1 });
+// _id is the content digest, so digests are unique without a separate index
+
+// Per-token aliases from the digest of an original to that of its downscaled upload
+db.verdict_aliases.createIndex({ "token": 1, "original": 1 }, { unique: true });
+
 print('Database initialized successfully');
\ No newline at end of file
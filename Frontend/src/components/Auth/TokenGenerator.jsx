@@ -4,6 +4,7 @@ import { authAPI } from '../../services/api';
 
 const TokenGenerator = () => {
     const [tokens, setTokens] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [usageStats, setUsageStats] = useState(null);
     const [isLoading, setIsLoading] = useState(false);
     const [error, setError] = useState('');
@@ -14,10 +15,23 @@ const TokenGenerator = () => {
         loadUsageStats();
     }, []);
 
+    // Reloads from the first page; loadMoreTokens appends the next one
     const loadTokens = async () => {
         try {
-            const tokenList = await authAPI.getTokens();
-            setTokens(tokenList);
+            const page = await authAPI.getTokens();
+            setTokens(page.tokens);
+            setNextCursor(page.next_cursor);
+        } catch (err) {
+            setError('Failed to load tokens: ' + (err.response?.data?.detail || err.message));
+        }
+    };
+
+    const loadMoreTokens = async () => {
+        if (!nextCursor) return;
+        try {
+            const page = await authAPI.getTokens({ cursor: nextCursor });
+            setTokens((loaded) => [...loaded, ...page.tokens]);
+            setNextCursor(page.next_cursor);
         } catch (err) {
             setError('Failed to load tokens: ' + (err.response?.data?.detail || err.message));
         }
@@ -204,12 +218,12 @@ const TokenGenerator = () => {
                             Active Tokens
                         </div>
                         <span className="px-3 py-1 bg-slate-100 text-slate-700 rounded-full text-sm font-medium">
-                            {tokens.length} total
+                            {tokens.length}{nextCursor ? '+' : ''} total
                         </span>
                     </h3>
                     <div className="space-y-3 max-h-96 overflow-y-auto pr-2 custom-scrollbar">
-                        {tokens.map((token, index) => (
-                            <div key={index} className="flex items-center justify-between p-4 bg-white rounded-xl border border-slate-200/50 shadow-sm hover:shadow-md transition-all duration-200 group">
+                        {tokens.map((token) => (
+                            <div key={token.token} className="flex items-center justify-between p-4 bg-white rounded-xl border border-slate-200/50 shadow-sm hover:shadow-md transition-all duration-200 group">
                                 <div className="flex-1">
                                     <div className="flex items-center space-x-4 mb-2">
                                         <code className="text-sm font-mono bg-slate-100 px-3 py-2 rounded-lg border border-slate-200 group-hover:bg-slate-50 transition-colors">
@@ -248,6 +262,14 @@ const TokenGenerator = () => {
                                 </div>
                             </div>
                         ))}
+                        {nextCursor && (
+                            <button
+                                onClick={loadMoreTokens}
+                                className="w-full px-4 py-3 text-indigo-600 hover:text-indigo-700 hover:bg-indigo-50 rounded-xl text-sm font-medium transition-all duration-200 border border-indigo-200 hover:border-indigo-300"
+                            >
+                                Load more
+                            </button>
+                        )}
                     </div>
                 </div>
             </div>
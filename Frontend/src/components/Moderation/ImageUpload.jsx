@@ -8,6 +8,7 @@ const ImageUpload = ({ onModerationComplete }) => {
     const [isAnalyzing, setIsAnalyzing] = useState(false);
     const [error, setError] = useState('');
     const [dragOver, setDragOver] = useState(false);
+    const [downscale, setDownscale] = useState(true);
     const fileInputRef = useRef(null);
 
     const ALLOWED_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp'];
@@ -72,7 +73,7 @@ const ImageUpload = ({ onModerationComplete }) => {
         setError('');
 
         try {
-            const result = await moderationAPI.analyzeImage(selectedFile);
+            const result = await moderationAPI.analyzeImage(selectedFile, { downscale });
             onModerationComplete(result);
         } catch (err) {
             setError('Analysis failed: ' + (err.response?.data?.detail || err.message));
@@ -165,6 +166,18 @@ const ImageUpload = ({ onModerationComplete }) => {
                                 </div>
                             </div>
 
+                            {/* Upload Options */}
+                            <label className="flex items-center justify-center space-x-2 text-sm text-slate-600 cursor-pointer">
+                                <input
+                                    type="checkbox"
+                                    checked={downscale}
+                                    onChange={(e) => setDownscale(e.target.checked)}
+                                    disabled={isAnalyzing}
+                                    className="w-4 h-4 rounded border-slate-300 text-indigo-600 focus:ring-indigo-500"
+                                />
+                                <span>Downscale large images before upload (faster on slow connections)</span>
+                            </label>
+
                             {/* Actions */}
                             <div className="flex flex-col sm:flex-row justify-center space-y-3 sm:space-y-0 sm:space-x-4">
                                 <button
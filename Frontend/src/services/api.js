@@ -1,5 +1,6 @@
 // services/api.js
 import axios from 'axios';
+import { preprocessImage } from './imagePreprocess';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:7000';
 
@@ -20,6 +21,27 @@ api.interceptors.request.use((config) => {
     return config;
 });
 
+// Hex SHA-256 of a file's bytes; null where WebCrypto is unavailable (non-secure origins)
+const sha256Hex = async (file) => {
+    if (!window.crypto?.subtle) return null;
+    const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+};
+
+// Server-advertised analysis resolution, fetched once per page load
+let analysisResolution = null;
+const getAnalysisResolution = () => {
+    if (!analysisResolution) {
+        analysisResolution = api.get('/moderate/categories')
+            .then((response) => response.data.analysis_info?.analysis_resolution ?? null)
+            .catch(() => {
+                analysisResolution = null;
+                return null;
+            });
+    }
+    return analysisResolution;
+};
+
 // Auth API calls
 export const authAPI = {
     // Create new token (admin only)
@@ -28,9 +50,13 @@ export const authAPI = {
         return response.data;
     },
 
-    // Get all tokens (admin only)
-    getTokens: async () => {
-        const response = await api.get('/auth/tokens');
+    // Get one page of tokens, newest first (admin only); pass the
+    // returned next_cursor as cursor for the following page
+    getTokens: async ({ limit = 50, cursor = null, isAdmin = null } = {}) => {
+        const params = { limit };
+        if (cursor) params.cursor = cursor;
+        if (isAdmin !== null) params.is_admin = isAdmin;
+        const response = await api.get('/auth/tokens', { params });
         return response.data;
     },
 
@@ -49,10 +75,41 @@ export const authAPI = {
 
 // Moderation API calls
 export const moderationAPI = {
-    // Analyze/moderate image
-    analyzeImage: async (file) => {
+    // Look up cached reports by digest before uploading
+    precheck: async (digests) => {
+        const response = await api.post('/moderate/precheck', { digests });
+        return response.data;
+    },
+
+    // Analyze/moderate image, skipping the upload when the server already knows it.
+    // With downscale, large images are reduced to the analysis resolution first;
+    // the original's digest goes along so the pre-check above still finds it next time.
+    analyzeImage: async (file, { downscale = false } = {}) => {
+        let digest = null;
+        try {
+            digest = await sha256Hex(file);
+            if (digest) {
+                const { results } = await moderationAPI.precheck([digest]);
+                const cached = results[digest];
+                if (cached) {
+                    cached.file_info.filename = file.name;
+                    return cached;
+                }
+            }
+        } catch (error) {
+            // Pre-check is an optimization only; fall back to a normal upload
+        }
+        const upload = downscale ? await preprocessImage(file, await getAnalysisResolution()) : file;
+        return moderationAPI.uploadImage(upload, upload !== file ? digest : null);
+    },
+
+    // Upload an image for full analysis; originalDigest when it was downscaled from another file
+    uploadImage: async (file, originalDigest = null) => {
         const formData = new FormData();
         formData.append('file', file);
+        if (originalDigest) {
+            formData.append('original_sha256', originalDigest);
+        }
 
         const response = await api.post('/moderate/analyze', formData, {
             headers: {
@@ -0,0 +1,89 @@
+// services/imagePreprocess.js
+// Optional client-side downscaling to the analysis resolution the server
+// advertises in /moderate/categories (analysis_info.analysis_resolution).
+
+// A canvas keeps only the first frame: GIFs and TIFFs (possibly multi-page)
+// are always sent as they are, PNG and WebP when they are animated
+const SKIPPED_TYPES = ['image/gif', 'image/tiff'];
+
+let worker = null;
+let nextId = 0;
+const pending = new Map();
+
+const isSupported = () =>
+    typeof Worker !== 'undefined' && typeof OffscreenCanvas !== 'undefined' && typeof createImageBitmap !== 'undefined';
+
+const getWorker = () => {
+    if (!worker) {
+        worker = new Worker(new URL('../workers/imageResize.worker.js', import.meta.url), { type: 'module' });
+        worker.onmessage = ({ data }) => {
+            const request = pending.get(data.id);
+            if (!request) return;
+            pending.delete(data.id);
+            if (data.error) {
+                request.reject(new Error(data.error));
+            } else {
+                request.resolve(data);
+            }
+        };
+    }
+    return worker;
+};
+
+const resizeInWorker = (file, resolution) =>
+    new Promise((resolve, reject) => {
+        const id = nextId++;
+        pending.set(id, { resolve, reject });
+        getWorker().postMessage({
+            id,
+            file,
+            maxSide: resolution.max_side,
+            type: resolution.format,
+            quality: resolution.quality,
+        });
+    });
+
+const fourCC = (bytes, at) => String.fromCharCode(...bytes.subarray(at, at + 4));
+
+// APNG: an acTL chunk before the first IDAT
+const isAnimatedPng = (bytes) => {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let at = 8;
+    while (at + 8 <= bytes.length) {
+        const type = fourCC(bytes, at + 4);
+        if (type === 'acTL') return true;
+        if (type === 'IDAT' || type === 'IEND') return false;
+        at += 12 + view.getUint32(at);
+    }
+    return false;
+};
+
+// Animated WebP: a VP8X header with the animation flag set
+const isAnimatedWebp = (bytes) =>
+    bytes.length > 20 && fourCC(bytes, 12) === 'VP8X' && (bytes[20] & 0x02) !== 0;
+
+const isMultiFrame = async (file) => {
+    if (file.type !== 'image/png' && file.type !== 'image/webp') return false;
+    const bytes = new Uint8Array(await file.arrayBuffer());
+    return file.type === 'image/png' ? isAnimatedPng(bytes) : isAnimatedWebp(bytes);
+};
+
+// The file to upload: a downscaled re-encode when that is smaller than the
+// original, otherwise the original itself. Never throws; failures upload the original.
+export const preprocessImage = async (file, resolution) => {
+    if (!resolution?.max_side || !isSupported() || SKIPPED_TYPES.includes(file.type)) {
+        return file;
+    }
+    try {
+        if (await isMultiFrame(file)) {
+            return file;
+        }
+        const { blob } = await resizeInWorker(file, resolution);
+        if (!blob || blob.size >= file.size) {
+            return file;
+        }
+        return new File([blob], file.name, { type: blob.type, lastModified: file.lastModified });
+    } catch {
+        return file;
+    }
+};
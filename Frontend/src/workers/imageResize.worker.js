@@ -0,0 +1,39 @@
+// workers/imageResize.worker.js
+// Downscales an image off the main thread: decode, draw onto an OffscreenCanvas
+// no larger than maxSide on its longest side, and re-encode. Images that
+// already fit are answered without a blob. Sources with transparency are
+// re-encoded as PNG instead, since JPEG would turn transparent areas black.
+
+const hasTransparency = (pixels) => {
+    for (let i = 3; i < pixels.length; i += 4) {
+        if (pixels[i] < 255) return true;
+    }
+    return false;
+};
+
+self.onmessage = async ({ data }) => {
+    const { id, file, maxSide, type, quality } = data;
+    try {
+        const bitmap = await createImageBitmap(file);
+        const scale = maxSide / Math.max(bitmap.width, bitmap.height);
+        if (scale >= 1) {
+            self.postMessage({ id, blob: null, width: bitmap.width, height: bitmap.height });
+            bitmap.close();
+            return;
+        }
+        const width = Math.max(1, Math.round(bitmap.width * scale));
+        const height = Math.max(1, Math.round(bitmap.height * scale));
+
+        const canvas = new OffscreenCanvas(width, height);
+        const context = canvas.getContext('2d');
+        context.imageSmoothingQuality = 'high';
+        context.drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+
+        const keepAlpha = file.type !== 'image/jpeg' && hasTransparency(context.getImageData(0, 0, width, height).data);
+        const blob = await canvas.convertToBlob(keepAlpha ? { type: 'image/png' } : { type, quality });
+        self.postMessage({ id, blob, width, height });
+    } catch (error) {
+        self.postMessage({ id, error: error.message || String(error) });
+    }
+};